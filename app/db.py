@@ -1,16 +1,144 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./negarchive.db")
 
-connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
 
-engine = create_engine(DATABASE_URL, echo=False, pool_pre_ping=True, connect_args=connect_args)
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# Pool sizing (QueuePool); ignored for in-memory SQLite
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 10)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 20)
+DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)  # seconds to wait for a free connection
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)  # seconds; -1 disables
+DB_STATEMENT_TIMEOUT_MS = _env_int("DB_STATEMENT_TIMEOUT_MS", 0)  # Postgres only; 0 disables
+
+# SQLite pragmas applied on every new connection
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+SQLITE_CACHE_SIZE = _env_int("SQLITE_CACHE_SIZE", -64000)  # negative = KiB
+SQLITE_BUSY_TIMEOUT_MS = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return _is_sqlite(url) and (url in {"sqlite://", "sqlite:///:memory:"} or "mode=memory" in url)
+
+
+def _apply_sqlite_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    try:
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cur.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    finally:
+        cur.close()
+
+
+def _pool_kwargs(url: str) -> dict:
+    kwargs: dict = {"echo": False, "pool_pre_ping": True}
+    if not _is_memory_sqlite(url):
+        kwargs.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return kwargs
+
+
+def make_engine(url: str = DATABASE_URL, **overrides) -> Engine:
+    """Create an engine tuned for the backend in ``url``.
+
+    Pool and timeout settings come from the environment (DB_POOL_*); keyword
+    overrides win over both defaults and environment.
+    """
+    kwargs = _pool_kwargs(url)
+    connect_args: dict = {}
+    if _is_sqlite(url):
+        connect_args["check_same_thread"] = False
+    elif url.startswith("postgresql") and DB_STATEMENT_TIMEOUT_MS > 0:
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    kwargs["connect_args"] = connect_args
+    kwargs.update(overrides)
+    eng = create_engine(url, **kwargs)
+    if _is_sqlite(url):
+        event.listen(eng, "connect", _apply_sqlite_pragmas)
+    return eng
+
+
+def async_url(url: str) -> str:
+    """Map a sync DATABASE_URL to its async driver (aiosqlite / asyncpg)."""
+    scheme, sep, rest = url.partition("://")
+    if scheme.startswith("sqlite"):
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if scheme.startswith("postgresql"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+
+def make_async_engine(url: str = DATABASE_URL, **overrides) -> AsyncEngine:
+    """Async counterpart of make_engine, sharing the same pool settings."""
+    aurl = async_url(url)
+    kwargs = _pool_kwargs(url)
+    connect_args: dict = {}
+    if aurl.startswith("postgresql+asyncpg") and DB_STATEMENT_TIMEOUT_MS > 0:
+        connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+    if _is_sqlite(url) and not _is_memory_sqlite(url):
+        # aiosqlite defaults to NullPool; keep a real pool so pragmas and sizing apply
+        kwargs["poolclass"] = AsyncAdaptedQueuePool
+    kwargs["connect_args"] = connect_args
+    kwargs.update(overrides)
+    eng = create_async_engine(aurl, **kwargs)
+    if _is_sqlite(url):
+        event.listen(eng.sync_engine, "connect", _apply_sqlite_pragmas)
+    return eng
+
+
+def pool_status(eng: Engine | None = None) -> dict:
+    """Snapshot of connection pool usage for monitoring."""
+    pool = (eng or engine).pool
+    stats = {"class": type(pool).__name__, "status": pool.status()}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        fn = getattr(pool, name, None)
+        if callable(fn):
+            stats[name] = fn()
+    timeout = getattr(pool, "timeout", None)
+    if callable(timeout):
+        stats["timeout"] = timeout()
+    # Only queue pools overflow; report the configured limit they were built with
+    stats["max_overflow"] = DB_MAX_OVERFLOW if "overflow" in stats else None
+    return stats
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async path is optional: without aiosqlite/asyncpg installed only get_db works
+try:
+    async_engine: AsyncEngine | None = make_async_engine()
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    ASYNC_DB_AVAILABLE = True
+except Exception:
+    async_engine = None
+    AsyncSessionLocal = None
+    ASYNC_DB_AVAILABLE = False
+
 Base = declarative_base()
 
 def get_db():
@@ -18,4 +146,11 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database driver not installed (aiosqlite/asyncpg)")
+    async with AsyncSessionLocal() as db:
+        yield db
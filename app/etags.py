@@ -0,0 +1,69 @@
+"""Cheap ETags for collection endpoints.
+
+Triggers (migration 12) bump a per-table counter in ``table_versions`` on
+every insert, delete or relevant update, whoever writes. A collection's tag
+hashes the counters of the tables its body is built from, the request path
+and query, and SCHEMA. Checking If-None-Match therefore costs one
+primary-key lookup. An unchanged listing is answered with a 304 before its
+rows are queried or serialized.
+
+The counters are read before the rows. A write committing in between
+leaves the tag older than the body, which only costs the client one more
+full response.
+"""
+import hashlib
+from typing import Dict, Iterable
+
+from fastapi import Request
+from fastapi.responses import Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .models import TableVersion
+
+# Bump when a listing's JSON shape changes, so cached bodies aren't revalidated
+SCHEMA = 2
+# Clients may keep the body but must revalidate before every use
+CACHE_CONTROL = "no-cache"
+
+
+def _statement(tables: Iterable[str]):
+    return select(TableVersion.name, TableVersion.version).where(TableVersion.name.in_(list(tables)))
+
+
+def make_tag(request: Request, versions: Dict[str, int]) -> str:
+    counters = ",".join(f"{name}={versions[name]}" for name in sorted(versions))
+    key = f"{SCHEMA}|{request.url.path}?{request.url.query}|{counters}"
+    # Weak: the same listing is sent gzip, brotli or plain
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()[:24]}"'
+
+
+async def collection_tag(db: AsyncSession, request: Request, *tables: str) -> str:
+    rows = await db.execute(_statement(tables))
+    return make_tag(request, dict(rows.all()))
+
+
+def collection_tag_sync(db: Session, request: Request, *tables: str) -> str:
+    return make_tag(request, dict(db.execute(_statement(tables)).all()))
+
+
+def is_fresh(request: Request, tag: str) -> bool:
+    """True if If-None-Match names tag (weak comparison) or is "*"."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    opaque = tag[2:] if tag.startswith("W/") else tag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+def headers(tag: str) -> Dict[str, str]:
+    return {"ETag": tag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(tag: str) -> Response:
+    return Response(status_code=304, headers=headers(tag))
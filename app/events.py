@@ -0,0 +1,186 @@
+"""Job progress as server-sent events.
+
+Long-running work reports through a ``Job``. That covers bulk and ZIP
+imports, contact sheets, sheet segmentation and face indexing. A job
+publishes ``started``, then ``progress`` events carrying the done/total
+counts, items/s and ETA from ``jobs.Progress``, and finally ``done`` or
+``failed``. ``GET /api/events`` streams these, optionally filtered to one
+job id or kind. Callers choose the job id themselves and pass it as
+``?job_id=`` to the endpoint doing the work, so they can subscribe before
+starting it.
+
+Pub/sub is in-process. Publishing never blocks. Each subscriber's queue
+holds at most EVENTS_BUFFER events; a slow one loses its oldest events,
+and the next event it gets carries ``dropped``. Progress counts are
+cumulative, so a lost progress event only costs one update. The last
+EVENTS_BUFFER events are also kept for replay: to a stream that names a
+job, and to a reconnecting EventSource (``Last-Event-ID``).
+
+With several API workers, a stream only sees jobs run in its own process.
+"""
+import asyncio
+import itertools
+import os
+import threading
+from collections import deque
+from time import monotonic
+from typing import AsyncIterator, Deque, List, Optional, Tuple
+from uuid import uuid4
+
+from .jobs import Progress
+from .serialization import dumps
+
+EVENTS_BUFFER = int(os.getenv("EVENTS_BUFFER", "256"))
+# Comment sent on idle streams so proxies keep them open
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+# Progress events per job are coalesced to one per interval; the final count always goes out
+PROGRESS_INTERVAL = 0.1
+# EventSource reconnect delay
+RETRY_MS = 3000
+
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_recent: Deque[dict] = deque(maxlen=EVENTS_BUFFER)
+_subscribers: List["Subscription"] = []
+
+
+class Subscription:
+    """One stream's bounded queue; filled from any thread, drained on its event loop."""
+
+    def __init__(self, job: Optional[str] = None, kind: Optional[str] = None) -> None:
+        self.job = job
+        self.kind = kind
+        self.queue: Deque[dict] = deque(maxlen=EVENTS_BUFFER)
+        self.dropped = 0
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+
+    def wants(self, event: dict) -> bool:
+        return (self.job is None or event["job"] == self.job) and (self.kind is None or event["kind"] == self.kind)
+
+    def _put(self, event: dict) -> None:
+        # Caller holds _lock
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(event)
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # Loop closed at shutdown
+            pass
+
+    async def get(self, timeout: float) -> Optional[Tuple[dict, int]]:
+        """Next event and how many were dropped before it; None after timeout idle seconds."""
+        while True:
+            with _lock:
+                if self.queue:
+                    dropped, self.dropped = self.dropped, 0
+                    return self.queue.popleft(), dropped
+                self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+
+def subscribe(job: Optional[str] = None, kind: Optional[str] = None, last_id: int = 0) -> Subscription:
+    """Register a stream; call from its event loop. Recent events are replayed after
+    last_id, or from the start of the buffer when following one job."""
+    sub = Subscription(job, kind)
+    with _lock:
+        if last_id or job is not None:
+            sub.queue.extend(e for e in _recent if e["id"] > last_id and sub.wants(e))
+        _subscribers.append(sub)
+    return sub
+
+
+def unsubscribe(sub: Subscription) -> None:
+    with _lock:
+        if sub in _subscribers:
+            _subscribers.remove(sub)
+
+
+def publish(kind: str, job: str, state: str, **fields) -> dict:
+    with _lock:
+        event = {"id": next(_ids), "job": job, "kind": kind, "state": state, **fields}
+        _recent.append(event)
+        for sub in _subscribers:
+            if sub.wants(event):
+                sub._put(event)
+    return event
+
+
+async def stream(sub: Subscription) -> AsyncIterator[str]:
+    """text/event-stream body for a subscription; unsubscribes when the client goes away."""
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            got = await sub.get(EVENTS_HEARTBEAT)
+            if got is None:
+                yield ": keep-alive\n\n"
+                continue
+            event, dropped = got
+            if dropped:
+                event = {**event, "dropped": dropped}
+            yield f"id: {event['id']}\ndata: {dumps(event).decode()}\n\n"
+    finally:
+        unsubscribe(sub)
+
+
+class Job:
+    """Progress reporting for one piece of work, used as a context manager:
+
+        with events.Job("ingest", total=len(files), job_id=job_id, film_id=film_id) as job:
+            for f in files:
+                ...
+                job.advance()
+
+    An exception, or a call to fail(), ends it as ``failed``; otherwise it
+    ends ``done`` with the fields collected in ``result``.
+    """
+
+    def __init__(self, kind: str, total: int = 0, job_id: Optional[str] = None, unit: str = "images", **fields) -> None:
+        self.kind = kind
+        self.id = (job_id or uuid4().hex)[:64]
+        self.fields = fields
+        self.progress = Progress(total, unit)
+        self.failed = 0
+        self.error: Optional[str] = None
+        self.result: dict = {}
+        self._last = 0.0
+
+    def _publish(self, state: str, **extra) -> None:
+        p = self.progress
+        eta = p.eta()
+        publish(
+            self.kind, self.id, state,
+            done=p.done, total=p.total, failed=self.failed, unit=p.unit,
+            rate=round(p.rate(), 2), eta=round(eta, 1) if eta is not None else None,
+            **self.fields, **extra,
+        )
+
+    def __enter__(self) -> "Job":
+        self._publish("started")
+        return self
+
+    def advance(self, n: int = 1, failed: bool = False) -> None:
+        """Count n items as processed (failed ones included)."""
+        self.progress.advance(n)
+        if failed:
+            self.failed += n
+        now = monotonic()
+        if now - self._last >= PROGRESS_INTERVAL or self.progress.done >= self.progress.total:
+            self._last = now
+            self._publish("progress")
+
+    def fail(self, error: str) -> None:
+        self.error = error
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc is not None:
+            self._publish("failed", error=str(exc) or exc_type.__name__)
+        elif self.error is not None:
+            self._publish("failed", error=self.error, **self.result)
+        else:
+            self._publish("done", **self.result)
+        return False
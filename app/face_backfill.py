@@ -0,0 +1,148 @@
+"""Face-index the existing archive.
+
+New scans are indexed when uploaded (FACE_INDEX_ON_UPLOAD); this covers
+images from before that, and ones whose indexing failed.
+
+Walks scans in id order, skipping images whose ``faces_indexed_at`` is
+already set, and runs detection for several batches at once. Each batch is
+committed together with the job checkpoint, so an interrupted run resumes
+after the last committed batch:
+
+    python -m app.face_backfill --batch-size 32 --workers 4
+    python -m app.face_backfill --restart   # walk from the first id again
+
+With FACE_BACKEND=worker the batches are sent to the face worker (which
+writes the Face rows itself); otherwise models are loaded in this process.
+Local inference runs one pass at a time (services/face.py holds a model
+lock), so extra workers only overlap decoding and commits with it.
+"""
+import argparse
+import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+from .jobs import Progress, get_checkpoint, reset_checkpoint, save_checkpoint
+from .models import ImageAsset, ImageType
+from .services import face, face_crops
+from .services.imaging import Box, image_box
+
+JOB_NAME = "face_backfill"
+
+# (image id, path, crop box for frames cut from a sheet)
+Batch = List[Tuple[int, str, Optional[Box]]]
+
+
+def pending_query(db: Session, after: int, all_types: bool = False):
+    q = db.query(
+        ImageAsset.id, ImageAsset.path, ImageAsset.crop_x, ImageAsset.crop_y, ImageAsset.crop_w, ImageAsset.crop_h
+    ).filter(
+        ImageAsset.id > after, ImageAsset.faces_indexed_at.is_(None)
+    )
+    if not all_types:
+        q = q.filter(ImageAsset.type == ImageType.scan)
+    return q
+
+
+def batches(db: Session, after: int, size: int, all_types: bool = False, limit: Optional[int] = None) -> Iterator[Batch]:
+    """Keyset-paginate pending images; never holds more than one page in memory."""
+    remaining = limit
+    while remaining is None or remaining > 0:
+        n = size if remaining is None else min(size, remaining)
+        rows = pending_query(db, after, all_types).order_by(ImageAsset.id).limit(n).all()
+        if not rows:
+            return
+        yield [(r.id, r.path, image_box(r)) for r in rows]
+        after = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def _models_ready() -> bool:
+    if face.FACE_BACKEND == "worker":
+        from .face_worker import ping
+        status = ping()
+        return bool(status and status.get("models"))
+    return face.deepface_available()
+
+
+def _infer(batch: Batch):
+    if face.FACE_BACKEND == "worker":
+        from .face_worker import remote_index
+        return remote_index([image_id for image_id, _, _ in batch])
+    return face.detect_and_embed_batch([path for _, path, _ in batch], [box for _, _, box in batch])
+
+
+def _commit(db: Session, batch: Batch, result) -> int:
+    """Store one finished batch and advance the checkpoint; returns faces stored."""
+    if face.FACE_BACKEND == "worker":
+        if not result:
+            raise RuntimeError("face worker unreachable or failed the batch")
+        stored = sum(result.values())
+    else:
+        stored = face.store_faces(db, [(item[0], faces) for item, faces in zip(batch, result)])
+    save_checkpoint(db, JOB_NAME, batch[-1][0])
+    db.commit()
+    if face.FACE_BACKEND != "worker":
+        face_crops.after_index(db, [item[0] for item, faces in zip(batch, result) if faces])
+    return stored
+
+
+def run(batch_size: int = 32, workers: int = 2, restart: bool = False, all_types: bool = False, limit: Optional[int] = None) -> int:
+    if not _models_ready():
+        print("face models unavailable (DEEPFACE_ENABLED, deepface install or face worker)", file=sys.stderr)
+        return 1
+    db = SessionLocal()
+    try:
+        if restart:
+            reset_checkpoint(db, JOB_NAME)
+        after = get_checkpoint(db, JOB_NAME)
+        total = pending_query(db, after, all_types).count()
+        if limit is not None:
+            total = min(total, limit)
+        print(f"{total} images to index after id {after}")
+        progress = Progress(total)
+        faces_stored = 0
+        # Results are committed in submission order so the checkpoint only moves forward
+        in_flight: Deque[Tuple[Batch, Future]] = deque()
+
+        def finish_oldest() -> None:
+            nonlocal faces_stored
+            done, fut = in_flight.popleft()
+            faces_stored += _commit(db, done, fut.result())
+            progress.advance(len(done))
+            print(f"{progress.line()}  faces {faces_stored}  checkpoint {done[-1][0]}")
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for batch in batches(db, after, batch_size, all_types, limit):
+                in_flight.append((batch, pool.submit(_infer, batch)))
+                if len(in_flight) >= max(1, workers):
+                    finish_oldest()
+            while in_flight:
+                finish_oldest()
+        print(f"done: {progress.done} images, {faces_stored} faces")
+        return 0
+    finally:
+        db.close()
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.face_backfill")
+    parser.add_argument("--batch-size", type=int, default=32, help="images per commit")
+    parser.add_argument("--workers", type=int, default=2, help="batches in flight at once")
+    parser.add_argument("--restart", action="store_true", help="ignore the saved checkpoint")
+    parser.add_argument("--all-types", action="store_true", help="include contact sheets")
+    parser.add_argument("--limit", type=int, help="stop after this many images")
+    args = parser.parse_args(argv)
+    try:
+        return run(args.batch_size, args.workers, args.restart, args.all_types, args.limit)
+    except KeyboardInterrupt:
+        print("interrupted; rerun to resume from the last checkpoint", file=sys.stderr)
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
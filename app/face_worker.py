@@ -0,0 +1,325 @@
+"""Standalone face-inference process.
+
+Holds the DeepFace detector and embedding models so API workers don't have
+to. API processes running with FACE_BACKEND=worker talk to it over a local
+socket (``multiprocessing.connection``):
+
+- ``detect``: bboxes and embeddings for one image path, nothing stored.
+- ``index``: queue image ids. A batcher groups them into micro-batches of
+  up to FACE_BATCH_SIZE images (waiting at most FACE_BATCH_WAIT_MS). Each
+  batch runs detection per image, embeds all its faces in one forward pass,
+  and bulk-inserts the Face rows in one transaction.
+
+Start it standalone with ``python -m app.face_worker``. When
+FACE_WORKER_AUTOSTART is on, the app's startup hook starts it if nothing is
+listening yet. FACE_WORKER_ADDRESS is ``host:port`` or a Unix socket path.
+Both sides must share FACE_WORKER_AUTHKEY, DATABASE_URL and the upload
+directory.
+
+Messages are pickles. Anyone who passes the authkey handshake can make the
+worker run code, so the key has no default. The worker and its clients
+refuse to start without it. Autostart generates one only when the API runs
+as a single process; with several API workers each would make up its own key
+and only one could talk to the worker, so it refuses instead. Keep the
+socket off public interfaces: the default is loopback, and a Unix socket is
+created owner-only.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import secrets
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from time import monotonic
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .services import face, face_crops
+from .services.imaging import image_box
+
+FACE_WORKER_ADDRESS = os.getenv("FACE_WORKER_ADDRESS", "127.0.0.1:8765")
+FACE_WORKER_AUTHKEY = os.getenv("FACE_WORKER_AUTHKEY", "").encode()
+FACE_WORKER_AUTOSTART = os.getenv("FACE_WORKER_AUTOSTART", "true").lower() == "true"
+FACE_BATCH_SIZE = int(os.getenv("FACE_BATCH_SIZE", "16"))
+FACE_BATCH_WAIT_MS = int(os.getenv("FACE_BATCH_WAIT_MS", "50"))
+
+logger = logging.getLogger("negarchive.face_worker")
+
+# TensorFlow models are not guaranteed thread-safe; serialize inference
+_infer_lock = threading.Lock()
+_local = threading.local()
+
+
+def _authkey() -> bytes:
+    if not FACE_WORKER_AUTHKEY:
+        raise RuntimeError("FACE_WORKER_AUTHKEY is not set; the face worker won't run without a shared secret")
+    return FACE_WORKER_AUTHKEY
+
+
+def worker_address(value: str = FACE_WORKER_ADDRESS):
+    if value.startswith("/"):
+        return value
+    host, _, port = value.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+class Batcher:
+    """Accumulates image ids into micro-batches and indexes them in bulk."""
+
+    def __init__(self, batch_size: int = FACE_BATCH_SIZE, max_wait_ms: int = FACE_BATCH_WAIT_MS) -> None:
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Tuple[int, Future]]" = queue.Queue()
+        self.indexed_images = 0
+        self.indexed_faces = 0
+        self._thread = threading.Thread(target=self._run, name="face-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, image_id: int) -> Future:
+        fut: Future = Future()
+        self._queue.put((image_id, fut))
+        return fut
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _next_batch(self) -> List[Tuple[int, Future]]:
+        batch = [self._queue.get()]
+        deadline = monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            try:
+                counts = index_images([image_id for image_id, _ in batch])
+            except Exception as exc:
+                logger.exception("face batch failed")
+                for _, fut in batch:
+                    fut.set_exception(exc)
+                continue
+            self.indexed_images += len(batch)
+            self.indexed_faces += sum(counts.values())
+            for image_id, fut in batch:
+                fut.set_result(counts.get(image_id, 0))
+
+
+def index_images(image_ids: List[int]) -> Dict[int, int]:
+    """Detect, embed and store faces for a batch of images; returns faces per image id."""
+    from .db import SessionLocal
+    from .models import ImageAsset
+
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            ImageAsset.id, ImageAsset.path, ImageAsset.crop_x, ImageAsset.crop_y, ImageAsset.crop_w, ImageAsset.crop_h
+        ).filter(ImageAsset.id.in_(image_ids)).all()
+        if not rows:
+            return {}
+        with _infer_lock:
+            detections = face.detect_and_embed_batch([r.path for r in rows], [image_box(r) for r in rows])
+        pairs = [(r.id, faces) for r, faces in zip(rows, detections)]
+        face.store_faces(db, pairs)
+        db.commit()
+        face_crops.after_index(db, [image_id for image_id, faces in pairs if faces])
+        return {image_id: len(faces) for image_id, faces in pairs}
+    finally:
+        db.close()
+
+
+def _handle(conn, batcher: Batcher) -> None:
+    with conn:
+        while True:
+            try:
+                req = conn.recv()
+            except (EOFError, OSError):
+                return
+            op = req.get("op") if isinstance(req, dict) else None
+            if op == "ping":
+                conn.send({
+                    "ok": True,
+                    "models": face.deepface_available(),
+                    "pending": batcher.pending(),
+                    "indexed_images": batcher.indexed_images,
+                    "indexed_faces": batcher.indexed_faces,
+                })
+            elif op == "detect":
+                with _infer_lock:
+                    faces = face.detect_and_embed_local(req["path"])
+                conn.send({
+                    "ok": True,
+                    "faces": [(bbox, emb.tolist() if emb is not None else None) for bbox, emb in faces],
+                })
+            elif op == "index":
+                futures = {image_id: batcher.submit(image_id) for image_id in req.get("image_ids", [])}
+                if not req.get("wait", True):
+                    conn.send({"ok": True, "queued": len(futures)})
+                    continue
+                counts: Dict[int, int] = {}
+                errors = 0
+                for image_id, fut in futures.items():
+                    try:
+                        counts[image_id] = fut.result()
+                    except Exception:
+                        errors += 1
+                conn.send({"ok": errors == 0, "faces": counts, "errors": errors})
+            else:
+                conn.send({"ok": False, "error": "unknown_op"})
+
+
+def serve(address: Optional[str] = None) -> None:
+    """Load models, then answer requests until interrupted (one thread per client)."""
+    authkey = _authkey()
+    addr = worker_address(address or FACE_WORKER_ADDRESS)
+    if isinstance(addr, str) and os.path.exists(addr) and _stale_socket(addr):
+        # Left behind by a worker that died; binding would fail on it
+        os.unlink(addr)
+    # Bind first so a second instance exits before paying for model loading
+    with Listener(addr, authkey=authkey) as listener:
+        if isinstance(addr, str):
+            os.chmod(addr, 0o600)
+        if face.warm_up():
+            logger.info("face models loaded")
+        else:
+            logger.warning("face models unavailable; detection will return no faces")
+        batcher = Batcher()
+        logger.info("face worker listening on %s (batch %d, wait %d ms)", addr, batcher.batch_size, FACE_BATCH_WAIT_MS)
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception:
+                logger.exception("rejected face worker client")
+                continue
+            threading.Thread(target=_handle, args=(conn, batcher), daemon=True).start()
+
+
+def _stale_socket(path: str) -> bool:
+    """True if nothing accepts connections on the Unix socket at path."""
+    try:
+        Client(path, authkey=_authkey()).close()
+    except OSError:
+        return True
+    except Exception:
+        # Refused our key: something is listening
+        pass
+    return False
+
+
+def _connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = Client(worker_address(), authkey=_authkey())
+        _local.conn = conn
+    return conn
+
+
+def _request(payload: dict) -> dict:
+    # One reconnect covers a restarted worker; a second failure propagates
+    for attempt in range(2):
+        try:
+            conn = _connection()
+            conn.send(payload)
+            return conn.recv()
+        except (EOFError, OSError, ConnectionError):
+            _local.conn = None
+            if attempt:
+                raise
+    return {"ok": False}
+
+
+def _request_failed(exc: Exception) -> None:
+    """Log why a request to the worker failed; a key problem is a misconfiguration."""
+    if isinstance(exc, AuthenticationError):
+        logger.error("face worker at %s rejected FACE_WORKER_AUTHKEY; faces are not being indexed", FACE_WORKER_ADDRESS)
+    elif isinstance(exc, RuntimeError):
+        logger.error("%s; faces are not being indexed", exc)
+    else:
+        logger.warning("face worker unreachable at %s", FACE_WORKER_ADDRESS)
+
+
+def ping() -> Optional[dict]:
+    try:
+        return _request({"op": "ping"})
+    except Exception:
+        return None
+
+
+def remote_detect_and_embed(image_path: str) -> List[Tuple[Tuple[int, int, int, int], Optional[np.ndarray]]]:
+    """Client side of detect_and_embed; returns no faces if the worker is unreachable."""
+    try:
+        with face.span("face_worker_rpc"):
+            resp = _request({"op": "detect", "path": os.path.abspath(image_path)})
+    except Exception as exc:
+        _request_failed(exc)
+        return []
+    if not resp.get("ok"):
+        return []
+    return [
+        (tuple(bbox), np.array(emb, dtype=np.float32) if emb is not None else None)
+        for bbox, emb in resp["faces"]
+    ]
+
+
+def remote_index(image_ids: List[int], wait: bool = True) -> Dict[int, int]:
+    """Ask the worker to index images; with wait=True returns faces stored per image id."""
+    try:
+        with face.span("face_worker_rpc"):
+            resp = _request({"op": "index", "image_ids": list(image_ids), "wait": wait})
+    except Exception as exc:
+        _request_failed(exc)
+        return {}
+    # Connection pickling keeps int keys
+    return resp.get("faces", {}) if wait else {}
+
+
+def _single_process() -> bool:
+    """Whether this API process is known to run alone (not one of several server workers)."""
+    if multiprocessing.parent_process() is not None:
+        # uvicorn --workers (and --reload) run the app in spawned children
+        return False
+    if "gunicorn" in os.getenv("SERVER_SOFTWARE", ""):
+        return False
+    return int(os.getenv("WEB_CONCURRENCY", "1") or "1") <= 1
+
+
+def spawn() -> Optional[subprocess.Popen]:
+    """Start a worker process unless one already answers; returns the child if started."""
+    global FACE_WORKER_AUTHKEY
+    if not FACE_WORKER_AUTHKEY:
+        if not _single_process():
+            # Each API worker would generate its own key; all but one would fail the handshake
+            logger.error("FACE_WORKER_AUTHKEY not set; not starting the face worker for several API workers")
+            return None
+        # Known only to this API process and its child
+        FACE_WORKER_AUTHKEY = secrets.token_hex(32).encode()
+        os.environ["FACE_WORKER_AUTHKEY"] = FACE_WORKER_AUTHKEY.decode()
+        logger.warning("FACE_WORKER_AUTHKEY not set; generated one for this process's face worker")
+    if ping() is not None:
+        return None
+    logger.info("starting face worker on %s", FACE_WORKER_ADDRESS)
+    # Same working directory as the API (relative upload paths), package root importable
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.getenv("PYTHONPATH")])))
+    return subprocess.Popen([sys.executable, "-m", "app.face_worker"], env=env, start_new_session=True)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1:
+        serve(sys.argv[1])
+    else:
+        serve()
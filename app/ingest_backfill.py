@@ -0,0 +1,73 @@
+"""Fill ingest-time analysis (header metadata, perceptual hash) for images stored before it existed.
+
+Walks image_assets in id order over rows still missing the derived
+columns, decodes files on a thread pool and commits each batch together
+with the job checkpoint, so an interrupted run resumes where it stopped:
+
+    python -m app.ingest_backfill --batch-size 200 --workers 8
+"""
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from .db import SessionLocal
+from .jobs import Progress, get_checkpoint, reset_checkpoint, save_checkpoint
+from .models import ImageAsset
+from .services import ingest
+from .services.imaging import image_box
+
+JOB_NAME = "ingest_backfill"
+
+
+def run(batch_size: int = 200, workers: int = 4, restart: bool = False, limit: Optional[int] = None) -> int:
+    db = SessionLocal()
+    try:
+        if restart:
+            reset_checkpoint(db, JOB_NAME)
+        after = get_checkpoint(db, JOB_NAME)
+        pending = db.query(
+            ImageAsset.id, ImageAsset.path, ImageAsset.crop_x, ImageAsset.crop_y, ImageAsset.crop_w, ImageAsset.crop_h
+        ).filter(ingest.pending_filter())
+        total = pending.filter(ImageAsset.id > after).count()
+        if limit is not None:
+            total = min(total, limit)
+        print(f"{total} images to analyze after id {after}")
+        progress = Progress(total)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while progress.done < total:
+                n = min(batch_size, total - progress.done)
+                rows = pending.filter(ImageAsset.id > after).order_by(ImageAsset.id).limit(n).all()
+                if not rows:
+                    break
+                derived = pool.map(ingest.derive, [r.path for r in rows], [image_box(r) for r in rows])
+                updates = [{"id": r.id, **values} for r, values in zip(rows, derived) if values]
+                if updates:
+                    db.bulk_update_mappings(ImageAsset, updates)
+                after = rows[-1][0]
+                save_checkpoint(db, JOB_NAME, after)
+                db.commit()
+                progress.advance(len(rows))
+                print(f"{progress.line()}  unreadable {len(rows) - len(updates)}  checkpoint {after}")
+        print(f"done: {progress.done} images")
+        return 0
+    finally:
+        db.close()
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.ingest_backfill")
+    parser.add_argument("--batch-size", type=int, default=200, help="images per commit")
+    parser.add_argument("--workers", type=int, default=4, help="decoding threads")
+    parser.add_argument("--restart", action="store_true", help="ignore the saved checkpoint")
+    parser.add_argument("--limit", type=int, help="stop after this many images")
+    args = parser.parse_args(argv)
+    try:
+        return run(args.batch_size, args.workers, args.restart, args.limit)
+    except KeyboardInterrupt:
+        print("interrupted; rerun to resume from the last checkpoint", file=sys.stderr)
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,194 @@
+"""Request timing, query accounting and hot-path spans.
+
+``TimingMiddleware`` opens a per-request timing context, SQLAlchemy engine
+events add every cursor execution to it, and ``span("decode")`` blocks time
+pipeline stages. Each response carries a ``Server-Timing`` header; the same
+numbers feed an in-process registry rendered in Prometheus text format at
+``/metrics``.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds in seconds, shared by every histogram
+BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTimings:
+    """Mutable per-request accumulator; shared across threadpool hops."""
+
+    def __init__(self) -> None:
+        self.spans: Dict[str, float] = {}
+        self.db_count = 0
+        self.db_seconds = 0.0
+
+    def add(self, name: str, seconds: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def server_timing(self, total: float) -> str:
+        parts = [f'db;dur={self.db_seconds * 1000:.2f};desc="{self.db_count} queries"']
+        parts += [f"{name};dur={sec * 1000:.2f}" for name, sec in self.spans.items()]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("negarchive_timings", default=None)
+
+
+class _Histogram:
+    def __init__(self) -> None:
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class Registry:
+    """Minimal counter/histogram store with Prometheus text rendering."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], _Histogram] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+
+    def describe(self, name: str, kind: str, text: str) -> None:
+        self._help[name] = (kind, text)
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = _Histogram()
+            hist.observe(value)
+
+    @staticmethod
+    def _labels(pairs: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+        items = [f'{k}="{str(v)}"' for k, v in pairs]
+        if extra:
+            items.append(extra)
+        return "{" + ",".join(items) + "}" if items else ""
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda kv: kv[0])
+            seen = set()
+            for (name, labels), value in counters:
+                if name not in seen and name in self._help:
+                    kind, text = self._help[name]
+                    lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+                seen.add(name)
+                lines.append(f"{name}{self._labels(labels)} {value}")
+            for (name, labels), hist in histograms:
+                if name not in seen and name in self._help:
+                    kind, text = self._help[name]
+                    lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+                seen.add(name)
+                for bound, count in zip(BUCKETS, hist.counts):
+                    le = 'le="%s"' % bound
+                    lines.append(f"{name}_bucket{self._labels(labels, le)} {count}")
+                le = 'le="+Inf"'
+                lines.append(f"{name}_bucket{self._labels(labels, le)} {hist.total}")
+                lines.append(f"{name}_sum{self._labels(labels)} {hist.sum}")
+                lines.append(f"{name}_count{self._labels(labels)} {hist.total}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+registry.describe("negarchive_http_requests_total", "counter", "HTTP requests by route and status")
+registry.describe("negarchive_http_request_duration_seconds", "histogram", "HTTP request latency")
+registry.describe("negarchive_db_queries_total", "counter", "SQL statements executed")
+registry.describe("negarchive_db_query_duration_seconds", "histogram", "SQL statement latency")
+registry.describe("negarchive_span_duration_seconds", "histogram", "Hot-path stage latency")
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a pipeline stage into the current request and the span histogram."""
+    t0 = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - t0
+        timings = _current.get()
+        if timings is not None:
+            timings.add(name, elapsed)
+        registry.observe("negarchive_span_duration_seconds", elapsed, span=name)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("negarchive_query_start", []).append(perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("negarchive_query_start")
+    if not starts:
+        return
+    elapsed = perf_counter() - starts.pop()
+    timings = _current.get()
+    if timings is not None:
+        timings.db_count += 1
+        timings.db_seconds += elapsed
+    registry.inc("negarchive_db_queries_total")
+    registry.observe("negarchive_db_query_duration_seconds", elapsed)
+
+
+class TimingMiddleware:
+    """Pure ASGI middleware so streaming responses pass through untouched."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _current.set(timings)
+        t0 = perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.server_timing(perf_counter() - t0).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed = perf_counter() - t0
+            route = scope.get("route")
+            # Label by route template so ids don't explode cardinality
+            path = getattr(route, "path", None) or "unmatched"
+            registry.inc(
+                "negarchive_http_requests_total",
+                method=scope.get("method", ""),
+                route=path,
+                status=str(status["code"]),
+            )
+            registry.observe("negarchive_http_request_duration_seconds", elapsed, route=path)
@@ -0,0 +1,71 @@
+"""Helpers for resumable maintenance jobs run from the command line.
+
+Jobs walk a table in primary-key order and store the last id they finished
+in ``job_checkpoints`` in the same transaction as their writes. A crashed
+or interrupted run picks up where the last commit left off.
+"""
+from datetime import datetime
+from time import monotonic
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from .models import JobCheckpoint
+
+
+def get_checkpoint(db: Session, name: str) -> int:
+    row = db.get(JobCheckpoint, name)
+    return row.position if row else 0
+
+
+def save_checkpoint(db: Session, name: str, position: int) -> None:
+    """Record progress; committed together with the caller's batch."""
+    row = db.get(JobCheckpoint, name)
+    if row is None:
+        db.add(JobCheckpoint(name=name, position=position, updated_at=datetime.utcnow()))
+    else:
+        row.position = position
+        row.updated_at = datetime.utcnow()
+
+
+def reset_checkpoint(db: Session, name: str) -> None:
+    row = db.get(JobCheckpoint, name)
+    if row is not None:
+        db.delete(row)
+        db.commit()
+
+
+def _duration(seconds: float) -> str:
+    seconds = int(seconds)
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}h{m:02d}m{s:02d}s" if h else f"{m}m{s:02d}s"
+
+
+class Progress:
+    """Items/sec and ETA over the current run."""
+
+    def __init__(self, total: int, unit: str = "images") -> None:
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.started = monotonic()
+
+    def advance(self, n: int) -> None:
+        self.done += n
+
+    def rate(self) -> float:
+        elapsed = monotonic() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def eta(self) -> Optional[float]:
+        rate = self.rate()
+        return max(0, self.total - self.done) / rate if rate > 0 else None
+
+    def line(self) -> str:
+        pct = 100.0 * self.done / self.total if self.total else 100.0
+        eta = self.eta()
+        return (
+            f"{self.done}/{self.total} {self.unit} ({pct:.1f}%)  {self.rate():.2f} {self.unit}/s  "
+            f"ETA {_duration(eta) if eta is not None else '?'}"
+        )
@@ -1,13 +1,26 @@
+import asyncio
+import logging
 import os
-from fastapi import FastAPI, Request, Depends
+import threading
+from fastapi import FastAPI, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
 
-from .db import Base, engine, get_db, SessionLocal
-from sqlalchemy import inspect, text
-from .models import FilmRoll, Camera, FilmStock, FilmKind, ImageAsset
-from .routers import films, images, search, cameras, filmstocks, lenses, api
+from . import migrations
+from .db import engine
+from .compression import CompressionMiddleware
+from .instrumentation import TimingMiddleware, registry
+from .profiling import MAX_SECONDS, ProfilingMiddleware, Sampler, authorized, interval_seconds
+from . import face_worker
+from .services import face
+from .routers import films, images, search, cameras, filmstocks, lenses, api, faces
+
+logger = logging.getLogger("negarchive")
+
+# Preload face models at startup instead of on the first indexed image
+FACE_WARMUP = os.getenv("FACE_WARMUP", "false").lower() == "true"
+_face_worker_process: dict = {}
 
 app = FastAPI(title="NegArchive")
 
@@ -18,80 +31,48 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag"],
 )
 
-# Ensure tables
+# gzip / brotli for JSON and other text bodies; inside the timing middleware so it is measured
+app.add_middleware(CompressionMiddleware)
+
+# Per-request timing: Server-Timing header and /metrics
+app.add_middleware(TimingMiddleware)
+# Opt-in sampling profiler (?profile=1 with X-Admin-Token); inert without NEGARCHIVE_ADMIN_TOKEN
+app.add_middleware(ProfilingMiddleware)
+
+# Ensure schema is current; migrations normally run before workers start
 @app.on_event("startup")
 def on_startup():
-    Base.metadata.create_all(bind=engine)
-    # Ensure film_stocks.expiration_date exists (SQLite/Postgres simple migration)
-    try:
-        inspector = inspect(engine)
-        cols = [c["name"] for c in inspector.get_columns("film_stocks")]
-        if "expiration_date" not in cols:
-            with engine.begin() as conn:
-                conn.execute(text("ALTER TABLE film_stocks ADD COLUMN expiration_date DATE"))
-        # Ensure cameras.mount and cameras.notes exist
-        cam_cols = [c["name"] for c in inspector.get_columns("cameras")]
-        with engine.begin() as conn:
-            if "mount" not in cam_cols:
-                try:
-                    conn.execute(text("ALTER TABLE cameras ADD COLUMN mount VARCHAR(100)"))
-                except Exception:
-                    pass
-            if "notes" not in cam_cols:
-                try:
-                    conn.execute(text("ALTER TABLE cameras ADD COLUMN notes TEXT"))
-                except Exception:
-                    pass
-        # Ensure film_rolls.start_date and end_date
-        fr_cols = [c["name"] for c in inspector.get_columns("film_rolls")]
-        with engine.begin() as conn:
-            if "start_date" not in fr_cols:
-                try:
-                    conn.execute(text("ALTER TABLE film_rolls ADD COLUMN start_date DATE"))
-                except Exception:
-                    pass
-            if "end_date" not in fr_cols:
-                try:
-                    conn.execute(text("ALTER TABLE film_rolls ADD COLUMN end_date DATE"))
-                except Exception:
-                    pass
-        # Ensure image_assets.capture_date
-        ia_cols = [c["name"] for c in inspector.get_columns("image_assets")]
-        if "capture_date" not in ia_cols:
-            with engine.begin() as conn:
-                try:
-                    conn.execute(text("ALTER TABLE image_assets ADD COLUMN capture_date DATE"))
-                except Exception:
-                    pass
-    except Exception:
-        # Non-fatal: continue
-        pass
-    # Seed default cameras and films with placeholder images
     from pathlib import Path
     Path("static/catalog/cameras").mkdir(parents=True, exist_ok=True)
     Path("static/catalog/films").mkdir(parents=True, exist_ok=True)
     Path("static/catalog/lenses").mkdir(parents=True, exist_ok=True)
-    db = SessionLocal()
-    try:
-        def ensure_camera(name: str, image_rel: str | None, mount: str | None = None):
-            if not db.query(Camera).filter(Camera.name == name).first():
-                db.add(Camera(name=name, image_path=image_rel, mount=mount))
-
-        def ensure_film(name: str, kind: FilmKind, iso: int | None, expired: int, image_rel: str | None):
-            if not db.query(FilmStock).filter(FilmStock.name == name).first():
-                db.add(FilmStock(name=name, kind=kind, iso=iso, expired=expired, image_path=image_rel))
-
-        ensure_camera("Nikon F5", "static/catalog/cameras/nikon-f5.svg", mount="Nikon F")
-        ensure_camera("Minolta XG9", "static/catalog/cameras/minolta-xg9.svg", mount="Minolta SR")
-        ensure_film("Kodak Gold 200", FilmKind.color, 200, 0, "static/catalog/films/kodak-gold-200.svg")
-        ensure_film("Fomapan 100", FilmKind.black_and_white, 100, 0, "static/catalog/films/fomapan-100.svg")
-        ensure_film("Fomapan 200", FilmKind.black_and_white, 200, 0, "static/catalog/films/fomapan-200.svg")
-        ensure_film("Fomapan 400", FilmKind.black_and_white, 400, 0, "static/catalog/films/fomapan-400.svg")
-        db.commit()
-    finally:
-        db.close()
+    if face.FACE_BACKEND == "worker" and face_worker.FACE_WORKER_AUTOSTART:
+        # First API worker to boot starts the shared inference process
+        _face_worker_process["proc"] = face_worker.spawn()
+    if FACE_WARMUP and face.FACE_BACKEND == "local":
+        # Load face models off the startup path so the worker accepts requests immediately
+        threading.Thread(target=face.warm_up, name="face-warm-up", daemon=True).start()
+    if migrations.is_current(engine):
+        return
+    if migrations.AUTO_MIGRATE:
+        migrations.upgrade(engine)
+    else:
+        logger.warning(
+            "Database schema is behind (version %s < %s); run `python -m app.migrations upgrade`",
+            migrations.current_version(engine),
+            migrations.LATEST_VERSION,
+        )
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    proc = _face_worker_process.get("proc")
+    if proc is not None and proc.poll() is None:
+        proc.terminate()
+
 
 # Mount static
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -106,6 +87,28 @@ def index():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admin/profile", include_in_schema=False)
+async def profile_worker(
+    seconds: float = 10.0,
+    interval_ms: float = 5.0,
+    x_admin_token: str | None = Header(None),
+):
+    """Sample every thread of this worker for N seconds; returns collapsed stacks."""
+    if not authorized(x_admin_token):
+        return PlainTextResponse("forbidden\n", status_code=403)
+    sampler = Sampler(interval_seconds(interval_ms)).start()
+    try:
+        await asyncio.sleep(max(0.1, min(seconds, MAX_SECONDS)))
+    finally:
+        sampler.stop()
+    return PlainTextResponse(sampler.collapsed(), headers={"X-Profile-Samples": str(sampler.samples)})
+
+
 # Routers
 app.include_router(films.router)
 app.include_router(images.router)
@@ -113,4 +116,5 @@ app.include_router(search.router)
 app.include_router(cameras.router)
 app.include_router(filmstocks.router)
 app.include_router(api.router)
+app.include_router(faces.router)
 app.include_router(lenses.router)
\ No newline at end of file
@@ -0,0 +1,549 @@
+"""Versioned schema migrations.
+
+Each migration is an idempotent function applied inside its own transaction
+and recorded in the ``schema_version`` table. Run them before starting the
+API workers:
+
+    python -m app.migrations upgrade
+
+The app's startup hook only performs the cheap ``is_current`` check (one
+query) and, when AUTO_MIGRATE is enabled, applies pending migrations itself.
+
+Migrations are plain SQL written against the schema of their own version.
+m001 creates the tables as they were when versioning began, and every later
+change is a migration of its own, so a fresh install and an upgraded one go
+through the same steps. Migrations never import models or services, so later
+changes to the app can't alter what an old migration does.
+"""
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+from .db import engine
+
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true").lower() == "true"
+
+# Arbitrary constant for pg_advisory_lock so concurrent workers serialize
+_PG_LOCK_KEY = 0x4E454741  # "NEGA"
+
+
+def _add_columns(conn: Connection, table: str, columns: List[Tuple[str, str]]) -> None:
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    for name, ddl in columns:
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+def _create_indexes(conn: Connection, indexes: List[Tuple[str, str, str]]) -> None:
+    for name, table, cols in indexes:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({cols})"))
+
+
+# Schema when versioning began, with per-dialect spellings of the column types
+_BASELINE_ENUMS = {
+    "filmkind": ("black_and_white", "color", "slide", "motion_picture"),
+    "imagetype": ("contact_sheet", "scan"),
+}
+_BASELINE_TYPES = {
+    "postgresql": {"serial": "SERIAL", "timestamp": "TIMESTAMP WITHOUT TIME ZONE", "json": "JSON",
+                   "filmkind": "filmkind", "imagetype": "imagetype"},
+    "sqlite": {"serial": "INTEGER", "timestamp": "DATETIME", "json": "TEXT",
+               "filmkind": "VARCHAR(15)", "imagetype": "VARCHAR(13)"},
+}
+_BASELINE_TABLES = [
+    ("cameras", """id {serial} NOT NULL PRIMARY KEY,
+    name VARCHAR(200) NOT NULL,
+    image_path VARCHAR(500),
+    mount VARCHAR(100),
+    notes TEXT,
+    created_at {timestamp} NOT NULL"""),
+    ("film_rolls", """id {serial} NOT NULL PRIMARY KEY,
+    title VARCHAR(200) NOT NULL,
+    camera VARCHAR(200),
+    lens VARCHAR(200),
+    film_type VARCHAR(200),
+    notes TEXT,
+    start_date DATE,
+    end_date DATE,
+    building VARCHAR(200),
+    folder VARCHAR(200),
+    archive_serial VARCHAR(200),
+    created_at {timestamp} NOT NULL"""),
+    ("film_stocks", """id {serial} NOT NULL PRIMARY KEY,
+    name VARCHAR(200) NOT NULL,
+    iso INTEGER,
+    kind {filmkind} NOT NULL,
+    expired INTEGER,
+    expiration_date DATE,
+    image_path VARCHAR(500),
+    created_at {timestamp} NOT NULL"""),
+    ("lenses", """id {serial} NOT NULL PRIMARY KEY,
+    name VARCHAR(200) NOT NULL,
+    mount VARCHAR(100),
+    image_path VARCHAR(500),
+    notes TEXT,
+    created_at {timestamp} NOT NULL"""),
+    ("persons", """id {serial} NOT NULL PRIMARY KEY,
+    name VARCHAR(200) NOT NULL,
+    created_at {timestamp} NOT NULL"""),
+    ("image_assets", """id {serial} NOT NULL PRIMARY KEY,
+    film_roll_id INTEGER NOT NULL REFERENCES film_rolls (id),
+    type {imagetype} NOT NULL,
+    path VARCHAR(500) NOT NULL,
+    frame_number INTEGER,
+    notes TEXT,
+    capture_date DATE,
+    created_at {timestamp} NOT NULL"""),
+    ("faces", """id {serial} NOT NULL PRIMARY KEY,
+    image_id INTEGER NOT NULL REFERENCES image_assets (id),
+    bbox_x INTEGER NOT NULL,
+    bbox_y INTEGER NOT NULL,
+    bbox_w INTEGER NOT NULL,
+    bbox_h INTEGER NOT NULL,
+    embedding {json},
+    person_id INTEGER REFERENCES persons (id),
+    created_at {timestamp} NOT NULL"""),
+]
+_BASELINE_UNIQUE = [
+    ("ix_cameras_name", "cameras", "name"),
+    ("ix_film_stocks_name", "film_stocks", "name"),
+    ("ix_lenses_name", "lenses", "name"),
+    ("ix_persons_name", "persons", "name"),
+]
+_BASELINE_INDEXES = [
+    ("ix_cameras_id", "cameras", "id"),
+    ("ix_film_rolls_id", "film_rolls", "id"),
+    ("ix_film_stocks_id", "film_stocks", "id"),
+    ("ix_lenses_id", "lenses", "id"),
+    ("ix_persons_id", "persons", "id"),
+    ("ix_image_assets_id", "image_assets", "id"),
+    ("ix_image_assets_film_roll_id", "image_assets", "film_roll_id"),
+    ("ix_image_assets_type", "image_assets", "type"),
+    ("ix_faces_id", "faces", "id"),
+    ("ix_faces_image_id", "faces", "image_id"),
+    ("ix_faces_person_id", "faces", "person_id"),
+]
+
+
+def m001_baseline(conn: Connection) -> None:
+    """Create the tables as of versioning and backfill columns added before it existed."""
+    pg = conn.dialect.name == "postgresql"
+    types = _BASELINE_TYPES["postgresql" if pg else "sqlite"]
+    if pg:
+        have = {n for (n,) in conn.execute(text("SELECT typname FROM pg_type"))}
+        for name, labels in _BASELINE_ENUMS.items():
+            if name not in have:
+                conn.execute(text(f"CREATE TYPE {name} AS ENUM ({', '.join(repr(v) for v in labels)})"))
+    for table, columns in _BASELINE_TABLES:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table} (\n    {columns.format(**types)}\n)"))
+    for name, table, cols in _BASELINE_UNIQUE:
+        conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({cols})"))
+    _create_indexes(conn, _BASELINE_INDEXES)
+    _add_columns(conn, "film_stocks", [("expiration_date", "DATE")])
+    _add_columns(conn, "cameras", [("mount", "VARCHAR(100)"), ("notes", "TEXT")])
+    _add_columns(conn, "film_rolls", [("start_date", "DATE"), ("end_date", "DATE")])
+    _add_columns(conn, "image_assets", [("capture_date", "DATE")])
+
+
+def m002_seed_catalog(conn: Connection) -> None:
+    """Seed default cameras and film stocks with placeholder images."""
+    now = datetime.utcnow()
+    cameras = [
+        ("Nikon F5", "static/catalog/cameras/nikon-f5.svg", "Nikon F"),
+        ("Minolta XG9", "static/catalog/cameras/minolta-xg9.svg", "Minolta SR"),
+    ]
+    films = [
+        ("Kodak Gold 200", "color", 200, 0, "static/catalog/films/kodak-gold-200.svg"),
+        ("Fomapan 100", "black_and_white", 100, 0, "static/catalog/films/fomapan-100.svg"),
+        ("Fomapan 200", "black_and_white", 200, 0, "static/catalog/films/fomapan-200.svg"),
+        ("Fomapan 400", "black_and_white", 400, 0, "static/catalog/films/fomapan-400.svg"),
+    ]
+    have_cameras = {n for (n,) in conn.execute(text("SELECT name FROM cameras"))}
+    have_films = {n for (n,) in conn.execute(text("SELECT name FROM film_stocks"))}
+    for name, image_rel, mount in cameras:
+        if name not in have_cameras:
+            conn.execute(text(
+                "INSERT INTO cameras (name, image_path, mount, created_at) VALUES (:name, :image_path, :mount, :now)"
+            ), {"name": name, "image_path": image_rel, "mount": mount, "now": now})
+    for name, kind, iso, expired, image_rel in films:
+        if name not in have_films:
+            conn.execute(text(
+                "INSERT INTO film_stocks (name, kind, iso, expired, image_path, created_at) "
+                "VALUES (:name, :kind, :iso, :expired, :image_path, :now)"
+            ), {"name": name, "kind": kind, "iso": iso, "expired": expired, "image_path": image_rel, "now": now})
+
+
+def m003_listing_indexes(conn: Connection) -> None:
+    """Indexes for created_at listings and per-roll frame ordering."""
+    _create_indexes(conn, [
+        ("ix_film_rolls_created_at", "film_rolls", "created_at"),
+        ("ix_image_assets_created_at", "image_assets", "created_at"),
+        ("ix_image_assets_roll_type_frame", "image_assets", "film_roll_id, type, frame_number"),
+    ])
+
+
+def m004_query_shape_indexes(conn: Connection) -> None:
+    """Replace single-column roll indexes with composites matching the API queries."""
+    _create_indexes(conn, [
+        ("ix_image_assets_roll_id", "image_assets", "film_roll_id, id"),
+        ("ix_image_assets_roll_type_id", "image_assets", "film_roll_id, type, id"),
+    ])
+    # Postgres can answer frame-ordered path lookups from the index alone
+    include = " INCLUDE (path)" if conn.dialect.name == "postgresql" else ""
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_image_assets_roll_type_frame_id "
+        f"ON image_assets (film_roll_id, type, frame_number, id){include}"
+    ))
+    # Both are prefixes of the composites above
+    conn.execute(text("DROP INDEX IF EXISTS ix_image_assets_film_roll_id"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_image_assets_roll_type_frame"))
+
+
+
+def m005_face_index_tracking(conn: Connection) -> None:
+    """Track which images went through face detection; checkpoint table for batch jobs."""
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS job_checkpoints "
+        "(name VARCHAR(100) PRIMARY KEY, position INTEGER, updated_at TIMESTAMP)"
+    ))
+    _add_columns(conn, "image_assets", [("faces_indexed_at", "TIMESTAMP")])
+    # Images that already have faces were indexed by the upload path
+    conn.execute(text(
+        "UPDATE image_assets SET faces_indexed_at = created_at "
+        "WHERE faces_indexed_at IS NULL AND id IN (SELECT image_id FROM faces)"
+    ))
+
+
+
+def m006_person_face_index(conn: Connection) -> None:
+    """Composite index for keyset-paginated per-person face listings."""
+    _create_indexes(conn, [("ix_faces_person_id_id", "faces", "person_id, id")])
+    conn.execute(text("DROP INDEX IF EXISTS ix_faces_person_id"))
+
+
+
+def m007_person_prototype_sums(conn: Connection) -> None:
+    """Store running embedding sums and counts per person; seed them from labelled faces."""
+    _add_columns(conn, "persons", [("embedding_sum", "JSON"), ("embedding_count", "INTEGER DEFAULT 0")])
+    sums: Dict[int, List[float]] = {}
+    counts: Dict[int, int] = {}
+    rows = conn.execute(text(
+        "SELECT person_id, embedding FROM faces WHERE person_id IS NOT NULL AND embedding IS NOT NULL"
+    ))
+    for pid, embedding in rows:
+        # JSON comes back parsed from Postgres, as text from SQLite
+        if isinstance(embedding, str):
+            embedding = json.loads(embedding)
+        v = embedding.get("v") if isinstance(embedding, dict) else None
+        if not isinstance(v, list) or not v:
+            continue
+        if pid not in sums:
+            sums[pid] = [float(x) for x in v]
+            counts[pid] = 1
+        elif len(v) == len(sums[pid]):
+            sums[pid] = [a + b for a, b in zip(sums[pid], v)]
+            counts[pid] += 1
+    conn.execute(text("UPDATE persons SET embedding_sum = NULL, embedding_count = 0"))
+    for pid, total in sums.items():
+        conn.execute(
+            text("UPDATE persons SET embedding_sum = :total, embedding_count = :count WHERE id = :id"),
+            {"total": json.dumps(total), "count": counts[pid], "id": pid},
+        )
+
+
+
+def m008_perceptual_hash(conn: Connection) -> None:
+    """Perceptual hash plus indexed 16-bit bands for near-duplicate lookups."""
+    _add_columns(conn, "image_assets", [("phash", "BIGINT")] + [(f"phash_band{k}", "INTEGER") for k in range(4)])
+    _create_indexes(conn, [("ix_image_assets_phash", "image_assets", "phash")] + [
+        (f"ix_image_assets_phash_band{k}", "image_assets", f"phash_band{k}") for k in range(4)
+    ])
+
+
+def m009_frame_segmentation(conn: Connection) -> None:
+    """Child frame rows cut from sheet / strip scans."""
+    _add_columns(conn, "image_assets", [
+        ("parent_id", "INTEGER REFERENCES image_assets(id)"),
+        ("crop_x", "INTEGER"),
+        ("crop_y", "INTEGER"),
+        ("crop_w", "INTEGER"),
+        ("crop_h", "INTEGER"),
+        ("segmented_at", "TIMESTAMP"),
+    ])
+    _create_indexes(conn, [("ix_image_assets_parent_id", "image_assets", "parent_id")])
+
+
+def m010_image_metadata(conn: Connection) -> None:
+    """Intrinsic file metadata captured at ingest."""
+    _add_columns(conn, "image_assets", [
+        ("width", "INTEGER"),
+        ("height", "INTEGER"),
+        ("bit_depth", "INTEGER"),
+        ("channels", "INTEGER"),
+        ("format", "VARCHAR(20)"),
+        ("byte_size", "BIGINT"),
+        ("dpi", "INTEGER"),
+        ("scanner", "VARCHAR(200)"),
+        ("has_icc", "BOOLEAN"),
+    ])
+
+
+def m011_storage_key(conn: Connection) -> None:
+    """Storage key per image; seeded from paths already relative to the static root."""
+    _add_columns(conn, "image_assets", [("storage_key", "VARCHAR(500)")])
+    conn.execute(text(
+        "UPDATE image_assets SET storage_key = SUBSTR(path, 8) "
+        "WHERE storage_key IS NULL AND path LIKE 'static/%'"
+    ))
+
+
+# Tables with a change counter, and the columns whose updates count as a
+# change (None: any). Bookkeeping columns written by background jobs are
+# left out so face indexing or hashing doesn't invalidate every listing.
+VERSIONED_TABLES = {
+    "film_rolls": None,
+    "cameras": None,
+    "lenses": None,
+    "film_stocks": None,
+    "image_assets": [
+        "film_roll_id", "type", "path", "storage_key", "frame_number", "notes", "capture_date", "created_at",
+        "width", "height", "bit_depth", "channels", "format", "byte_size", "dpi", "scanner", "has_icc",
+        "parent_id", "crop_x", "crop_y", "crop_w", "crop_h",
+    ],
+}
+
+
+def m012_table_versions(conn: Connection) -> None:
+    """Per-table change counters kept by triggers, for collection ETags."""
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS table_versions (name VARCHAR(64) PRIMARY KEY, version BIGINT NOT NULL)"
+    ))
+    have = {n for (n,) in conn.execute(text("SELECT name FROM table_versions"))}
+    for table in VERSIONED_TABLES:
+        if table not in have:
+            conn.execute(text("INSERT INTO table_versions (name, version) VALUES (:n, 0)"), {"n": table})
+    if conn.dialect.name == "postgresql":
+        # Statement-level: one bump per INSERT/UPDATE/DELETE, however many rows
+        conn.execute(text(
+            "CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$ BEGIN "
+            "UPDATE table_versions SET version = version + 1 WHERE name = TG_TABLE_NAME; "
+            "RETURN NULL; END $$ LANGUAGE plpgsql"
+        ))
+        for table, columns in VERSIONED_TABLES.items():
+            update = f"UPDATE OF {', '.join(columns)}" if columns else "UPDATE"
+            conn.execute(text(f"DROP TRIGGER IF EXISTS trg_{table}_version ON {table}"))
+            conn.execute(text(
+                f"CREATE TRIGGER trg_{table}_version AFTER INSERT OR DELETE OR TRUNCATE OR {update} ON {table} "
+                "FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()"
+            ))
+        return
+    # SQLite only has row-level triggers
+    bump = "UPDATE table_versions SET version = version + 1 WHERE name = '{table}'"
+    for table, columns in VERSIONED_TABLES.items():
+        update = f"UPDATE OF {', '.join(columns)}" if columns else "UPDATE"
+        for name, event in (("insert", "INSERT"), ("delete", "DELETE"), ("update", update)):
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{name} AFTER {event} ON {table} "
+                f"BEGIN {bump.format(table=table)}; END"
+            ))
+
+
+# Roll summary upkeep, shared by both dialects' triggers. The counts move by
+# deltas, so concurrent writers to one roll can't overwrite each other's
+# totals; the cover is recomputed (one index probe) only when it is removed.
+# An image leaving a roll takes its faces along, so the face count is right
+# whether faces are deleted before or after their image.
+_ROLL_REMOVE = """UPDATE film_rolls SET
+    scan_count = scan_count - CASE WHEN OLD.type = 'scan' THEN 1 ELSE 0 END,
+    contact_sheet_count = contact_sheet_count - CASE WHEN OLD.type = 'contact_sheet' THEN 1 ELSE 0 END,
+    face_count = face_count - (SELECT COUNT(*) FROM faces WHERE image_id = OLD.id),
+    cover_image_id = CASE WHEN cover_image_id = OLD.id THEN (
+        SELECT MIN(id) FROM image_assets WHERE film_roll_id = OLD.film_roll_id AND type = 'scan' AND id <> OLD.id
+    ) ELSE cover_image_id END,
+    last_modified = {now}
+WHERE id = OLD.film_roll_id"""
+_ROLL_ADD = """UPDATE film_rolls SET
+    scan_count = scan_count + CASE WHEN NEW.type = 'scan' THEN 1 ELSE 0 END,
+    contact_sheet_count = contact_sheet_count + CASE WHEN NEW.type = 'contact_sheet' THEN 1 ELSE 0 END,
+    face_count = face_count + (SELECT COUNT(*) FROM faces WHERE image_id = NEW.id),
+    cover_image_id = CASE WHEN NEW.type = 'scan' AND (cover_image_id IS NULL OR NEW.id < cover_image_id)
+        THEN NEW.id ELSE cover_image_id END,
+    last_modified = {now}
+WHERE id = NEW.film_roll_id"""
+_ROLL_FACE = """UPDATE film_rolls SET face_count = face_count {sign} 1, last_modified = {now}
+WHERE id = (SELECT film_roll_id FROM image_assets WHERE id = {row}.image_id)"""
+_ROLL_BACKFILL = """UPDATE film_rolls SET
+    scan_count = (SELECT COUNT(*) FROM image_assets i WHERE i.film_roll_id = film_rolls.id AND i.type = 'scan'),
+    contact_sheet_count = (
+        SELECT COUNT(*) FROM image_assets i WHERE i.film_roll_id = film_rolls.id AND i.type = 'contact_sheet'
+    ),
+    cover_image_id = (SELECT MIN(i.id) FROM image_assets i WHERE i.film_roll_id = film_rolls.id AND i.type = 'scan'),
+    face_count = (
+        SELECT COUNT(*) FROM faces f JOIN image_assets i ON i.id = f.image_id WHERE i.film_roll_id = film_rolls.id
+    ),
+    last_modified = COALESCE(
+        (SELECT MAX(i.created_at) FROM image_assets i WHERE i.film_roll_id = film_rolls.id), created_at
+    )"""
+
+
+def m013_roll_summaries(conn: Connection) -> None:
+    """Per-roll counts, cover and last change for the films list, maintained by triggers."""
+    _add_columns(conn, "film_rolls", [
+        ("scan_count", "INTEGER NOT NULL DEFAULT 0"),
+        ("contact_sheet_count", "INTEGER NOT NULL DEFAULT 0"),
+        ("cover_image_id", "INTEGER"),
+        ("face_count", "INTEGER NOT NULL DEFAULT 0"),
+        ("last_modified", "TIMESTAMP"),
+    ])
+    if conn.dialect.name == "postgresql":
+        now = "(now() AT TIME ZONE 'utc')"
+        conn.execute(text(
+            "CREATE OR REPLACE FUNCTION roll_summary_images() RETURNS trigger AS $$ BEGIN "
+            "IF TG_OP = 'UPDATE' AND OLD.film_roll_id IS NOT DISTINCT FROM NEW.film_roll_id "
+            "AND OLD.type = NEW.type THEN RETURN NULL; END IF; "
+            f"IF TG_OP <> 'INSERT' THEN {_ROLL_REMOVE.format(now=now)}; END IF; "
+            f"IF TG_OP <> 'DELETE' THEN {_ROLL_ADD.format(now=now)}; END IF; "
+            "RETURN NULL; END $$ LANGUAGE plpgsql"
+        ))
+        conn.execute(text(
+            "CREATE OR REPLACE FUNCTION roll_summary_faces() RETURNS trigger AS $$ BEGIN "
+            "IF TG_OP = 'UPDATE' AND OLD.image_id IS NOT DISTINCT FROM NEW.image_id THEN RETURN NULL; END IF; "
+            f"IF TG_OP <> 'INSERT' THEN {_ROLL_FACE.format(sign='-', now=now, row='OLD')}; END IF; "
+            f"IF TG_OP <> 'DELETE' THEN {_ROLL_FACE.format(sign='+', now=now, row='NEW')}; END IF; "
+            "RETURN NULL; END $$ LANGUAGE plpgsql"
+        ))
+        for table, columns, fn in (
+            ("image_assets", "film_roll_id, type", "roll_summary_images"),
+            ("faces", "image_id", "roll_summary_faces"),
+        ):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS trg_{table}_roll_summary ON {table}"))
+            conn.execute(text(
+                f"CREATE TRIGGER trg_{table}_roll_summary AFTER INSERT OR DELETE OR UPDATE OF {columns} ON {table} "
+                f"FOR EACH ROW EXECUTE PROCEDURE {fn}()"
+            ))
+    else:
+        now = "CURRENT_TIMESTAMP"
+        remove, add = _ROLL_REMOVE.format(now=now), _ROLL_ADD.format(now=now)
+        face_remove = _ROLL_FACE.format(sign="-", now=now, row="OLD")
+        face_add = _ROLL_FACE.format(sign="+", now=now, row="NEW")
+        for name, event, body in (
+            ("image_assets_roll_insert", "INSERT ON image_assets", add),
+            ("image_assets_roll_delete", "DELETE ON image_assets", remove),
+            (
+                "image_assets_roll_update",
+                "UPDATE OF film_roll_id, type ON image_assets "
+                "WHEN OLD.film_roll_id IS NOT NEW.film_roll_id OR OLD.type IS NOT NEW.type",
+                f"{remove}; {add}",
+            ),
+            ("faces_roll_insert", "INSERT ON faces", face_add),
+            ("faces_roll_delete", "DELETE ON faces", face_remove),
+            (
+                "faces_roll_update",
+                "UPDATE OF image_id ON faces WHEN OLD.image_id IS NOT NEW.image_id",
+                f"{face_remove}; {face_add}",
+            ),
+        ):
+            conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS trg_{name} AFTER {event} BEGIN {body}; END"))
+    conn.execute(text(_ROLL_BACKFILL))
+
+
+def m014_original_filename(conn: Connection) -> None:
+    """Upload-time file name per image; unknown (NULL) for earlier imports."""
+    _add_columns(conn, "image_assets", [("original_filename", "VARCHAR(500)")])
+
+
+MIGRATIONS: List[Tuple[int, Callable[[Connection], None]]] = [
+    (1, m001_baseline),
+    (2, m002_seed_catalog),
+    (3, m003_listing_indexes),
+    (4, m004_query_shape_indexes),
+    (5, m005_face_index_tracking),
+    (6, m006_person_face_index),
+    (7, m007_person_prototype_sums),
+    (8, m008_perceptual_hash),
+    (9, m009_frame_segmentation),
+    (10, m010_image_metadata),
+    (11, m011_storage_key),
+    (12, m012_table_versions),
+    (13, m013_roll_summaries),
+    (14, m014_original_filename),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _ensure_version_table(eng: Engine) -> None:
+    with eng.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, name VARCHAR(200), applied_at TIMESTAMP)"
+        ))
+
+
+def current_version(eng: Engine = engine) -> int:
+    """Highest applied migration, or 0 when the version table is missing."""
+    try:
+        with eng.connect() as conn:
+            return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    except Exception:
+        return 0
+
+
+def is_current(eng: Engine = engine) -> bool:
+    return current_version(eng) >= LATEST_VERSION
+
+
+def upgrade(eng: Engine = engine) -> List[int]:
+    """Apply pending migrations in order. Returns the versions applied."""
+    applied: List[int] = []
+    with eng.connect() as lock_conn:
+        pg = eng.dialect.name == "postgresql"
+        if pg:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": _PG_LOCK_KEY})
+            lock_conn.commit()
+        try:
+            _ensure_version_table(eng)
+            current = current_version(eng)
+            for version, fn in MIGRATIONS:
+                if version <= current:
+                    continue
+                try:
+                    with eng.begin() as conn:
+                        fn(conn)
+                        conn.execute(
+                            text("INSERT INTO schema_version (version, name, applied_at) VALUES (:v, :n, :t)"),
+                            {"v": version, "n": fn.__name__, "t": datetime.utcnow()},
+                        )
+                    applied.append(version)
+                except IntegrityError:
+                    # Another process recorded this version first; its changes are in place
+                    continue
+        finally:
+            if pg:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _PG_LOCK_KEY})
+                lock_conn.commit()
+    return applied
+
+
+def main(argv: List[str]) -> int:
+    cmd = argv[0] if argv else "upgrade"
+    if cmd == "upgrade":
+        applied = upgrade()
+        print(f"schema at version {current_version()} (applied: {applied or 'none'})")
+        return 0
+    if cmd == "status":
+        version = current_version()
+        print(f"schema at version {version}, latest {LATEST_VERSION}")
+        return 0 if version >= LATEST_VERSION else 1
+    print("usage: python -m app.migrations [upgrade|status]")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,7 +1,6 @@
 from datetime import datetime, date
-from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Enum, Text
+from sqlalchemy import BigInteger, Boolean, Column, Integer, String, DateTime, Date, ForeignKey, Enum, Text, Index, JSON
 from sqlalchemy.orm import relationship, Mapped, mapped_column
-from sqlalchemy.dialects.postgresql import JSON
 import enum
 
 from .db import Base
@@ -74,7 +73,16 @@ class FilmRoll(Base):
     folder: Mapped[str | None] = mapped_column(String(200))
     archive_serial: Mapped[str | None] = mapped_column(String(200))
 
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+    # Roll summary for listings, kept current by triggers on image_assets and
+    # faces (migration 13) rather than by the app. The cover is the first scan;
+    # last_modified is when images or faces were last added, removed or moved.
+    scan_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    contact_sheet_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    cover_image_id: Mapped[int | None] = mapped_column(Integer)
+    face_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    last_modified: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow)
 
     images: Mapped[list["ImageAsset"]] = relationship("ImageAsset", back_populates="film_roll", cascade="all, delete-orphan")
 
@@ -83,16 +91,63 @@ class ImageAsset(Base):
     __tablename__ = "image_assets"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    film_roll_id: Mapped[int] = mapped_column(Integer, ForeignKey("film_rolls.id"), index=True)
+    film_roll_id: Mapped[int] = mapped_column(Integer, ForeignKey("film_rolls.id"))
     type: Mapped[ImageType] = mapped_column(Enum(ImageType), index=True)
     path: Mapped[str] = mapped_column(String(500))
+    # Key under the static root, served at /static/<key>; see app/services/storage.py
+    storage_key: Mapped[str | None] = mapped_column(String(500))
+    # Name the file was uploaded under (path within the archive for ZIP
+    # imports); stored files are renamed, and PATCH /api/images numbers by it
+    original_filename: Mapped[str | None] = mapped_column(String(500))
     frame_number: Mapped[int | None] = mapped_column(Integer)
     notes: Mapped[str | None] = mapped_column(Text)
     capture_date: Mapped[date | None] = mapped_column(Date)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    # Set once face detection has run, even when no faces were found
+    faces_indexed_at: Mapped[datetime | None] = mapped_column(DateTime)
+    # 64-bit perceptual hash (signed) and its four 16-bit bands for
+    # multi-index Hamming search, see app/services/phash.py
+    phash: Mapped[int | None] = mapped_column(BigInteger, index=True)
+    phash_band0: Mapped[int | None] = mapped_column(Integer, index=True)
+    phash_band1: Mapped[int | None] = mapped_column(Integer, index=True)
+    phash_band2: Mapped[int | None] = mapped_column(Integer, index=True)
+    phash_band3: Mapped[int | None] = mapped_column(Integer, index=True)
+    # Intrinsic file metadata read from the headers at ingest, see
+    # app/services/imaging.py probe(); frames report their crop size
+    width: Mapped[int | None] = mapped_column(Integer)
+    height: Mapped[int | None] = mapped_column(Integer)
+    bit_depth: Mapped[int | None] = mapped_column(Integer)
+    channels: Mapped[int | None] = mapped_column(Integer)
+    format: Mapped[str | None] = mapped_column(String(20))
+    byte_size: Mapped[int | None] = mapped_column(BigInteger)
+    dpi: Mapped[int | None] = mapped_column(Integer)
+    scanner: Mapped[str | None] = mapped_column(String(200))
+    has_icc: Mapped[bool | None] = mapped_column(Boolean)
+    # Frames cut from a contact sheet or strip scan: the parent's file, cropped
+    # to crop_* (original pixels), see app/services/segmentation.py
+    parent_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("image_assets.id"), index=True)
+    crop_x: Mapped[int | None] = mapped_column(Integer)
+    crop_y: Mapped[int | None] = mapped_column(Integer)
+    crop_w: Mapped[int | None] = mapped_column(Integer)
+    crop_h: Mapped[int | None] = mapped_column(Integer)
+    segmented_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+    # Composite indexes follow the per-roll query shapes (see app/queryplan.py):
+    # roll listing by id, roll+type listing by id, and frame-ordered scans
+    # (contact sheets, thumbnails) which Postgres can answer index-only.
+    __table_args__ = (
+        Index("ix_image_assets_roll_id", "film_roll_id", "id"),
+        Index("ix_image_assets_roll_type_id", "film_roll_id", "type", "id"),
+        Index(
+            "ix_image_assets_roll_type_frame_id",
+            "film_roll_id", "type", "frame_number", "id",
+            postgresql_include=["path"],
+        ),
+    )
 
     film_roll: Mapped[FilmRoll] = relationship("FilmRoll", back_populates="images")
     faces: Mapped[list["Face"]] = relationship("Face", back_populates="image", cascade="all, delete-orphan")
+    children: Mapped[list["ImageAsset"]] = relationship("ImageAsset", cascade="all, delete-orphan")
 
 
 class Person(Base):
@@ -101,6 +156,9 @@ class Person(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(200), unique=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Running sum and count of member face embeddings; prototype = sum / count
+    embedding_sum: Mapped[list | None] = mapped_column(JSON)
+    embedding_count: Mapped[int] = mapped_column(Integer, default=0)
 
     faces: Mapped[list["Face"]] = relationship("Face", back_populates="person")
 
@@ -115,11 +173,35 @@ class Face(Base):
     bbox_w: Mapped[int] = mapped_column(Integer)
     bbox_h: Mapped[int] = mapped_column(Integer)
 
-    # Store embedding as JSON for portability across DBs
-    embedding: Mapped[dict | None] = mapped_column(JSON().with_variant(Text(), "sqlite"))
+    # Store embedding as JSON for portability across DBs. The generic type replaced a
+    # plain Text variant on SQLite, which couldn't bind the dict; the column is TEXT
+    # there either way and JSON on Postgres, so the change needed no migration.
+    embedding: Mapped[dict | None] = mapped_column(JSON)
 
-    person_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("persons.id"), index=True)
+    person_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("persons.id"))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+    # Per-person galleries page through faces by id
+    __table_args__ = (Index("ix_faces_person_id_id", "person_id", "id"),)
+
     image: Mapped[ImageAsset] = relationship("ImageAsset", back_populates="faces")
-    person: Mapped[Person | None] = relationship("Person", back_populates="faces")
\ No newline at end of file
+    person: Mapped[Person | None] = relationship("Person", back_populates="faces")
+
+
+class JobCheckpoint(Base):
+    """Resume position of a long-running maintenance job (last processed id)."""
+
+    __tablename__ = "job_checkpoints"
+
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    position: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class TableVersion(Base):
+    """Change counter of a table, bumped by database triggers; see app/etags.py."""
+
+    __tablename__ = "table_versions"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
@@ -0,0 +1,147 @@
+"""Opt-in statistical profiler.
+
+A background thread snapshots every thread's stack via
+``sys._current_frames()`` at a fixed interval and aggregates them into
+collapsed stacks (``frame;frame;frame count``), the input format of
+flamegraph.pl and speedscope.
+
+Disabled unless NEGARCHIVE_ADMIN_TOKEN is set. Callers authenticate with
+the ``X-Admin-Token`` header and either profile for the duration of a single
+request by adding ``profile=1`` to its query string (the response body is
+replaced by the collapsed stacks), or sample the worker for a set time via
+``GET /admin/profile``.
+
+Either way the samples cover every thread of the worker process. A request
+runs partly on the event loop and partly on threadpool threads shared with
+other requests, so its own stacks can't be picked out. Whatever else the
+worker runs meanwhile shows up too, so profile requests on a quiet worker.
+"""
+import hmac
+import os
+import sys
+import threading
+from collections import Counter
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+ADMIN_TOKEN = os.getenv("NEGARCHIVE_ADMIN_TOKEN", "")
+DEFAULT_INTERVAL = 0.005  # seconds between samples
+# Accepted sampling intervals; below 1 ms the sampler would busy-loop
+MIN_INTERVAL_MS = 1.0
+MAX_INTERVAL_MS = 1000.0
+MAX_SECONDS = 120.0
+
+# Frames from the sampler itself are noise in every profile
+_SELF_FILE = os.path.abspath(__file__)
+
+
+def authorized(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def interval_seconds(value) -> float:
+    """Sampling interval from a user-supplied millisecond value: the default when
+    missing or not a number, else clamped to MIN_INTERVAL_MS..MAX_INTERVAL_MS."""
+    try:
+        ms = float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_INTERVAL
+    if ms != ms:
+        # NaN
+        return DEFAULT_INTERVAL
+    return min(max(ms, MIN_INTERVAL_MS), MAX_INTERVAL_MS) / 1000.0
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """Collects collapsed stacks for all threads until stopped."""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL) -> None:
+        self.interval = max(0.001, interval)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample_once(self) -> None:
+        me = threading.get_ident()
+        names: Dict[int, str] = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            labels = []
+            f = frame
+            while f is not None:
+                if os.path.abspath(f.f_code.co_filename) != _SELF_FILE:
+                    labels.append(_frame_label(f))
+                f = f.f_back
+            if not labels:
+                continue
+            labels.append(names.get(ident, f"thread-{ident}"))
+            self.stacks[";".join(reversed(labels))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample_once()
+
+    def start(self) -> "Sampler":
+        self._thread = threading.Thread(target=self._run, name="negarchive-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "Sampler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfilingMiddleware:
+    """Sample the worker while one request runs, when ``profile=1`` is passed with a
+    valid admin token. Concurrent requests land in the same profile."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMIN_TOKEN or b"profile=" not in scope.get("query_string", b""):
+            await self.app(scope, receive, send)
+            return
+        query = parse_qs(scope["query_string"].decode("latin-1"))
+        headers = dict(scope.get("headers") or [])
+        token = headers.get(b"x-admin-token", b"").decode("latin-1")
+        if query.get("profile", ["0"])[-1] not in {"1", "true"} or not authorized(token):
+            await self.app(scope, receive, send)
+            return
+        interval = interval_seconds(query.get("profile_interval_ms", [None])[-1])
+        status = {"code": 500}
+
+        async def swallow(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+
+        sampler = Sampler(interval).start()
+        try:
+            await self.app(scope, receive, swallow)
+        finally:
+            sampler.stop()
+        body = sampler.collapsed().encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profile-samples", str(sampler.samples).encode()),
+                (b"x-profiled-status", str(status["code"]).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
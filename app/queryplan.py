@@ -0,0 +1,155 @@
+"""Query-plan checks for the API's hot query shapes.
+
+Runs EXPLAIN for each query the JSON API issues and fails when one falls
+back to a full table scan. Planners only prefer indexes on realistic data
+sizes, so seed a synthetic archive first (roughly 1M images by default):
+
+    DATABASE_URL=sqlite:///./plan.db python -m app.queryplan --seed
+    DATABASE_URL=sqlite:///./plan.db python -m app.queryplan
+
+Keep QUERY_SHAPES in sync with the queries in app/routers/api.py and
+app/routers/faces.py.
+"""
+import argparse
+import random
+import re
+import sys
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import insert, or_, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import Select
+
+from .db import engine
+from .models import Face, FilmRoll, ImageAsset, ImageType
+from . import migrations
+from .services import phash
+
+SAMPLE_FILM_ID = 1
+SAMPLE_PERSON_ID = 1
+
+QUERY_SHAPES: List[Tuple[str, Callable[[], Select]]] = [
+    ("list_films", lambda: select(FilmRoll).order_by(FilmRoll.created_at.desc())),
+    ("get_film", lambda: (
+        select(ImageAsset)
+        .where(ImageAsset.film_roll_id == SAMPLE_FILM_ID)
+        .order_by(ImageAsset.id.asc())
+    )),
+    ("list_images?film_id&type", lambda: (
+        select(ImageAsset)
+        .where(ImageAsset.film_roll_id == SAMPLE_FILM_ID, ImageAsset.type == ImageType.scan)
+        .order_by(ImageAsset.id.asc())
+    )),
+    ("get_image", lambda: select(ImageAsset).where(ImageAsset.id == SAMPLE_FILM_ID)),
+    ("create_contact_sheet", lambda: (
+        select(ImageAsset)
+        .where(ImageAsset.film_roll_id == SAMPLE_FILM_ID, ImageAsset.type == ImageType.scan)
+        .order_by(ImageAsset.frame_number.asc().nulls_last(), ImageAsset.id.asc())
+    )),
+    ("get_film_thumbs", lambda: (
+        select(ImageAsset.id, ImageAsset.path, ImageAsset.crop_x, ImageAsset.crop_y, ImageAsset.crop_w, ImageAsset.crop_h)
+        .where(ImageAsset.film_roll_id == SAMPLE_FILM_ID, ImageAsset.type == ImageType.scan)
+        .order_by(ImageAsset.frame_number.asc().nulls_last(), ImageAsset.id.asc())
+    )),
+    ("list_image_frames", lambda: (
+        select(ImageAsset)
+        .where(ImageAsset.parent_id == SAMPLE_FILM_ID)
+        .order_by(ImageAsset.frame_number.asc(), ImageAsset.id.asc())
+    )),
+    ("similar_images", lambda: (
+        select(ImageAsset)
+        .where(or_(*[getattr(ImageAsset, f"phash_band{k}").in_([1, 2, 3]) for k in range(4)]))
+    )),
+    ("list_person_faces", lambda: (
+        select(Face.id, Face.image_id, Face.bbox_x, Face.bbox_y, Face.bbox_w, Face.bbox_h)
+        .where(Face.person_id == SAMPLE_PERSON_ID, Face.id > 0)
+        .order_by(Face.id.asc())
+        .limit(100)
+    )),
+]
+
+_TABLES = "(image_assets|film_rolls|faces)"
+_SQLITE_FULL_SCAN = re.compile(rf"\bSCAN (TABLE )?{_TABLES}\b(?! USING)")
+_PG_FULL_SCAN = re.compile(rf"Seq Scan on {_TABLES}\b")
+
+
+def explain(eng: Engine, stmt: Select) -> str:
+    sql = str(stmt.compile(eng, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if eng.dialect.name == "sqlite" else "EXPLAIN "
+    with eng.connect() as conn:
+        rows = conn.execute(text(prefix + sql)).all()
+    # SQLite returns (id, parent, notused, detail); Postgres one text column
+    return "\n".join(str(r[-1]) for r in rows)
+
+
+def check(eng: Engine = engine) -> List[Tuple[str, bool, str]]:
+    """Return (name, uses_index, plan) for every query shape."""
+    pattern = _SQLITE_FULL_SCAN if eng.dialect.name == "sqlite" else _PG_FULL_SCAN
+    results = []
+    for name, build in QUERY_SHAPES:
+        plan = explain(eng, build())
+        results.append((name, not pattern.search(plan), plan))
+    return results
+
+
+def seed(eng: Engine = engine, films: int = 27_800, frames: int = 36, chunk: int = 20_000) -> None:
+    """Bulk-insert a synthetic archive of films x frames scans (plus one sheet per roll)."""
+    now = datetime.utcnow()
+    rng = random.Random(0)
+    with eng.begin() as conn:
+        conn.execute(insert(FilmRoll.__table__), [
+            {"title": f"Roll {n}", "created_at": now} for n in range(films)
+        ])
+        film_ids = conn.execute(select(FilmRoll.id).order_by(FilmRoll.id.desc()).limit(films)).scalars().all()
+    batch: List[dict] = []
+    with eng.begin() as conn:
+        for film_id in reversed(film_ids):
+            for frame in range(1, frames + 1):
+                batch.append({
+                    "film_roll_id": film_id,
+                    "type": ImageType.scan,
+                    "path": f"static/uploads/scans/{film_id}-{frame}.tif",
+                    "frame_number": frame,
+                    "created_at": now,
+                    # Spread hashes so band statistics look like a real archive
+                    **phash.hash_columns(rng.getrandbits(64)),
+                })
+            batch.append({
+                "film_roll_id": film_id,
+                "type": ImageType.contact_sheet,
+                "path": f"static/uploads/contact_sheets/{film_id}.jpg",
+                "frame_number": None,
+                "created_at": now,
+                **phash.hash_columns(rng.getrandbits(64)),
+            })
+            if len(batch) >= chunk:
+                conn.execute(insert(ImageAsset.__table__), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(ImageAsset.__table__), batch)
+        conn.execute(text("ANALYZE"))
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.queryplan")
+    parser.add_argument("--seed", action="store_true", help="seed a synthetic archive before checking")
+    parser.add_argument("--films", type=int, default=27_800)
+    parser.add_argument("--frames", type=int, default=36)
+    parser.add_argument("-v", "--verbose", action="store_true", help="print full plans")
+    args = parser.parse_args(argv)
+
+    migrations.upgrade(engine)
+    if args.seed:
+        seed(engine, films=args.films, frames=args.frames)
+    failed = 0
+    for name, ok, plan in check(engine):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+        if args.verbose or not ok:
+            print("     " + plan.replace("\n", "\n     "))
+        failed += not ok
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,58 +1,118 @@
+import base64
+import json
 import os
+import re
 import shutil
 import tempfile
 import zipfile
 from datetime import date
-from typing import Optional, List
+from typing import Dict, Optional, List
 from uuid import uuid4
 from math import ceil
 from PIL import Image as PILImage
 from PIL import ImageFile as PILImageFile
 
-from fastapi import APIRouter, Depends, Request, UploadFile, File, Form
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi import APIRouter, BackgroundTasks, Body, Depends, Header, Request, UploadFile, File, Form
+from fastapi.responses import StreamingResponse, FileResponse, RedirectResponse
 import io
+from sqlalchemy import Integer, cast, column, or_, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from ..db import get_db
-from ..models import FilmRoll, ImageAsset, Camera, FilmStock, Lens, ImageType, FilmKind
+from .. import etags, events
+from ..db import get_db, get_async_db, async_engine, pool_status
+from ..instrumentation import span
+from ..profiling import authorized
+from ..serialization import ORJSONResponse
+from ..services import face, ingest, phash, positive, segmentation, storage
+from ..services.face import label_faces
+from ..services.imaging import Box, image_box, load_rgb
+from ..models import Face, FilmRoll, ImageAsset, Camera, FilmStock, Lens, ImageType, FilmKind
 
 router = APIRouter(prefix="/api", tags=["api"])
 
 
+# What the film and image dicts are built from. List endpoints select these
+# columns as plain rows instead of hydrating ORM objects, and the *_row_to_dict
+# builders unpack them by position: Row attribute access costs about a
+# microsecond per column, which adds up to seconds on a 50k-row listing.
+FILM_COLUMNS = (
+    FilmRoll.id, FilmRoll.title, FilmRoll.camera, FilmRoll.lens, FilmRoll.film_type, FilmRoll.notes,
+    FilmRoll.building, FilmRoll.folder, FilmRoll.archive_serial, FilmRoll.start_date, FilmRoll.end_date,
+    FilmRoll.created_at, FilmRoll.scan_count, FilmRoll.contact_sheet_count, FilmRoll.cover_image_id,
+    FilmRoll.face_count, FilmRoll.last_modified,
+)
+IMAGE_COLUMNS = (
+    ImageAsset.id, ImageAsset.film_roll_id, ImageAsset.type, ImageAsset.path, ImageAsset.storage_key,
+    ImageAsset.parent_id, ImageAsset.crop_x, ImageAsset.crop_y, ImageAsset.crop_w, ImageAsset.crop_h,
+    ImageAsset.width, ImageAsset.height, ImageAsset.bit_depth, ImageAsset.channels, ImageAsset.format,
+    ImageAsset.byte_size, ImageAsset.dpi, ImageAsset.scanner, ImageAsset.has_icc, ImageAsset.frame_number,
+    ImageAsset.notes, ImageAsset.capture_date, ImageAsset.created_at,
+)
+_FILM_FIELDS = tuple(c.key for c in FILM_COLUMNS)
+_IMAGE_FIELDS = tuple(c.key for c in IMAGE_COLUMNS)
+
+
+async def fetch_rows(db: AsyncSession, stmt):
+    """Run a column select on the session's connection: plain rows, skipping the ORM result layer."""
+    conn = await db.connection()
+    return await conn.execute(stmt)
+
+
+# Dates stay date objects: jsonable_encoder and ORJSONResponse both emit ISO strings
+def film_row_to_dict(row):
+    d = dict(zip(_FILM_FIELDS, row))
+    cover = d["cover_image_id"]
+    d["cover_url"] = f"/api/images/{cover}/preview?width=400" if cover is not None else None
+    return d
+
+
 def film_to_dict(f: FilmRoll):
+    return film_row_to_dict([getattr(f, name) for name in _FILM_FIELDS])
+
+
+def image_row_to_dict(row):
+    (image_id, film_roll_id, kind, path, storage_key, parent_id, crop_x, crop_y, crop_w, crop_h,
+     width, height, bit_depth, channels, fmt, byte_size, dpi, scanner, has_icc, frame_number,
+     notes, capture_date, created_at) = row
+    if crop_w is not None:
+        crop = {"x": crop_x, "y": crop_y, "w": crop_w, "h": crop_h}
+        # Frames cut from a sheet have no file of their own; serve the crop at full size
+        public_url = f"/api/images/{image_id}/preview?width=0"
+    elif storage.is_remote(path):
+        crop = None
+        # Redirects to a presigned bucket URL
+        public_url = f"/api/images/{image_id}/download?inline=true"
+    else:
+        crop = None
+        # Files outside the static root have no public path
+        public_url = storage.public_url(storage_key) if storage_key else f"/api/images/{image_id}/preview?width=0"
     return {
-        "id": f.id,
-        "title": f.title,
-        "camera": f.camera,
-        "lens": f.lens,
-        "film_type": f.film_type,
-        "notes": f.notes,
-        "building": f.building,
-        "folder": f.folder,
-        "archive_serial": f.archive_serial,
-        "start_date": f.start_date.isoformat() if f.start_date else None,
-        "end_date": f.end_date.isoformat() if f.end_date else None,
-        "created_at": f.created_at.isoformat(),
+        "id": image_id,
+        "film_roll_id": film_roll_id,
+        "type": kind.value,
+        "path": path,
+        "url": public_url,
+        "parent_id": parent_id,
+        "crop": crop,
+        "width": width,
+        "height": height,
+        "bit_depth": bit_depth,
+        "channels": channels,
+        "format": fmt,
+        "byte_size": byte_size,
+        "dpi": dpi,
+        "scanner": scanner,
+        "has_icc": has_icc,
+        "frame_number": frame_number,
+        "notes": notes,
+        "capture_date": capture_date,
+        "created_at": created_at,
     }
 
 
 def image_to_dict(i: ImageAsset):
-    # Provide a simple public URL under /static for the frontend
-    filename = i.path.split("/")[-1]
-    base = "uploads/contact_sheets" if i.type == ImageType.contact_sheet else "uploads/scans"
-    public_url = f"/static/{base}/{filename}"
-    return {
-        "id": i.id,
-        "film_roll_id": i.film_roll_id,
-        "type": i.type.value,
-        "path": i.path,
-        "url": public_url,
-        "frame_number": i.frame_number,
-        "notes": i.notes,
-        "capture_date": i.capture_date.isoformat() if getattr(i, "capture_date", None) else None,
-        "created_at": i.created_at.isoformat(),
-    }
+    return image_row_to_dict([getattr(i, name) for name in _IMAGE_FIELDS])
 
 
 def catalog_url(path: Optional[str]):
@@ -62,35 +122,68 @@ def catalog_url(path: Optional[str]):
     return path if path.startswith("/") else f"/{path}"
 
 
+def gear_to_dict(g):
+    """Camera or lens (same columns)."""
+    return {"id": g.id, "name": g.name, "mount": g.mount, "image_path": g.image_path, "url": catalog_url(g.image_path), "notes": g.notes}
+
+
+def filmstock_to_dict(s):
+    return {
+        "id": s.id,
+        "name": s.name,
+        "iso": s.iso,
+        "kind": s.kind.value if isinstance(s.kind, FilmKind) else str(s.kind),
+        "expired": s.expired,
+        "expiration_date": s.expiration_date,
+        "image_path": s.image_path,
+        "url": catalog_url(s.image_path),
+    }
+
+
+@router.get("/db/pool")
+def get_pool_status(x_admin_token: Optional[str] = Header(None)):
+    """Connection pool usage; needs X-Admin-Token, like /admin/profile."""
+    if not authorized(x_admin_token):
+        return ORJSONResponse({"error": "forbidden"}, status_code=403)
+    stats = pool_status()
+    if async_engine is not None:
+        stats["async"] = pool_status(async_engine.sync_engine)
+    return stats
+
+
 @router.get("/films")
-def list_films(db: Session = Depends(get_db)):
-    films = db.query(FilmRoll).order_by(FilmRoll.created_at.desc()).all()
-    return [film_to_dict(f) for f in films]
+async def list_films(request: Request, db: AsyncSession = Depends(get_async_db)):
+    tag = await etags.collection_tag(db, request, "film_rolls")
+    if etags.is_fresh(request, tag):
+        return etags.not_modified(tag)
+    result = await fetch_rows(db, select(*FILM_COLUMNS).order_by(FilmRoll.created_at.desc()))
+    return ORJSONResponse([film_row_to_dict(f) for f in result], headers=etags.headers(tag))
 
 
 @router.get("/films/{film_id}")
-def get_film(film_id: int, db: Session = Depends(get_db)):
-    f = db.get(FilmRoll, film_id)
+async def get_film(film_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    tag = await etags.collection_tag(db, request, "film_rolls", "image_assets")
+    if etags.is_fresh(request, tag):
+        return etags.not_modified(tag)
+    f = (await fetch_rows(db, select(*FILM_COLUMNS).where(FilmRoll.id == film_id))).first()
     if not f:
         return {"error": "not_found"}
     # Separate scans and contact sheets
-    scans = (
-        db.query(ImageAsset)
-        .filter(ImageAsset.film_roll_id == f.id, ImageAsset.type == ImageType.scan)
-        .order_by(ImageAsset.id.asc())
-        .all()
-    )
-    contact_sheets = (
-        db.query(ImageAsset)
-        .filter(ImageAsset.film_roll_id == f.id, ImageAsset.type == ImageType.contact_sheet)
+    result = await fetch_rows(
+        db,
+        select(*IMAGE_COLUMNS)
+        .where(ImageAsset.film_roll_id == f.id)
         .order_by(ImageAsset.id.asc())
-        .all()
     )
-    return {
-        "film": film_to_dict(f),
-        "images": [image_to_dict(i) for i in scans],
-        "contact_sheets": [image_to_dict(i) for i in contact_sheets],
-    }
+    scans: List[dict] = []
+    contact_sheets: List[dict] = []
+    for i in result:
+        (contact_sheets if i.type == ImageType.contact_sheet else scans).append(image_row_to_dict(i))
+    return ORJSONResponse({
+        "film": film_row_to_dict(f),
+        "images": scans,
+        "contact_sheets": contact_sheets,
+    }, headers=etags.headers(tag))
 
 
 @router.post("/films")
@@ -135,6 +228,13 @@ def delete_film(film_id: int, db: Session = Depends(get_db)):
     f = db.get(FilmRoll, film_id)
     if not f:
         return {"error": "not_found"}
+    image_ids = select(ImageAsset.id).where(ImageAsset.film_roll_id == f.id)
+    # The bulk deletes below skip the ORM cascade: take labelled faces out of
+    # their persons' prototypes and drop the roll's faces first, as delete_image does
+    labelled = db.scalars(select(Face.id).where(Face.image_id.in_(image_ids), Face.person_id.is_not(None))).all()
+    if labelled:
+        label_faces(db, labelled, None)
+    db.query(Face).filter(Face.image_id.in_(image_ids)).delete(synchronize_session=False)
     # Optionally also delete associated images records (not files)
     db.query(ImageAsset).filter(ImageAsset.film_roll_id == f.id).delete()
     db.delete(f)
@@ -143,65 +243,116 @@ def delete_film(film_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/images")
-def list_images(
+async def list_images(
+    request: Request,
     film_id: Optional[int] = None,
     type: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    q = db.query(ImageAsset)
+    tag = await etags.collection_tag(db, request, "image_assets")
+    if etags.is_fresh(request, tag):
+        return etags.not_modified(tag)
+    q = select(*IMAGE_COLUMNS)
     if film_id:
-        q = q.filter(ImageAsset.film_roll_id == film_id)
+        q = q.where(ImageAsset.film_roll_id == film_id)
     if type:
         t = type.lower().strip()
         if t == "scan":
-            q = q.filter(ImageAsset.type == ImageType.scan)
+            q = q.where(ImageAsset.type == ImageType.scan)
         elif t in {"contact", "contact_sheet", "contact-sheet"}:
-            q = q.filter(ImageAsset.type == ImageType.contact_sheet)
+            q = q.where(ImageAsset.type == ImageType.contact_sheet)
         # else: ignore invalid type filter, return all
-    items = q.order_by(ImageAsset.id.asc()).all()
-    return [image_to_dict(i) for i in items]
+    result = await fetch_rows(db, q.order_by(ImageAsset.id.asc()))
+    return ORJSONResponse([image_row_to_dict(i) for i in result], headers=etags.headers(tag))
+
+
+@router.get("/images/duplicates")
+def list_duplicate_images(max_distance: int = phash.DEFAULT_DUPLICATE_DISTANCE, db: Session = Depends(get_db)):
+    """Archive-wide near-duplicate groups by perceptual hash."""
+    groups = phash.duplicate_groups(db, max_distance)
+    return {"max_distance": min(max(0, max_distance), phash.MAX_DISTANCE), "groups": groups}
 
 
 @router.get("/images/{image_id}")
-def get_image(image_id: int, db: Session = Depends(get_db)):
-    i = db.get(ImageAsset, image_id)
+async def get_image(image_id: int, db: AsyncSession = Depends(get_async_db)):
+    i = await db.get(ImageAsset, image_id)
     if not i:
         return {"error": "not_found"}
     return image_to_dict(i)
 
 
+@router.get("/images/{image_id}/similar")
+def get_similar_images(
+    image_id: int,
+    max_distance: int = phash.DEFAULT_SIMILAR_DISTANCE,
+    limit: int = 20,
+    db: Session = Depends(get_db),
+):
+    i = db.get(ImageAsset, image_id)
+    if not i:
+        return {"error": "not_found"}
+    if i.phash is None:
+        # Stored before hashing existed (python -m app.ingest_backfill), or unreadable
+        return {"error": "not_hashed"}
+    matches = phash.similar(db, i, max_distance, max(1, min(limit, 200)))
+    return {
+        "image_id": i.id,
+        "similar": [{**image_to_dict(m), "distance": d} for m, d in matches],
+    }
+
+
 @router.get("/images/{image_id}/preview")
-def get_image_preview(image_id: int, width: int = 1200, db: Session = Depends(get_db)):
+def get_image_preview(image_id: int, width: int = 1200, mode: str = "raw", db: Session = Depends(get_db)):
     i = db.get(ImageAsset, image_id)
     if not i:
         return {"error": "not_found"}
-    # Resolve absolute path
-    path = i.path
-    abs_path = path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+    if mode not in positive.MODES:
+        return {"error": "invalid_mode"}
+    box = image_box(i)
+    if mode == "positive":
+        return _positive_preview(db, i, box, width)
+    if box:
+        return _frame_preview(i.path, box, width)
+    fits = i.format == "JPEG" and i.channels in (1, 3) and i.width and (not width or i.width <= width)
+    if fits and storage.is_remote(i.path):
+        return RedirectResponse(storage.download_url(i.path, "", inline=True))
+    # Resolve absolute path (S3 originals are fetched into the local cache)
+    abs_path = storage.local_path(i.path)
     ext = os.path.splitext(abs_path)[1].lower()
+    if fits and os.path.exists(abs_path):
+        # Metadata from ingest says the original already fits: no decode or re-encode
+        return FileResponse(abs_path, media_type="image/jpeg")
     # Enable loading truncated images in Pillow
     PILImageFile.LOAD_TRUNCATED_IMAGES = True
     # Primary path: Pillow
     try:
-        img = PILImage.open(abs_path)
-        # Convert unusual modes to RGB safely
-        if img.mode not in ("RGB", "RGBA"):
-            try:
-                img = img.convert("RGB")
-            except Exception:
-                pass
-        # If still not RGB/RGBA, try a generic conversion
-        if img.mode != "RGB":
-            try:
-                img = img.convert("RGB")
-            except Exception:
-                raise
+        if i.bit_depth and i.bit_depth > 8:
+            # Known 16-bit scan: Pillow would clip it to white or drop to 8 bits; use OpenCV
+            raise ValueError("deep scan")
+        with span("decode"):
+            img = PILImage.open(abs_path)
+            img.load()
+        with span("convert"):
+            # Convert unusual modes to RGB safely
+            if img.mode not in ("RGB", "RGBA"):
+                try:
+                    img = img.convert("RGB")
+                except Exception:
+                    pass
+            # If still not RGB/RGBA, try a generic conversion
+            if img.mode != "RGB":
+                try:
+                    img = img.convert("RGB")
+                except Exception:
+                    raise
         if width and img.width > width:
-            new_h = int(img.height * (width / img.width))
-            img = img.resize((width, new_h), PILImage.LANCZOS)
-        buf = io.BytesIO()
-        img.save(buf, format="JPEG", quality=85)
-        buf.seek(0)
+            with span("resize"):
+                new_h = int(img.height * (width / img.width))
+                img = img.resize((width, new_h), PILImage.LANCZOS)
+        with span("encode"):
+            buf = io.BytesIO()
+            img.save(buf, format="JPEG", quality=85)
+            buf.seek(0)
         return StreamingResponse(buf, media_type="image/jpeg")
     except Exception:
         # Secondary fallback: OpenCV can read more TIFF variants (e.g., 16-bit)
@@ -210,39 +361,43 @@ def get_image_preview(image_id: int, width: int = 1200, db: Session = Depends(ge
             import numpy as np
             if not os.path.exists(abs_path):
                 raise FileNotFoundError
-            cv_img = cv2.imread(abs_path, cv2.IMREAD_UNCHANGED)
+            with span("cv_decode"):
+                cv_img = cv2.imread(abs_path, cv2.IMREAD_UNCHANGED)
             if cv_img is None:
                 raise ValueError("cv2 unreadable")
-            # Handle bit depth and channels
-            # Convert 16-bit to 8-bit for JPEG encoding
-            if cv_img.dtype == np.uint16:
-                cv_img = cv2.convertScaleAbs(cv_img, alpha=(255.0/65535.0))
-            elif cv_img.dtype == np.float32 or cv_img.dtype == np.float64:
-                # Normalize float images to 0-255
-                min_val, max_val = float(cv_img.min()), float(cv_img.max())
-                if max_val > min_val:
-                    cv_img = ((cv_img - min_val) * (255.0 / (max_val - min_val))).astype(np.uint8)
+            with span("cv_convert"):
+                # Handle bit depth and channels
+                # Convert 16-bit to 8-bit for JPEG encoding
+                if cv_img.dtype == np.uint16:
+                    cv_img = cv2.convertScaleAbs(cv_img, alpha=(255.0/65535.0))
+                elif cv_img.dtype == np.float32 or cv_img.dtype == np.float64:
+                    # Normalize float images to 0-255
+                    min_val, max_val = float(cv_img.min()), float(cv_img.max())
+                    if max_val > min_val:
+                        cv_img = ((cv_img - min_val) * (255.0 / (max_val - min_val))).astype(np.uint8)
+                    else:
+                        cv_img = (cv_img * 255.0).astype(np.uint8)
+                # Ensure 3-channel BGR
+                if len(cv_img.shape) == 2:  # grayscale
+                    cv_img = cv2.cvtColor(cv_img, cv2.COLOR_GRAY2BGR)
+                elif cv_img.shape[2] == 4:  # BGRA -> BGR
+                    cv_img = cv2.cvtColor(cv_img, cv2.COLOR_BGRA2BGR)
+                elif cv_img.shape[2] == 3:
+                    pass  # already BGR
                 else:
-                    cv_img = (cv_img * 255.0).astype(np.uint8)
-            # Ensure 3-channel BGR
-            if len(cv_img.shape) == 2:  # grayscale
-                cv_img = cv2.cvtColor(cv_img, cv2.COLOR_GRAY2BGR)
-            elif cv_img.shape[2] == 4:  # BGRA -> BGR
-                cv_img = cv2.cvtColor(cv_img, cv2.COLOR_BGRA2BGR)
-            elif cv_img.shape[2] == 3:
-                pass  # already BGR
-            else:
-                # Unusual channel count: reduce to 3 via first three channels
-                cv_img = cv_img[:, :, :3]
+                    # Unusual channel count: reduce to 3 via first three channels
+                    cv_img = cv_img[:, :, :3]
 
             # Resize preserving aspect
             if width and cv_img.shape[1] > width:
-                scale = width / float(cv_img.shape[1])
-                new_h = int(cv_img.shape[0] * scale)
-                cv_img = cv2.resize(cv_img, (width, new_h), interpolation=cv2.INTER_AREA)
+                with span("cv_resize"):
+                    scale = width / float(cv_img.shape[1])
+                    new_h = int(cv_img.shape[0] * scale)
+                    cv_img = cv2.resize(cv_img, (width, new_h), interpolation=cv2.INTER_AREA)
 
             # Encode JPEG
-            ok, enc = cv2.imencode(".jpg", cv_img, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+            with span("cv_encode"):
+                ok, enc = cv2.imencode(".jpg", cv_img, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
             if not ok:
                 raise ValueError("encode failed")
             buf = io.BytesIO(enc.tobytes())
@@ -256,22 +411,115 @@ def get_image_preview(image_id: int, width: int = 1200, db: Session = Depends(ge
             return {"error": "unreadable_image"}
 
 
+def _frame_preview(path: str, box: Box, width: int):
+    """Preview of a frame cut from a sheet, decoded straight from the parent's file."""
+    with span("decode"):
+        # JPEG sheets decode reduced when the frame is far larger than the preview
+        opened = load_rgb(path, reduce=box[2] / width if width else 1.0, box=box)
+    if opened is None:
+        return {"error": "unreadable_image"}
+    img = opened[0]
+    if width and img.width > width:
+        with span("resize"):
+            img = img.resize((width, int(img.height * (width / img.width))), PILImage.LANCZOS)
+    with span("encode"):
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=85)
+        buf.seek(0)
+    return StreamingResponse(buf, media_type="image/jpeg")
+
+
+def _positive_preview(db: Session, i: ImageAsset, box: Optional[Box], width: int):
+    """Inverted preview, rendered once per size into the derivative cache."""
+    try:
+        path = positive.render(i.path, box, positive.kind_for(db, i.film_roll), max(0, width))
+    except FileNotFoundError:
+        path = None
+    if path is None:
+        return {"error": "unreadable_image"}
+    # Derivative names change whenever the source file or conversion does
+    headers = {"Cache-Control": "public, max-age=86400"}
+    return FileResponse(os.path.abspath(path), media_type="image/jpeg", headers=headers)
+
+
 @router.get("/images/{image_id}/download")
-def download_image(image_id: int, db: Session = Depends(get_db)):
+def download_image(image_id: int, inline: bool = False, db: Session = Depends(get_db)):
     i = db.get(ImageAsset, image_id)
     if not i:
         return {"error": "not_found"}
-    path = i.path
-    abs_path = path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+    box = image_box(i)
+    if storage.is_remote(i.path) and not box:
+        # Originals in object storage go straight from the bucket, never through the API
+        return RedirectResponse(storage.download_url(i.path, os.path.basename(i.path), inline))
+    abs_path = storage.local_path(i.path)
     if not os.path.exists(abs_path):
         return {"error": "not_found"}
+    if box:
+        # Frames cut from a sheet: lossless crop at the source's bit depth (PNG keeps 16-bit)
+        import cv2
+        with span("cv_decode"):
+            arr = cv2.imread(abs_path, cv2.IMREAD_UNCHANGED)
+        if arr is None:
+            return {"error": "unreadable_image"}
+        x, y, w, h = box
+        with span("cv_encode"):
+            ok, enc = cv2.imencode(".png", arr[y:y + h, x:x + w])
+        if not ok:
+            return {"error": "unreadable_image"}
+        stem = os.path.splitext(os.path.basename(abs_path))[0]
+        headers = {"Content-Disposition": f"attachment; filename=\"{stem}-frame{i.frame_number}.png\""}
+        return StreamingResponse(io.BytesIO(enc.tobytes()), media_type="image/png", headers=headers)
     filename = os.path.basename(abs_path)
+    if inline:
+        return FileResponse(abs_path)
     # Let FileResponse set headers; ensure attachment disposition for download
     headers = {"Content-Disposition": f"attachment; filename=\"{filename}\""}
     # Media type is not critical for download; use octet-stream for generic binary
     return FileResponse(abs_path, media_type="application/octet-stream", headers=headers)
 
 
+@router.post("/images/{image_id}/segment")
+def segment_image(
+    image_id: int,
+    background: BackgroundTasks,
+    replace: bool = False,
+    job_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Queue frame detection on a sheet or strip scan; frames appear under /frames when done.
+
+    Progress is published under job_id (one is generated when not given).
+    """
+    i = db.get(ImageAsset, image_id)
+    if not i:
+        return {"error": "not_found"}
+    if i.parent_id is not None:
+        return {"error": "is_frame"}
+    if not replace and db.query(ImageAsset.id).filter(ImageAsset.parent_id == i.id).first():
+        return {"error": "already_segmented"}
+    job_id = job_id or uuid4().hex
+    background.add_task(segmentation.run_job, i.id, replace, job_id)
+    return {"ok": True, "queued": True, "job_id": job_id}
+
+
+@router.get("/images/{image_id}/frames")
+def list_image_frames(image_id: int, db: Session = Depends(get_db)):
+    i = db.get(ImageAsset, image_id)
+    if not i:
+        return {"error": "not_found"}
+    frames = (
+        db.query(ImageAsset)
+        .filter(ImageAsset.parent_id == i.id)
+        .order_by(ImageAsset.frame_number.asc(), ImageAsset.id.asc())
+        .all()
+    )
+    return {
+        "image_id": i.id,
+        "segmented_at": i.segmented_at.isoformat() if i.segmented_at else None,
+        "frames": [image_to_dict(f) for f in frames],
+    }
+
+
 @router.post("/images")
 async def create_image(request: Request, db: Session = Depends(get_db)):
     payload = await request.json()
@@ -283,6 +531,8 @@ async def create_image(request: Request, db: Session = Depends(get_db)):
         notes=payload.get("notes"),
         capture_date=date.fromisoformat(payload["capture_date"]) if payload.get("capture_date") else None,
     )
+    if i.path:
+        ingest.analyze(i)
     db.add(i)
     db.commit()
     return {"ok": True, "image": image_to_dict(i)}
@@ -308,29 +558,141 @@ async def update_image(image_id: int, request: Request, db: Session = Depends(ge
     return {"ok": True, "image": image_to_dict(i)}
 
 
+# Fields PATCH /api/images may set, parsed as PUT /api/images/{id} parses them.
+# An empty film_roll_id or type is ignored there too.
+_IMAGE_EDITS = {
+    "film_roll_id": int,
+    "type": ImageType,
+    "frame_number": lambda v: int(v) if v is not None else None,
+    "notes": lambda v: v or None,
+    "capture_date": lambda v: date.fromisoformat(v) if v else None,
+}
+_REQUIRED_EDITS = {"film_roll_id", "type"}
+NUMBERING_RULES = ("number_by_filename", "number_by_upload")
+
+
+def _image_edits(payload: dict) -> dict:
+    """The editable fields present in payload, parsed; raises ValueError/TypeError on bad values."""
+    return {
+        name: parse(payload[name]) for name, parse in _IMAGE_EDITS.items()
+        if name in payload and (payload[name] or name not in _REQUIRED_EDITS)
+    }
+
+
+def _natural_key(name: str):
+    # "frame2.tif" before "frame10.tif"
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part.lower()) for part in re.split(r"(\d+)", name)]
+
+
+def _rule_edits(db: Session, film_id: int, payload: dict) -> Dict[int, dict]:
+    """Edits for every scan of a roll (frames cut from sheets excluded): the shared
+    "set" fields, plus frame numbers from "start" when a numbering rule is given."""
+    rule = payload.get("rule")
+    if rule is not None and rule not in NUMBERING_RULES:
+        raise ValueError(rule)
+    shared = _image_edits(payload.get("set") or {})
+    start = int(payload.get("start", 1))
+    rows = db.execute(
+        select(ImageAsset.id, ImageAsset.original_filename)
+        .where(ImageAsset.film_roll_id == film_id, ImageAsset.type == ImageType.scan, ImageAsset.parent_id.is_(None))
+        .order_by(ImageAsset.id.asc())
+    ).all()
+    if rule == "number_by_filename":
+        # Images imported before file names were kept have none; they follow in upload order
+        rows.sort(key=lambda r: (r[1] is None, _natural_key(r[1] or "")))
+    edits: Dict[int, dict] = {}
+    for n, (image_id, _) in enumerate(rows):
+        edits[image_id] = {**shared, "frame_number": start + n} if rule else dict(shared)
+    return edits
+
+
+def bulk_update_images(db: Session, edits: Dict[int, dict]) -> None:
+    """Apply {image_id: {field: value}} with one UPDATE per distinct set of fields.
+
+    Postgres joins the new values in as a VALUES list (UPDATE ... FROM VALUES).
+    SQLite can't alias VALUES columns, so elsewhere this is SQLAlchemy's bulk
+    UPDATE by primary key: a single statement executed for each row.
+    """
+    table = ImageAsset.__table__
+    groups: Dict[tuple, list] = {}
+    for image_id, fields in edits.items():
+        if fields:
+            groups.setdefault(tuple(sorted(fields)), []).append((image_id, fields))
+    pg = db.get_bind().dialect.name == "postgresql"
+    for names, rows in groups.items():
+        if pg:
+            v = values(column("id", Integer), *(column(n, table.c[n].type) for n in names), name="v").data(
+                [(image_id, *(fields[n] for n in names)) for image_id, fields in rows]
+            )
+            # Cast back: a VALUES column that is NULL throughout would be typed text
+            db.execute(
+                update(table).where(table.c.id == v.c.id).values({n: cast(v.c[n], table.c[n].type) for n in names})
+            )
+        else:
+            db.execute(update(ImageAsset), [{"id": image_id, **fields} for image_id, fields in rows])
+
+
+@router.patch("/images")
+def patch_images(payload: dict = Body(...), db: Session = Depends(get_db)):
+    """Edit many images in one transaction; returns them as updated.
+
+    Either explicit partial updates, {"updates": [{"id": 1, "frame_number": 1, ...}]},
+    or one roll at once, {"film_id": 7, "rule": "number_by_filename", "start": 1,
+    "set": {"capture_date": "2021-06-01"}}.
+    """
+    try:
+        if "updates" in payload:
+            edits: Dict[int, dict] = {}
+            for u in payload["updates"]:
+                edits.setdefault(int(u["id"]), {}).update(_image_edits(u))
+        else:
+            film_id = int(payload["film_id"])
+            if not db.get(FilmRoll, film_id):
+                return {"error": "not_found"}
+            edits = _rule_edits(db, film_id, payload)
+    except (KeyError, TypeError, ValueError):
+        return {"error": "invalid_payload"}
+    ids = list(edits)
+    found = set(db.scalars(select(ImageAsset.id).where(ImageAsset.id.in_(ids))))
+    missing = [i for i in ids if i not in found]
+    if missing:
+        return {"error": "not_found", "ids": missing}
+    bulk_update_images(db, edits)
+    rows = db.connection().execute(select(*IMAGE_COLUMNS).where(ImageAsset.id.in_(ids)).order_by(ImageAsset.id.asc()))
+    images = [image_row_to_dict(r) for r in rows]
+    db.commit()
+    return ORJSONResponse({"ok": True, "images": images})
+
+
 @router.delete("/images/{image_id}")
 def delete_image(image_id: int, delete_file: bool = False, db: Session = Depends(get_db)):
     i = db.get(ImageAsset, image_id)
     if not i:
         return {"error": "not_found"}
-    # Optionally delete file from disk
-    if delete_file and i.path:
+    # Frames cut from a sheet share its file: keep it while any other row still uses it
+    shared = db.query(ImageAsset.id).filter(
+        ImageAsset.path == i.path,
+        ImageAsset.id != i.id,
+        or_(ImageAsset.parent_id.is_(None), ImageAsset.parent_id != i.id),
+    ).first()
+    # Optionally delete the stored file
+    if delete_file and i.path and not shared:
         try:
-            if os.path.isabs(i.path):
-                target_path = i.path
-            else:
-                target_path = os.path.join(os.getcwd(), i.path)
-            if os.path.exists(target_path):
-                os.remove(target_path)
+            storage.delete(i.path)
         except Exception:
             pass
+    # Take labelled faces out of their persons' prototypes before the cascade deletes them
+    labelled = [f.id for img in [i, *i.children] for f in img.faces if f.person_id is not None]
+    if labelled:
+        label_faces(db, labelled, None)
     db.delete(i)
     db.commit()
     return {"ok": True}
 
 
 @router.post("/images/upload")
-async def upload_image(
+def upload_image(
+    background: BackgroundTasks,
     file: UploadFile = File(...),
     type: str = Form(...),
     film_roll_id: Optional[int] = Form(None),
@@ -342,33 +704,80 @@ async def upload_image(
     type = type.lower()
     if type not in {"scan", "contact_sheet"}:
         return {"error": "invalid_type"}
-    subdir = "uploads/scans" if type == "scan" else "uploads/contact_sheets"
-    os.makedirs(os.path.join("static", subdir), exist_ok=True)
     # Preserve extension, generate unique name
     ext = os.path.splitext(file.filename)[1]
-    unique_name = f"{uuid4().hex}{ext}"
-    rel_path = os.path.join("static", subdir, unique_name)
-    abs_path = os.path.join(os.getcwd(), rel_path)
-    with open(abs_path, "wb") as out:
-        shutil.copyfileobj(file.file, out)
+    key, rel_path = storage.save(type, ext, file.file)
     img = ImageAsset(
         film_roll_id=film_roll_id,
         type=ImageType(type),
         path=rel_path,
+        storage_key=key,
+        original_filename=file.filename,
         frame_number=int(frame_number) if frame_number is not None else None,
         notes=notes or None,
         capture_date=date.fromisoformat(capture_date) if capture_date else None,
     )
+    ingest.analyze(img)
     db.add(img)
     db.commit()
+    if segmentation.SEGMENT_ON_UPLOAD and img.type == ImageType.contact_sheet:
+        background.add_task(segmentation.run_job, img.id)
+    if face.FACE_INDEX_ON_UPLOAD and img.type == ImageType.scan:
+        background.add_task(face.index_uploads, [img.id])
     return {"ok": True, "image": image_to_dict(img)}
 
 
 # ---------------------------
 # Contact sheet creation
 # ---------------------------
+def square_thumbnail(path: str, thumb_size: int, box: Optional[Box] = None, kind: Optional[FilmKind] = None) -> PILImage.Image:
+    """Load an image (or one frame of a sheet) and center it on a white square canvas of thumb_size.
+
+    With a film kind the thumbnail is the cached positive of that kind.
+    """
+    if kind is not None:
+        rendered = positive.render(path, box, kind, thumb_size)
+        if rendered is None:
+            raise ValueError(f"unreadable image {path}")
+        img = PILImage.open(rendered)
+    elif box:
+        opened = load_rgb(path, reduce=max(box[2], box[3]) / thumb_size, box=box)
+        if opened is None:
+            raise ValueError(f"unreadable image {path}")
+        img = opened[0]
+    else:
+        img = PILImage.open(storage.local_path(path))
+        # Let JPEG decoders downscale while decoding instead of loading full resolution
+        img.draft("RGB", (thumb_size, thumb_size))
+        img = img.convert("RGB")
+    img.thumbnail((thumb_size, thumb_size))
+    canvas = PILImage.new("RGB", (thumb_size, thumb_size), color=(255, 255, 255))
+    x = (thumb_size - img.size[0]) // 2
+    y = (thumb_size - img.size[1]) // 2
+    canvas.paste(img, (x, y))
+    return canvas
+
+
+def compose_sheet(thumbs: List[PILImage.Image], columns: int, thumb_size: int) -> PILImage.Image:
+    """Paste square thumbnails onto a grid, row by row."""
+    columns = max(1, columns)
+    rows = ceil(len(thumbs) / columns)
+    sheet = PILImage.new("RGB", (columns * thumb_size, rows * thumb_size), color=(255, 255, 255))
+    for idx, t in enumerate(thumbs):
+        r = idx // columns
+        c = idx % columns
+        sheet.paste(t, (c * thumb_size, r * thumb_size))
+    return sheet
+
+
 @router.post("/films/{film_id}/contact_sheet")
-def create_contact_sheet(film_id: int, columns: int = 6, thumb_size: int = 300, db: Session = Depends(get_db)):
+def create_contact_sheet(
+    film_id: int,
+    columns: int = 6,
+    thumb_size: int = 300,
+    job_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
     f = db.get(FilmRoll, film_id)
     if not f:
         return {"error": "not_found"}
@@ -381,95 +790,198 @@ def create_contact_sheet(film_id: int, columns: int = 6, thumb_size: int = 300,
     if len(scans) < 2:
         return {"error": "not_enough_images"}
 
-    # Prepare thumbnails
+    with events.Job("contact_sheet", total=len(scans), job_id=job_id, film_id=film_id) as job:
+        # Prepare thumbnails
+        thumbs: List[PILImage.Image] = []
+        with span("thumbnails"):
+            for i in scans:
+                try:
+                    thumbs.append(square_thumbnail(i.path, thumb_size, image_box(i)))
+                    job.advance()
+                except Exception:
+                    # Skip unreadable files
+                    job.advance(failed=True)
+                    continue
+
+        if len(thumbs) < 2:
+            job.fail("not_enough_images")
+            return {"error": "not_enough_images"}
+
+        with span("compose"):
+            sheet = compose_sheet(thumbs, columns, thumb_size)
+
+        # Save to contact sheets dir
+        buf = io.BytesIO()
+        sheet.save(buf, format="JPEG", quality=90)
+        buf.seek(0)
+        key, rel_path = storage.save(ImageType.contact_sheet.value, ".jpg", buf)
+
+        cs = ImageAsset(
+            film_roll_id=film_id,
+            type=ImageType.contact_sheet,
+            path=rel_path,
+            storage_key=key,
+            frame_number=None,
+            notes="Generated contact sheet",
+            capture_date=None,
+        )
+        db.add(cs)
+        db.commit()
+        job.result["image_id"] = cs.id
+    return {"ok": True, "image": image_to_dict(cs)}
+
+
+@router.get("/films/{film_id}/thumbs")
+def get_film_thumbs(
+    film_id: int,
+    format: str = "sprite",
+    columns: int = 6,
+    thumb_size: int = 200,
+    mode: str = "raw",
+    db: Session = Depends(get_db),
+):
+    """Serve every scan thumbnail of a roll in one response.
+
+    format=sprite returns one JPEG sprite (base64) plus per-image offsets;
+    format=ndjson streams one base64 JPEG thumbnail per line.
+    mode=positive inverts the scans per the roll's film stock.
+    """
+    f = db.get(FilmRoll, film_id)
+    if not f:
+        return {"error": "not_found"}
+    if mode not in positive.MODES:
+        return {"error": "invalid_mode"}
+    kind = positive.kind_for(db, f) if mode == "positive" else None
+    thumb_size = max(16, min(thumb_size, 1024))
+    scans = (
+        db.query(ImageAsset.id, ImageAsset.path, ImageAsset.crop_x, ImageAsset.crop_y, ImageAsset.crop_w, ImageAsset.crop_h)
+        .filter(ImageAsset.film_roll_id == film_id, ImageAsset.type == ImageType.scan)
+        .order_by(ImageAsset.frame_number.asc().nulls_last(), ImageAsset.id.asc())
+        .all()
+    )
+
+    if format == "ndjson":
+        def lines():
+            for row in scans:
+                try:
+                    thumb = square_thumbnail(row.path, thumb_size, image_box(row), kind)
+                except Exception:
+                    yield json.dumps({"image_id": row.id, "error": "unreadable_image"}) + "\n"
+                    continue
+                buf = io.BytesIO()
+                thumb.save(buf, format="JPEG", quality=80)
+                data = base64.b64encode(buf.getvalue()).decode("ascii")
+                yield json.dumps({"image_id": row.id, "media_type": "image/jpeg", "data": data}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    if format != "sprite":
+        return {"error": "invalid_format"}
+
     thumbs: List[PILImage.Image] = []
-    for i in scans:
-        path = i.path
-        abs_path = path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+    ids: List[int] = []
+    for row in scans:
         try:
-            img = PILImage.open(abs_path).convert("RGB")
-            img.thumbnail((thumb_size, thumb_size))
-            # Center on square canvas
-            canvas = PILImage.new("RGB", (thumb_size, thumb_size), color=(255, 255, 255))
-            x = (thumb_size - img.size[0]) // 2
-            y = (thumb_size - img.size[1]) // 2
-            canvas.paste(img, (x, y))
-            thumbs.append(canvas)
+            thumbs.append(square_thumbnail(row.path, thumb_size, image_box(row), kind))
+            ids.append(row.id)
         except Exception:
-            # Skip unreadable files
             continue
+    if not thumbs:
+        return {"film_id": film_id, "thumb_size": thumb_size, "columns": 0, "width": 0, "height": 0, "sprite": None, "tiles": []}
+
+    columns = max(1, min(columns, len(thumbs)))
+    sheet = compose_sheet(thumbs, columns, thumb_size)
+    buf = io.BytesIO()
+    sheet.save(buf, format="JPEG", quality=80)
+    tiles = [
+        {
+            "image_id": image_id,
+            "x": (idx % columns) * thumb_size,
+            "y": (idx // columns) * thumb_size,
+            "w": thumb_size,
+            "h": thumb_size,
+        }
+        for idx, image_id in enumerate(ids)
+    ]
+    return {
+        "film_id": film_id,
+        "thumb_size": thumb_size,
+        "columns": columns,
+        "width": sheet.width,
+        "height": sheet.height,
+        "sprite": "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode("ascii"),
+        "tiles": tiles,
+    }
 
-    if len(thumbs) < 2:
-        return {"error": "not_enough_images"}
-
-    rows = ceil(len(thumbs) / columns)
-    sheet_w = columns * thumb_size
-    sheet_h = rows * thumb_size
-    sheet = PILImage.new("RGB", (sheet_w, sheet_h), color=(255, 255, 255))
-
-    for idx, t in enumerate(thumbs):
-        r = idx // columns
-        c = idx % columns
-        sheet.paste(t, (c * thumb_size, r * thumb_size))
-
-    # Save to contact sheets dir
-    os.makedirs(os.path.join("static", "uploads", "contact_sheets"), exist_ok=True)
-    filename = f"{uuid4().hex}.jpg"
-    rel_path = os.path.join("static", "uploads", "contact_sheets", filename)
-    abs_path = os.path.join(os.getcwd(), rel_path)
-    sheet.save(abs_path, format="JPEG", quality=90)
 
-    cs = ImageAsset(
-        film_roll_id=film_id,
-        type=ImageType.contact_sheet,
-        path=rel_path,
-        frame_number=None,
-        notes="Generated contact sheet",
-        capture_date=None,
+@router.get("/events")
+async def stream_events(request: Request, job: Optional[str] = None, kind: Optional[str] = None):
+    """Server-sent progress events of imports, contact sheets, segmentation and face indexing."""
+    last = request.headers.get("last-event-id", "")
+    sub = events.subscribe(job, kind, int(last) if last.isdigit() else 0)
+    return StreamingResponse(
+        events.stream(sub),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx would otherwise hold events back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    db.add(cs)
-    db.commit()
-    return {"ok": True, "image": image_to_dict(cs)}
 
 
 # ---------------------------
 # Bulk upload (multiple files or ZIP)
 # ---------------------------
+# Plain def: the imports block, so they run on the threadpool and the event
+# loop stays free to stream their progress (GET /api/events?job=<job_id>).
 @router.post("/films/{film_id}/images/bulk")
-async def bulk_upload_images(film_id: int, files: List[UploadFile] = File(...), db: Session = Depends(get_db)):
+def bulk_upload_images(
+    film_id: int,
+    background: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    job_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
     f = db.get(FilmRoll, film_id)
     if not f:
         return {"error": "not_found"}
-    os.makedirs(os.path.join("static", "uploads", "scans"), exist_ok=True)
     created: List[ImageAsset] = []
 
-    for file in files:
-        try:
-            ext = os.path.splitext(file.filename)[1] or ".jpg"
-            unique_name = f"{uuid4().hex}{ext}"
-            rel_path = os.path.join("static", "uploads", "scans", unique_name)
-            abs_path = os.path.join(os.getcwd(), rel_path)
-            with open(abs_path, "wb") as out:
-                shutil.copyfileobj(file.file, out)
-            img = ImageAsset(
-                film_roll_id=film_id,
-                type=ImageType.scan,
-                path=rel_path,
-                frame_number=None,
-                notes=None,
-                capture_date=None,
-            )
-            db.add(img)
-            created.append(img)
-        except Exception:
-            continue
+    with events.Job("ingest", total=len(files), job_id=job_id, film_id=film_id) as job:
+        for file in files:
+            try:
+                ext = os.path.splitext(file.filename)[1] or ".jpg"
+                key, rel_path = storage.save(ImageType.scan.value, ext, file.file)
+                img = ImageAsset(
+                    film_roll_id=film_id,
+                    type=ImageType.scan,
+                    path=rel_path,
+                    storage_key=key,
+                    original_filename=file.filename,
+                    frame_number=None,
+                    notes=None,
+                    capture_date=None,
+                )
+                ingest.analyze(img)
+                db.add(img)
+                created.append(img)
+                job.advance()
+            except Exception:
+                job.advance(failed=True)
+                continue
 
-    db.commit()
+        db.commit()
+    if face.FACE_INDEX_ON_UPLOAD:
+        background.add_task(face.index_uploads, [i.id for i in created])
     return {"ok": True, "images": [image_to_dict(i) for i in created]}
 
 
 @router.post("/films/{film_id}/images/bulk_zip")
-async def bulk_upload_zip(film_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
+def bulk_upload_zip(
+    film_id: int,
+    background: BackgroundTasks,
+    file: UploadFile = File(...),
+    job_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
     f = db.get(FilmRoll, film_id)
     if not f:
         return {"error": "not_found"}
@@ -485,10 +997,10 @@ async def bulk_upload_zip(film_id: int, file: UploadFile = File(...), db: Sessio
         except Exception:
             return {"error": "invalid_zip"}
 
-        os.makedirs(os.path.join("static", "uploads", "scans"), exist_ok=True)
         created: List[ImageAsset] = []
 
-        # Walk extracted files and import images
+        # Collect extracted images first so progress has a total
+        sources: List[str] = []
         for root, _, files in os.walk(tmpdir):
             for name in files:
                 src = os.path.join(root, name)
@@ -496,35 +1008,45 @@ async def bulk_upload_zip(film_id: int, file: UploadFile = File(...), db: Sessio
                 if src == zip_path:
                     continue
                 # Basic image filter by extension
-                ext = os.path.splitext(name)[1].lower()
-                if ext not in {".jpg", ".jpeg", ".png", ".tif", ".tiff"}:
-                    continue
+                if os.path.splitext(name)[1].lower() in {".jpg", ".jpeg", ".png", ".tif", ".tiff"}:
+                    sources.append(src)
+
+        with events.Job("ingest", total=len(sources), job_id=job_id, film_id=film_id) as job:
+            for src in sources:
                 try:
-                    unique_name = f"{uuid4().hex}{ext}"
-                    rel_path = os.path.join("static", "uploads", "scans", unique_name)
-                    abs_path = os.path.join(os.getcwd(), rel_path)
-                    shutil.copy(src, abs_path)
+                    key, rel_path = storage.save(ImageType.scan.value, os.path.splitext(src)[1].lower(), src)
                     img = ImageAsset(
                         film_roll_id=film_id,
                         type=ImageType.scan,
                         path=rel_path,
+                        storage_key=key,
+                        original_filename=os.path.relpath(src, tmpdir),
                         frame_number=None,
                         notes=None,
                         capture_date=None,
                     )
+                    ingest.analyze(img)
                     db.add(img)
                     created.append(img)
+                    job.advance()
                 except Exception:
+                    job.advance(failed=True)
                     continue
 
-        db.commit()
+            db.commit()
+        if face.FACE_INDEX_ON_UPLOAD:
+            background.add_task(face.index_uploads, [i.id for i in created])
         return {"ok": True, "images": [image_to_dict(i) for i in created]}
 
 
 @router.get("/cameras")
-def list_cameras(db: Session = Depends(get_db)):
-    items = db.query(Camera).order_by(Camera.name.asc()).all()
-    return [{"id": c.id, "name": c.name, "mount": c.mount, "image_path": c.image_path, "url": catalog_url(c.image_path), "notes": c.notes} for c in items]
+def list_cameras(request: Request, db: Session = Depends(get_db)):
+    tag = etags.collection_tag_sync(db, request, "cameras")
+    if etags.is_fresh(request, tag):
+        return etags.not_modified(tag)
+    cols = (Camera.id, Camera.name, Camera.mount, Camera.image_path, Camera.notes)
+    rows = db.connection().execute(select(*cols).order_by(Camera.name.asc()))
+    return ORJSONResponse([gear_to_dict(c) for c in rows], headers=etags.headers(tag))
 
 
 @router.get("/cameras/{camera_id}")
@@ -532,7 +1054,7 @@ def get_camera(camera_id: int, db: Session = Depends(get_db)):
     c = db.get(Camera, camera_id)
     if not c:
         return {"error": "not_found"}
-    return {"id": c.id, "name": c.name, "mount": c.mount, "image_path": c.image_path, "url": catalog_url(c.image_path), "notes": c.notes}
+    return gear_to_dict(c)
 
 
 @router.post("/cameras")
@@ -541,7 +1063,7 @@ async def create_camera(request: Request, db: Session = Depends(get_db)):
     c = Camera(name=payload.get("name"), mount=payload.get("mount"), image_path=payload.get("image_path"), notes=payload.get("notes"))
     db.add(c)
     db.commit()
-    return {"ok": True, "camera": {"id": c.id, "name": c.name, "mount": c.mount, "image_path": c.image_path, "url": catalog_url(c.image_path), "notes": c.notes}}
+    return {"ok": True, "camera": gear_to_dict(c)}
 
 
 @router.put("/cameras/{camera_id}")
@@ -554,7 +1076,7 @@ async def update_camera(camera_id: int, request: Request, db: Session = Depends(
         if key in payload:
             setattr(c, key, payload[key] or None)
     db.commit()
-    return {"ok": True, "camera": {"id": c.id, "name": c.name, "mount": c.mount, "image_path": c.image_path, "url": catalog_url(c.image_path), "notes": c.notes}}
+    return {"ok": True, "camera": gear_to_dict(c)}
 
 
 @router.delete("/cameras/{camera_id}")
@@ -581,22 +1103,17 @@ async def upload_camera_image(camera_id: int, file: UploadFile = File(...), db:
         shutil.copyfileobj(file.file, out)
     c.image_path = rel_path
     db.commit()
-    return {"ok": True, "camera": {"id": c.id, "name": c.name, "mount": c.mount, "image_path": c.image_path, "url": catalog_url(c.image_path), "notes": c.notes}}
+    return {"ok": True, "camera": gear_to_dict(c)}
 
 
 @router.get("/filmstocks")
-def list_filmstocks(db: Session = Depends(get_db)):
-    items = db.query(FilmStock).order_by(FilmStock.name.asc()).all()
-    return [{
-        "id": s.id,
-        "name": s.name,
-        "iso": s.iso,
-        "kind": s.kind.value if isinstance(s.kind, FilmKind) else str(s.kind),
-        "expired": s.expired,
-        "expiration_date": s.expiration_date.isoformat() if s.expiration_date else None,
-        "image_path": s.image_path,
-        "url": catalog_url(s.image_path),
-    } for s in items]
+def list_filmstocks(request: Request, db: Session = Depends(get_db)):
+    tag = etags.collection_tag_sync(db, request, "film_stocks")
+    if etags.is_fresh(request, tag):
+        return etags.not_modified(tag)
+    cols = (FilmStock.id, FilmStock.name, FilmStock.iso, FilmStock.kind, FilmStock.expired, FilmStock.expiration_date, FilmStock.image_path)
+    rows = db.connection().execute(select(*cols).order_by(FilmStock.name.asc()))
+    return ORJSONResponse([filmstock_to_dict(s) for s in rows], headers=etags.headers(tag))
 
 
 @router.get("/filmstocks/{stock_id}")
@@ -604,16 +1121,7 @@ def get_filmstock(stock_id: int, db: Session = Depends(get_db)):
     s = db.get(FilmStock, stock_id)
     if not s:
         return {"error": "not_found"}
-    return {
-        "id": s.id,
-        "name": s.name,
-        "iso": s.iso,
-        "kind": s.kind.value if isinstance(s.kind, FilmKind) else str(s.kind),
-        "expired": s.expired,
-        "expiration_date": s.expiration_date.isoformat() if s.expiration_date else None,
-        "image_path": s.image_path,
-        "url": catalog_url(s.image_path),
-    }
+    return filmstock_to_dict(s)
 
 
 @router.post("/filmstocks")
@@ -631,16 +1139,7 @@ async def create_filmstock(request: Request, db: Session = Depends(get_db)):
     )
     db.add(s)
     db.commit()
-    return {"ok": True, "filmstock": {
-        "id": s.id,
-        "name": s.name,
-        "iso": s.iso,
-        "kind": s.kind.value if isinstance(s.kind, FilmKind) else str(s.kind),
-        "expired": s.expired,
-        "expiration_date": s.expiration_date.isoformat() if s.expiration_date else None,
-        "image_path": s.image_path,
-        "url": catalog_url(s.image_path),
-    }}
+    return {"ok": True, "filmstock": filmstock_to_dict(s)}
 
 
 @router.put("/filmstocks/{stock_id}")
@@ -687,22 +1186,17 @@ async def upload_filmstock_image(stock_id: int, file: UploadFile = File(...), db
         shutil.copyfileobj(file.file, out)
     s.image_path = rel_path
     db.commit()
-    return {"ok": True, "filmstock": {
-        "id": s.id,
-        "name": s.name,
-        "iso": s.iso,
-        "kind": s.kind.value if isinstance(s.kind, FilmKind) else str(s.kind),
-        "expired": s.expired,
-        "expiration_date": s.expiration_date.isoformat() if s.expiration_date else None,
-        "image_path": s.image_path,
-        "url": catalog_url(s.image_path),
-    }}
+    return {"ok": True, "filmstock": filmstock_to_dict(s)}
 
 
 @router.get("/lenses")
-def list_lenses(db: Session = Depends(get_db)):
-    items = db.query(Lens).order_by(Lens.name.asc()).all()
-    return [{"id": l.id, "name": l.name, "mount": l.mount, "image_path": l.image_path, "url": catalog_url(l.image_path), "notes": l.notes} for l in items]
+def list_lenses(request: Request, db: Session = Depends(get_db)):
+    tag = etags.collection_tag_sync(db, request, "lenses")
+    if etags.is_fresh(request, tag):
+        return etags.not_modified(tag)
+    cols = (Lens.id, Lens.name, Lens.mount, Lens.image_path, Lens.notes)
+    rows = db.connection().execute(select(*cols).order_by(Lens.name.asc()))
+    return ORJSONResponse([gear_to_dict(l) for l in rows], headers=etags.headers(tag))
 
 
 @router.get("/lenses/{lens_id}")
@@ -710,7 +1204,7 @@ def get_lens(lens_id: int, db: Session = Depends(get_db)):
     l = db.get(Lens, lens_id)
     if not l:
         return {"error": "not_found"}
-    return {"id": l.id, "name": l.name, "mount": l.mount, "image_path": l.image_path, "url": catalog_url(l.image_path), "notes": l.notes}
+    return gear_to_dict(l)
 
 
 @router.post("/lenses")
@@ -719,7 +1213,7 @@ async def create_lens(request: Request, db: Session = Depends(get_db)):
     l = Lens(name=payload.get("name"), mount=payload.get("mount"), image_path=payload.get("image_path"), notes=payload.get("notes"))
     db.add(l)
     db.commit()
-    return {"ok": True, "lens": {"id": l.id, "name": l.name, "mount": l.mount, "image_path": l.image_path, "url": catalog_url(l.image_path), "notes": l.notes}}
+    return {"ok": True, "lens": gear_to_dict(l)}
 
 
 @router.put("/lenses/{lens_id}")
@@ -759,4 +1253,4 @@ async def upload_lens_image(lens_id: int, file: UploadFile = File(...), db: Sess
         shutil.copyfileobj(file.file, out)
     l.image_path = rel_path
     db.commit()
-    return {"ok": True, "lens": {"id": l.id, "name": l.name, "mount": l.mount, "image_path": l.image_path, "url": catalog_url(l.image_path), "notes": l.notes}}
\ No newline at end of file
+    return {"ok": True, "lens": gear_to_dict(l)}
\ No newline at end of file
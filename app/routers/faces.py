@@ -0,0 +1,211 @@
+import os
+from typing import List, Optional
+
+from fastapi import APIRouter, Body, Depends
+from fastapi.responses import FileResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..db import get_db, get_async_db
+from ..models import Face, Person
+from ..services import face, face_crops
+
+router = APIRouter(prefix="/api", tags=["faces"])
+
+MAX_PAGE = 500
+
+
+def face_to_dict(f):
+    return {
+        "id": f.id,
+        "image_id": f.image_id,
+        "person_id": f.person_id,
+        "bbox": {"x": f.bbox_x, "y": f.bbox_y, "w": f.bbox_w, "h": f.bbox_h},
+        "crop_url": f"/api/faces/{f.id}/crop",
+    }
+
+
+def person_to_dict(p: Person, face_count: Optional[int] = None):
+    d = {"id": p.id, "name": p.name, "created_at": p.created_at.isoformat()}
+    if face_count is not None:
+        d["face_count"] = face_count
+    return d
+
+
+def _id_list(value) -> Optional[List[int]]:
+    if not isinstance(value, list):
+        return None
+    try:
+        return [int(v) for v in value]
+    except (TypeError, ValueError):
+        return None
+
+
+@router.get("/faces/{face_id}/crop")
+def get_face_crop(face_id: int, db: Session = Depends(get_db)):
+    f = db.get(Face, face_id)
+    if not f:
+        return {"error": "not_found"}
+    path = face_crops.ensure_crop(db, f)
+    if path is None:
+        return {"error": "unreadable_image"}
+    # Crop names change whenever the face's image or bbox does
+    headers = {"Cache-Control": "public, max-age=86400"}
+    return FileResponse(os.path.abspath(path), media_type=face_crops.media_type(), headers=headers)
+
+
+@router.get("/persons/{person_id}/faces")
+async def list_person_faces(
+    person_id: int,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    p = await db.get(Person, person_id)
+    if not p:
+        return {"error": "not_found"}
+    limit = max(1, min(limit, MAX_PAGE))
+    # Keyset pagination on (person_id, id): every page is an index range scan
+    q = select(Face.id, Face.image_id, Face.person_id, Face.bbox_x, Face.bbox_y, Face.bbox_w, Face.bbox_h).where(
+        Face.person_id == person_id
+    )
+    if after_id is not None:
+        q = q.where(Face.id > after_id)
+    rows = (await db.execute(q.order_by(Face.id.asc()).limit(limit))).all()
+    total = (await db.execute(select(func.count(Face.id)).where(Face.person_id == person_id))).scalar()
+    return {
+        "person": person_to_dict(p),
+        "total": total,
+        "faces": [face_to_dict(r) for r in rows],
+        "next_after_id": rows[-1].id if len(rows) == limit else None,
+    }
+
+
+# ---------------------------
+# Persons
+# ---------------------------
+@router.get("/persons")
+async def list_persons(q: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    counts = (
+        select(Face.person_id, func.count(Face.id).label("n"))
+        .where(Face.person_id.isnot(None))
+        .group_by(Face.person_id)
+        .subquery()
+    )
+    stmt = select(Person, func.coalesce(counts.c.n, 0)).outerjoin(counts, counts.c.person_id == Person.id)
+    if q:
+        stmt = stmt.where(Person.name.ilike(f"%{q}%"))
+    result = await db.execute(stmt.order_by(Person.name.asc()))
+    return [person_to_dict(p, n) for p, n in result.all()]
+
+
+@router.get("/persons/{person_id}")
+async def get_person(person_id: int, db: AsyncSession = Depends(get_async_db)):
+    p = await db.get(Person, person_id)
+    if not p:
+        return {"error": "not_found"}
+    n = (await db.execute(select(func.count(Face.id)).where(Face.person_id == person_id))).scalar()
+    return person_to_dict(p, n)
+
+
+@router.post("/persons")
+def create_person(payload: dict = Body(...), db: Session = Depends(get_db)):
+    name = (payload.get("name") or "").strip()
+    if not name:
+        return {"error": "invalid_request"}
+    if db.query(Person.id).filter(Person.name == name).first():
+        return {"error": "name_taken"}
+    p = Person(name=name)
+    db.add(p)
+    db.commit()
+    return {"ok": True, "person": person_to_dict(p, 0)}
+
+
+@router.put("/persons/{person_id}")
+def rename_person(person_id: int, payload: dict = Body(...), db: Session = Depends(get_db)):
+    p = db.get(Person, person_id)
+    if not p:
+        return {"error": "not_found"}
+    name = (payload.get("name") or "").strip()
+    if not name:
+        return {"error": "invalid_request"}
+    if db.query(Person.id).filter(Person.name == name, Person.id != p.id).first():
+        return {"error": "name_taken"}
+    p.name = name
+    db.commit()
+    return {"ok": True, "person": person_to_dict(p)}
+
+
+@router.post("/persons/{person_id}/merge")
+def merge_persons(person_id: int, payload: dict = Body(...), db: Session = Depends(get_db)):
+    """Fold ``source_ids`` into this person; their faces and prototype sums move over."""
+    target = db.get(Person, person_id)
+    if not target:
+        return {"error": "not_found"}
+    source_ids = _id_list(payload.get("source_ids"))
+    if not source_ids:
+        return {"error": "invalid_request"}
+    moved = face.merge_persons(db, target, source_ids)
+    assigned = face.reassign_unlabeled(db, person_ids=[target.id]) if payload.get("reassign", True) else 0
+    db.commit()
+    return {"ok": True, "person": person_to_dict(target), "moved": moved, "assigned": assigned}
+
+
+# ---------------------------
+# Face labelling
+# ---------------------------
+@router.post("/faces/label")
+def label_faces(payload: dict = Body(...), db: Session = Depends(get_db)):
+    """Label ``face_ids`` as ``person_id`` (or ``name``, created if new).
+
+    With ``reassign`` (default true) unassigned faces are re-scored against
+    the prototypes that moved.
+    """
+    face_ids = _id_list(payload.get("face_ids"))
+    if not face_ids:
+        return {"error": "invalid_request"}
+    if payload.get("person_id") is not None:
+        try:
+            person_id = int(payload["person_id"])
+        except (TypeError, ValueError):
+            return {"error": "invalid_request"}
+        p = db.get(Person, person_id)
+        if not p:
+            return {"error": "not_found"}
+    else:
+        name = (payload.get("name") or "").strip()
+        if not name:
+            return {"error": "invalid_request"}
+        p = db.query(Person).filter(Person.name == name).first()
+        if not p:
+            p = Person(name=name)
+            db.add(p)
+            db.flush()
+    changed, touched = face.label_faces(db, face_ids, p.id)
+    assigned = face.reassign_unlabeled(db, person_ids=touched) if touched and payload.get("reassign", True) else 0
+    db.commit()
+    return {"ok": True, "person": person_to_dict(p), "labelled": changed, "assigned": assigned}
+
+
+@router.post("/faces/unlabel")
+def unlabel_faces(payload: dict = Body(...), db: Session = Depends(get_db)):
+    face_ids = _id_list(payload.get("face_ids"))
+    if not face_ids:
+        return {"error": "invalid_request"}
+    changed, touched = face.label_faces(db, face_ids, None)
+    assigned = 0
+    if touched and payload.get("reassign", True):
+        # The faces just unlabelled would snap straight back to a nearby prototype
+        assigned = face.reassign_unlabeled(db, person_ids=touched, exclude=face_ids)
+    db.commit()
+    return {"ok": True, "unlabelled": changed, "assigned": assigned}
+
+
+@router.post("/faces/reassign")
+def reassign_faces(payload: dict = Body(default={}), db: Session = Depends(get_db)):
+    """Re-run auto-assignment for unassigned faces (all, or ``face_ids``) against every prototype."""
+    face_ids = _id_list(payload.get("face_ids")) if payload.get("face_ids") is not None else None
+    assigned = face.reassign_unlabeled(db, face_ids=face_ids)
+    db.commit()
+    return {"ok": True, "assigned": assigned}
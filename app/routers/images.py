@@ -8,17 +8,14 @@ from starlette.templating import Jinja2Templates
 
 from ..db import get_db
 from ..models import ImageAsset, FilmRoll, ImageType, Face, Person
-from ..services.face import process_image
+from ..services import ingest, storage
+from ..services.face import label_faces, process_image
 
 templates = Jinja2Templates(directory="templates")
 router = APIRouter(prefix="/images", tags=["images"])
 
 BASE_UPLOAD_DIR = Path("static/uploads")
-CONTACT_DIR = BASE_UPLOAD_DIR / "contact_sheets"
-SCAN_DIR = BASE_UPLOAD_DIR / "scans"
-
-for d in [BASE_UPLOAD_DIR, CONTACT_DIR, SCAN_DIR]:
-    d.mkdir(parents=True, exist_ok=True)
+BASE_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 
 @router.get("/upload")
@@ -43,13 +40,7 @@ async def upload_image(
         return RedirectResponse(url="/images/upload", status_code=303)
 
     filename = file.filename or "upload.jpg"
-    safe_name = filename.replace(" ", "_")
-    target_dir = CONTACT_DIR if type == ImageType.contact_sheet else SCAN_DIR
-    target_path = target_dir / safe_name
-
-    content = await file.read()
-    with open(target_path, "wb") as f:
-        f.write(content)
+    key, target_path = storage.save(type.value, os.path.splitext(filename)[1], file.file)
 
     # parse capture date
     cd = None
@@ -64,11 +55,14 @@ async def upload_image(
     img = ImageAsset(
         film_roll_id=film.id,
         type=type,
-        path=str(target_path.resolve()),
+        path=target_path,
+        storage_key=key,
+        original_filename=file.filename,
         frame_number=frame_number,
         notes=notes,
         capture_date=cd,
     )
+    ingest.analyze(img)
     db.add(img)
     db.commit()
 
@@ -132,7 +126,7 @@ def label_face(face_id: int, name: str = Form(...), db: Session = Depends(get_db
         person = Person(name=name)
         db.add(person)
         db.flush()
-    face.person_id = person.id
+    label_faces(db, [face.id], person.id)
     db.commit()
     return RedirectResponse(url=f"/images/{face.image_id}", status_code=303)
 
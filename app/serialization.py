@@ -0,0 +1,50 @@
+"""JSON encoding for large API responses.
+
+Returning a list from an endpoint makes FastAPI walk it with
+``jsonable_encoder`` (a Python call per dict and per value) before the
+stdlib encoder runs. List endpoints instead select only the columns they
+emit, build plain dicts from the rows and return an ``ORJSONResponse``,
+which encodes in one C pass; dates, datetimes and enums are handled by
+the encoder, so the dict builders leave them as they are.
+
+orjson is optional: without it the same output comes from the stdlib
+encoder, just slower.
+"""
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any
+
+from starlette.responses import Response
+
+from .instrumentation import span
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON, the same document jsonable_encoder + JSONResponse would send."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default).encode()
+
+
+class ORJSONResponse(Response):
+    """JSONResponse that skips jsonable_encoder; return it from the endpoint directly."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        with span("serialize"):
+            return dumps(content)
@@ -1,110 +1,481 @@
+import logging
 import os
+import threading
+from datetime import datetime
 import numpy as np
-from typing import List, Tuple, Optional
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from sqlalchemy.orm import Session
 
 DEEPFACE_ENABLED = os.getenv("DEEPFACE_ENABLED", "true").lower() == "true"
 FACE_MATCH_THRESHOLD = float(os.getenv("FACE_MATCH_THRESHOLD", "0.7"))
+# "local" runs models in this process; "worker" delegates to app.face_worker
+FACE_BACKEND = os.getenv("FACE_BACKEND", "local").lower()
+# Face-index scans uploaded through the JSON API in the background
+FACE_INDEX_ON_UPLOAD = os.getenv("FACE_INDEX_ON_UPLOAD", "true").lower() == "true"
+# Images per detection / embedding pass when indexing uploads locally
+UPLOAD_BATCH_SIZE = 16
+DETECTOR_BACKEND = "retinaface"
+EMBEDDING_MODEL = "ArcFace"
 
-if DEEPFACE_ENABLED:
+from .. import events
+from ..instrumentation import span
+from ..models import ImageAsset, Face, Person
+from . import face_crops
+from .imaging import Box, abs_path, image_box, load_rgb
+
+logger = logging.getLogger("negarchive.face")
+
+# DeepFace pulls in TensorFlow; import it on first use instead of at module import
+_deepface = None
+_deepface_loaded = False
+_deepface_lock = threading.Lock()
+# TensorFlow models are not guaranteed thread-safe: one detection or embedding
+# pass at a time per process. Decoding frames cut from sheets stays outside it.
+_inference_lock = threading.Lock()
+
+
+def get_deepface():
+    """Return the DeepFace module, importing it once; None if disabled or missing."""
+    global _deepface, _deepface_loaded
+    if _deepface_loaded:
+        return _deepface
+    with _deepface_lock:
+        if not _deepface_loaded:
+            if DEEPFACE_ENABLED:
+                try:
+                    with span("face_import"):
+                        from deepface import DeepFace
+                    _deepface = DeepFace
+                except Exception:
+                    _deepface = None
+            _deepface_loaded = True
+    return _deepface
+
+
+def deepface_available() -> bool:
+    return get_deepface() is not None
+
+
+def warm_up() -> bool:
+    """Import DeepFace and build the detector and embedding models ahead of the first image."""
+    DeepFace = get_deepface()
+    if DeepFace is None:
+        return False
     try:
-        from deepface import DeepFace
-        DEEPFACE_AVAILABLE = True
+        with span("face_warm_up"), _inference_lock:
+            DeepFace.build_model(EMBEDDING_MODEL)
+            # Detector weights load on first detection; run one on a blank frame
+            DeepFace.extract_faces(
+                img_path=np.zeros((64, 64, 3), dtype=np.uint8),
+                detector_backend=DETECTOR_BACKEND,
+                enforce_detection=False,
+            )
     except Exception:
-        DEEPFACE_AVAILABLE = False
-else:
-    DEEPFACE_AVAILABLE = False
+        return False
+    return True
 
-from ..models import ImageAsset, Face, Person
 
+Detection = Tuple[Tuple[int, int, int, int], Optional[np.ndarray]]
 
-def _cosine(a: np.ndarray, b: np.ndarray) -> float:
-    if a.size == 0 or b.size == 0:
-        return 0.0
-    denom = np.linalg.norm(a) * np.linalg.norm(b)
-    if denom == 0:
-        return 0.0
-    return float(np.dot(a, b) / denom)
 
-
-def detect_and_embed(image_path: str) -> List[Tuple[Tuple[int, int, int, int], Optional[np.ndarray]]]:
+def detect_and_embed(image_path: str) -> List[Detection]:
     """Return list of (bbox, embedding) tuples. Embedding may be None if disabled/unavailable."""
-    results: List[Tuple[Tuple[int, int, int, int], Optional[np.ndarray]]] = []
-    if DEEPFACE_AVAILABLE:
+    if FACE_BACKEND == "worker":
+        from ..face_worker import remote_detect_and_embed
+        return remote_detect_and_embed(image_path)
+    return detect_and_embed_local(image_path)
+
+
+def detect_and_embed_local(image_path: str) -> List[Detection]:
+    """Run detection and embedding with models loaded in this process."""
+    return detect_and_embed_batch([image_path])[0]
+
+
+def _embed_batch(DeepFace, crops: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+    """Embed aligned face crops (RGB, 0..1) in a single forward pass."""
+    from deepface.modules import preprocessing
+
+    model = DeepFace.build_model(EMBEDDING_MODEL)
+    target_h, target_w = model.input_shape[1], model.input_shape[0]
+    batch = np.concatenate([
+        # Same preprocessing as DeepFace.represent: BGR, resized and padded to the model input
+        preprocessing.resize_image(img=c[:, :, ::-1], target_size=(target_h, target_w))
+        for c in crops
+    ])
+    out = np.asarray(model.model(batch, training=False))
+    return [row.astype(np.float32) for row in out]
+
+
+def _detector_input(path: str, box: Optional[Box]):
+    """What DeepFace reads: the path itself, or a BGR array for a frame cut from a sheet."""
+    if box is None:
+        return abs_path(path)
+    opened = load_rgb(path, box=box)
+    if opened is None:
+        raise ValueError(f"unreadable image {path}")
+    return np.asarray(opened[0])[:, :, ::-1]
+
+
+def detect_and_embed_batch(image_paths: List[str], boxes: Optional[List[Optional[Box]]] = None) -> List[List[Detection]]:
+    """Detect faces per image, then embed every face of the batch together.
+
+    ``boxes`` crops individual images to one frame of a sheet; bboxes are
+    then relative to the frame. Falls back to one DeepFace.represent call
+    per face if the batched forward pass is unsupported by the installed
+    DeepFace version.
+    """
+    results: List[List[Detection]] = [[] for _ in image_paths]
+    DeepFace = get_deepface()
+    if DeepFace is None:
+        # Fallback: no embeddings
+        return results
+    crops: List[np.ndarray] = []
+    owners: List[Tuple[int, Tuple[int, int, int, int]]] = []
+    for idx, path in enumerate(image_paths):
         try:
-            # Using RetinaFace detector and ArcFace embeddings via represent
-            faces = DeepFace.extract_faces(img_path=image_path, detector_backend="retinaface", enforce_detection=False)
-            for f in faces:
-                x, y, w, h = int(f["facial_area"]["x"]), int(f["facial_area"]["y"]), int(f["facial_area"]["w"]), int(f["facial_area"]["h"])
-                # represent returns embeddings across models; pick default (ArcFace)
-                try:
-                    rep = DeepFace.represent(img_path=image_path, detector_backend="retinaface", enforce_detection=False)
-                    # DeepFace.represent can return list of dict with 'embedding'
-                    emb = None
-                    if isinstance(rep, list) and len(rep) > 0 and "embedding" in rep[0]:
-                        emb = np.array(rep[0]["embedding"], dtype=np.float32)
-                except Exception:
-                    emb = None
-                results.append(((x, y, w, h), emb))
-            return results
+            with span("face_detect"):
+                source = _detector_input(path, boxes[idx] if boxes else None)
+                with _inference_lock:
+                    faces = DeepFace.extract_faces(
+                        img_path=source, detector_backend=DETECTOR_BACKEND, enforce_detection=False
+                    )
         except Exception:
-            pass
-    # Fallback: no embeddings
+            continue
+        for f in faces:
+            area = f["facial_area"]
+            bbox = (int(area["x"]), int(area["y"]), int(area["w"]), int(area["h"]))
+            # enforce_detection=False yields one whole-image "face" when nothing is found
+            if f.get("confidence", 1) == 0:
+                continue
+            crops.append(f["face"])
+            owners.append((idx, bbox))
+    if not crops:
+        return results
+    embeddings: List[Optional[np.ndarray]]
+    try:
+        with span("face_embed"), _inference_lock:
+            embeddings = _embed_batch(DeepFace, crops)
+    except Exception:
+        embeddings = []
+        for c in crops:
+            try:
+                with span("face_embed"), _inference_lock:
+                    rep = DeepFace.represent(
+                        img_path=(c[:, :, ::-1] * 255).astype(np.uint8),
+                        model_name=EMBEDDING_MODEL,
+                        detector_backend="skip",
+                        enforce_detection=False,
+                    )
+                embeddings.append(np.array(rep[0]["embedding"], dtype=np.float32))
+            except Exception:
+                embeddings.append(None)
+    for (idx, bbox), emb in zip(owners, embeddings):
+        results[idx].append((bbox, emb))
     return results
 
 
-def person_prototypes(db: Session) -> List[Tuple[int, np.ndarray]]:
-    """Compute prototypes per person as mean of their face embeddings."""
-    prototypes: List[Tuple[int, np.ndarray]] = []
-    persons = db.query(Person).all()
-    for p in persons:
-        embs: List[np.ndarray] = []
-        for f in p.faces:
-            if f.embedding and isinstance(f.embedding.get("v"), list):
-                embs.append(np.array(f.embedding["v"], dtype=np.float32))
-        if embs:
-            proto = np.mean(np.stack(embs), axis=0)
-            prototypes.append((p.id, proto))
-    return prototypes
+def _embedding_vector(embedding: Optional[dict]) -> Optional[np.ndarray]:
+    if embedding and isinstance(embedding.get("v"), list):
+        return np.array(embedding["v"], dtype=np.float32)
+    return None
+
+
+def person_prototypes(db: Session, person_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, np.ndarray]]:
+    """Prototype (mean embedding) per person, from the stored running sums."""
+    q = db.query(Person.id, Person.embedding_sum, Person.embedding_count).filter(Person.embedding_count > 0)
+    if person_ids is not None:
+        q = q.filter(Person.id.in_(list(person_ids)))
+    return [
+        (pid, (np.array(total, dtype=np.float64) / count).astype(np.float32))
+        for pid, total, count in q
+        if total
+    ]
+
+
+def shift_prototypes(
+    db: Session,
+    added: Dict[int, List[np.ndarray]],
+    removed: Optional[Dict[int, List[np.ndarray]]] = None,
+) -> None:
+    """Add/subtract member embeddings to persons' running sums and counts. Does not commit."""
+    removed = removed or {}
+    ids = set(added) | set(removed)
+    if not ids:
+        return
+    # Row locks on Postgres so concurrent labelling and indexing don't lose updates
+    for person in db.query(Person).filter(Person.id.in_(ids)).with_for_update():
+        total = np.array(person.embedding_sum, dtype=np.float64) if person.embedding_sum else None
+        count = person.embedding_count or 0
+        for sign, vectors in ((1, added.get(person.id, [])), (-1, removed.get(person.id, []))):
+            for v in vectors:
+                if total is None:
+                    total = np.zeros(v.shape, dtype=np.float64)
+                if v.shape != total.shape:
+                    # Embedding from another model; it never contributed to this sum
+                    continue
+                total += sign * v
+                count += sign
+        person.embedding_count = max(0, count)
+        person.embedding_sum = total.tolist() if count > 0 and total is not None else None
+    # Sessions don't autoflush; later prototype reads in this transaction must see the sums
+    db.flush()
+
+
+def rebuild_prototypes(db: Session, person_ids: Optional[Iterable[int]] = None) -> None:
+    """Recompute running sums from the faces table (migration, repair). Does not commit."""
+    sums: Dict[int, np.ndarray] = {}
+    counts: Dict[int, int] = {}
+    rows = db.query(Face.person_id, Face.embedding).filter(Face.person_id.isnot(None), Face.embedding.isnot(None))
+    persons = db.query(Person)
+    if person_ids is not None:
+        ids = list(person_ids)
+        rows = rows.filter(Face.person_id.in_(ids))
+        persons = persons.filter(Person.id.in_(ids))
+    for pid, embedding in rows:
+        v = _embedding_vector(embedding)
+        if v is None:
+            continue
+        if pid not in sums:
+            sums[pid] = v.astype(np.float64)
+            counts[pid] = 1
+        elif v.shape == sums[pid].shape:
+            sums[pid] += v
+            counts[pid] += 1
+    for person in persons:
+        person.embedding_sum = sums[person.id].tolist() if person.id in sums else None
+        person.embedding_count = counts.get(person.id, 0)
+
+
+def match_persons(
+    prototypes: List[Tuple[int, np.ndarray]], embeddings: List[Optional[np.ndarray]]
+) -> List[Optional[int]]:
+    """Best-matching person per embedding (cosine >= threshold), vectorized over all prototypes."""
+    matches: List[Optional[int]] = [None] * len(embeddings)
+    rows = [i for i, e in enumerate(embeddings) if e is not None and e.size]
+    if not prototypes or not rows:
+        return matches
+    # Only compare within one embedding model (legacy rows may have another dimension)
+    dim = embeddings[rows[0]].shape
+    rows = [i for i in rows if embeddings[i].shape == dim]
+    prototypes = [(pid, proto) for pid, proto in prototypes if proto.shape == dim]
+    if not prototypes:
+        return matches
+    ids = [pid for pid, _ in prototypes]
+    P = np.stack([proto for _, proto in prototypes])
+    P = P / np.maximum(np.linalg.norm(P, axis=1, keepdims=True), 1e-12)
+    Q = np.stack([embeddings[i] for i in rows])
+    Q = Q / np.maximum(np.linalg.norm(Q, axis=1, keepdims=True), 1e-12)
+    scores = Q @ P.T
+    best = scores.argmax(axis=1)
+    for k, (row, col) in enumerate(zip(rows, best)):
+        if scores[k, col] > 0 and scores[k, col] >= FACE_MATCH_THRESHOLD:
+            matches[row] = ids[col]
+    return matches
 
 
 def assign_person(db: Session, face: Face) -> None:
     """Assign closest known person to face when similarity exceeds threshold."""
-    if not face.embedding or not isinstance(face.embedding.get("v"), list):
+    q = _embedding_vector(face.embedding)
+    if q is None:
         return
-    q = np.array(face.embedding["v"], dtype=np.float32)
-    best_person_id = None
-    best_score = 0.0
-    for pid, proto in person_prototypes(db):
-        score = _cosine(q, proto)
-        if score > best_score:
-            best_score = score
-            best_person_id = pid
-    if best_person_id is not None and best_score >= FACE_MATCH_THRESHOLD:
-        face.person_id = best_person_id
-
-
-def process_image(db: Session, image: ImageAsset) -> int:
-    """Detect faces on an image asset, store faces and embeddings, attempt auto-assignment.
-    Returns number of faces indexed.
+    with span("face_prototypes"):
+        prototypes = person_prototypes(db)
+    match = match_persons(prototypes, [q])[0]
+    if match is not None:
+        face.person_id = match
+        shift_prototypes(db, {match: [q]})
+
+
+def label_faces(db: Session, face_ids: Iterable[int], person_id: Optional[int]) -> Tuple[int, Set[int]]:
+    """Move faces to person_id (None unlabels), shifting old and new prototypes.
+
+    Returns (faces changed, person ids whose prototype moved). Does not commit.
     """
-    path = image.path
-    faces = detect_and_embed(path)
-    count = 0
-    for (x, y, w, h), emb in faces:
-        f = Face(
-            image_id=image.id,
-            bbox_x=x,
-            bbox_y=y,
-            bbox_w=w,
-            bbox_h=h,
-            embedding=(
-                {"model": "arcface", "v": emb.tolist()} if emb is not None else None
-            ),
-        )
-        db.add(f)
+    added: Dict[int, List[np.ndarray]] = {}
+    removed: Dict[int, List[np.ndarray]] = {}
+    changed = 0
+    for f in db.query(Face).filter(Face.id.in_(list(face_ids))):
+        if f.person_id == person_id:
+            continue
+        v = _embedding_vector(f.embedding)
+        if v is not None:
+            if f.person_id is not None:
+                removed.setdefault(f.person_id, []).append(v)
+            if person_id is not None:
+                added.setdefault(person_id, []).append(v)
+        f.person_id = person_id
+        changed += 1
+    shift_prototypes(db, added, removed)
+    db.flush()
+    return changed, set(added) | set(removed)
+
+
+def merge_persons(db: Session, target: Person, source_ids: Iterable[int]) -> int:
+    """Fold source persons into target: faces, running sums and counts. Returns faces moved."""
+    ids = [pid for pid in source_ids if pid != target.id]
+    if not ids:
+        return 0
+    sources = db.query(Person).filter(Person.id.in_(ids)).with_for_update().all()
+    moved = db.query(Face).filter(Face.person_id.in_([p.id for p in sources])).update(
+        {Face.person_id: target.id}, synchronize_session=False
+    )
+    total = np.array(target.embedding_sum, dtype=np.float64) if target.embedding_sum else None
+    count = target.embedding_count or 0
+    rebuild = False
+    for p in sources:
+        if p.embedding_sum:
+            other = np.array(p.embedding_sum, dtype=np.float64)
+            if total is None:
+                total = other
+            elif other.shape == total.shape:
+                total = total + other
+            else:
+                rebuild = True
+            count += p.embedding_count or 0
+        db.delete(p)
+    target.embedding_sum = total.tolist() if total is not None else None
+    target.embedding_count = count
+    db.flush()
+    if rebuild:
+        rebuild_prototypes(db, [target.id])
         db.flush()
-        assign_person(db, f)
-        count += 1
-    db.commit()
-    return count
\ No newline at end of file
+    return moved
+
+
+def reassign_unlabeled(
+    db: Session,
+    person_ids: Optional[Iterable[int]] = None,
+    face_ids: Optional[Iterable[int]] = None,
+    exclude: Iterable[int] = (),
+    chunk: int = 2000,
+) -> int:
+    """Re-run auto-assignment for unassigned faces; returns faces assigned. Does not commit.
+
+    An unassigned face already failed to match every unchanged prototype,
+    so after a label change only the persons whose prototype moved
+    (person_ids) need scoring. Prototypes are read once for the whole run.
+    """
+    with span("face_prototypes"):
+        prototypes = person_prototypes(db, person_ids)
+    if not prototypes:
+        return 0
+    skip = set(exclude)
+    q = db.query(Face.id, Face.embedding).filter(Face.person_id.is_(None), Face.embedding.isnot(None))
+    if face_ids is not None:
+        q = q.filter(Face.id.in_(list(face_ids)))
+    added: Dict[int, List[np.ndarray]] = {}
+    updates = []
+    after = 0
+    while True:
+        rows = q.filter(Face.id > after).order_by(Face.id).limit(chunk).all()
+        if not rows:
+            break
+        after = rows[-1][0]
+        rows = [(fid, _embedding_vector(emb)) for fid, emb in rows if fid not in skip]
+        for (fid, v), pid in zip(rows, match_persons(prototypes, [v for _, v in rows])):
+            if pid is not None:
+                updates.append({"id": fid, "person_id": pid})
+                added.setdefault(pid, []).append(v)
+    if updates:
+        db.bulk_update_mappings(Face, updates)
+        shift_prototypes(db, added)
+    return len(updates)
+
+
+def mark_indexed(db: Session, image_ids: List[int]) -> None:
+    if image_ids:
+        db.query(ImageAsset).filter(ImageAsset.id.in_(image_ids)).update(
+            {ImageAsset.faces_indexed_at: datetime.utcnow()}, synchronize_session=False
+        )
+
+
+def store_faces(db: Session, detections: List[Tuple[int, List[Detection]]]) -> int:
+    """Bulk-insert Face rows for (image_id, detections) pairs with auto-assignment.
+
+    Prototypes are computed once for the whole batch. Images are marked as
+    indexed when the models actually ran. Does not commit.
+    """
+    if deepface_available():
+        mark_indexed(db, [image_id for image_id, _ in detections])
+    rows = []
+    embeddings: List[Optional[np.ndarray]] = []
+    for image_id, faces in detections:
+        for (x, y, w, h), emb in faces:
+            rows.append({
+                "image_id": image_id,
+                "bbox_x": x,
+                "bbox_y": y,
+                "bbox_w": w,
+                "bbox_h": h,
+                "embedding": {"model": "arcface", "v": emb.tolist()} if emb is not None else None,
+            })
+            embeddings.append(emb)
+    if not rows:
+        return 0
+    with span("face_prototypes"):
+        prototypes = person_prototypes(db)
+    added: Dict[int, List[np.ndarray]] = {}
+    for row, emb, pid in zip(rows, embeddings, match_persons(prototypes, embeddings)):
+        row["person_id"] = pid
+        if pid is not None:
+            added.setdefault(pid, []).append(emb)
+    db.bulk_insert_mappings(Face, rows)
+    shift_prototypes(db, added)
+    return len(rows)
+
+
+def process_image(db: Session, image: ImageAsset, job_id: Optional[str] = None) -> int:
+    """Detect faces on an image asset, store faces and embeddings, attempt auto-assignment.
+    Returns number of faces indexed; progress is published as a "faces" job.
+    """
+    with events.Job("faces", total=1, job_id=job_id, image_id=image.id) as job:
+        if FACE_BACKEND == "worker":
+            # The worker batches inference and writes the Face rows itself
+            from ..face_worker import remote_index
+            count = remote_index([image.id]).get(image.id, 0)
+        else:
+            count = store_faces(db, [(image.id, detect_and_embed_batch([image.path], [image_box(image)])[0])])
+            db.commit()
+            if count:
+                face_crops.after_index(db, [image.id])
+        job.advance()
+        job.result["faces"] = count
+    return count
+
+
+def index_uploads(image_ids: List[int]) -> None:
+    """Background task entry point after an upload: face-index the new images.
+
+    The face worker queues them for its batcher; locally they run through
+    detect_and_embed_batch in batches with their own session. Images left
+    unindexed (models unavailable, errors) keep ``faces_indexed_at`` empty
+    for ``python -m app.face_backfill``.
+    """
+    if not image_ids:
+        return
+    if FACE_BACKEND == "worker":
+        from ..face_worker import remote_index
+        remote_index(image_ids, wait=False)
+        return
+    if not deepface_available():
+        return
+    from ..db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        for start in range(0, len(image_ids), UPLOAD_BATCH_SIZE):
+            rows = db.query(
+                ImageAsset.id, ImageAsset.path, ImageAsset.crop_x, ImageAsset.crop_y, ImageAsset.crop_w, ImageAsset.crop_h
+            ).filter(ImageAsset.id.in_(image_ids[start:start + UPLOAD_BATCH_SIZE])).all()
+            if not rows:
+                continue
+            detections = detect_and_embed_batch([r.path for r in rows], [image_box(r) for r in rows])
+            pairs = [(r.id, faces) for r, faces in zip(rows, detections)]
+            store_faces(db, pairs)
+            db.commit()
+            face_crops.after_index(db, [image_id for image_id, faces in pairs if faces])
+    except Exception:
+        db.rollback()
+        logger.exception("face indexing failed for uploaded images %s", image_ids)
+    finally:
+        db.close()
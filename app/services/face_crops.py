@@ -0,0 +1,130 @@
+"""Cached face crop thumbnails.
+
+Crops are written once per face under FACE_CROP_DIR, either right after
+indexing (FACE_CROPS_ON_INDEX) or on the first request. File names include
+the face id plus a digest of its image id and bbox, so a reused id (SQLite
+can hand out a deleted row's id again) never serves a stale crop.
+"""
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image as PILImage
+from sqlalchemy.orm import Session
+
+from ..instrumentation import span
+from ..models import Face, ImageAsset
+from .imaging import Box, image_box, load_rgb
+
+FACE_CROP_DIR = os.getenv("FACE_CROP_DIR", os.path.join("static", "uploads", "faces"))
+FACE_CROP_SIZE = int(os.getenv("FACE_CROP_SIZE", "160"))
+# "jpeg" or "webp"
+FACE_CROP_FORMAT = os.getenv("FACE_CROP_FORMAT", "jpeg").lower()
+FACE_CROPS_ON_INDEX = os.getenv("FACE_CROPS_ON_INDEX", "true").lower() == "true"
+# Context around the detector's tight box, as a fraction of its size
+CROP_MARGIN = 0.25
+
+MEDIA_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp"}
+
+logger = logging.getLogger("negarchive.face_crops")
+
+
+def crop_path(face) -> str:
+    """Cache location for a Face (or any row with id, image_id and bbox_* attributes)."""
+    key = f"{face.image_id}:{face.bbox_x},{face.bbox_y},{face.bbox_w},{face.bbox_h}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:10]
+    ext = "webp" if FACE_CROP_FORMAT == "webp" else "jpg"
+    # Shard by id so no directory grows past a thousand files
+    return os.path.join(FACE_CROP_DIR, f"{face.id // 1000:05d}", f"{face.id}-{digest}.{ext}")
+
+
+def media_type() -> str:
+    return MEDIA_TYPES.get(FACE_CROP_FORMAT, "image/jpeg")
+
+
+def _crop_box(face, scale: float, width: int, height: int):
+    """Square box around the bbox with margin, in decoded-image pixels."""
+    side = max(face.bbox_w, face.bbox_h) * (1 + 2 * CROP_MARGIN) * scale
+    cx = (face.bbox_x + face.bbox_w / 2) * scale
+    cy = (face.bbox_y + face.bbox_h / 2) * scale
+    left, top = max(0, int(cx - side / 2)), max(0, int(cy - side / 2))
+    return (left, top, min(width, int(cx + side / 2)), min(height, int(cy + side / 2)))
+
+
+def write_crops(image_path: str, faces: List, box: Optional[Box] = None) -> int:
+    """Decode one scan (or one frame of it) and write the crops of the given faces; returns crops written."""
+    if not faces:
+        return 0
+    smallest = min(max(f.bbox_w, f.bbox_h) for f in faces)
+    with span("face_crop_decode"):
+        # Decode reduced as long as every crop keeps at least FACE_CROP_SIZE pixels
+        opened = load_rgb(image_path, reduce=smallest / FACE_CROP_SIZE, box=box)
+    if opened is None:
+        return 0
+    img, scale = opened
+    written = 0
+    with span("face_crop_encode"):
+        for f in faces:
+            target = crop_path(f)
+            area = _crop_box(f, scale, img.width, img.height)
+            if area[2] <= area[0] or area[3] <= area[1]:
+                continue
+            crop = img.crop(area)
+            crop.thumbnail((FACE_CROP_SIZE, FACE_CROP_SIZE), PILImage.LANCZOS)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Write then rename so concurrent readers never see a partial file;
+            # the thread id keeps concurrent writers of the same crop apart
+            tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                crop.save(tmp, format="WEBP" if FACE_CROP_FORMAT == "webp" else "JPEG", quality=85)
+                os.replace(tmp, target)
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            written += 1
+    return written
+
+
+def ensure_crop(db: Session, face: Face) -> Optional[str]:
+    """Path of the cached crop, generating it if missing; None if the scan is unreadable."""
+    target = crop_path(face)
+    if os.path.exists(target):
+        return target
+    image = db.get(ImageAsset, face.image_id)
+    if image is None or not write_crops(image.path, [face], image_box(image)):
+        return None
+    return target
+
+
+def generate_crops(db: Session, image_ids: Iterable[int]) -> int:
+    """Write missing crops for every face on the given images, decoding each scan once."""
+    ids = list(image_ids)
+    if not ids:
+        return 0
+    rows = (
+        db.query(
+            Face.id, Face.image_id, Face.bbox_x, Face.bbox_y, Face.bbox_w, Face.bbox_h,
+            ImageAsset.path, ImageAsset.crop_x, ImageAsset.crop_y, ImageAsset.crop_w, ImageAsset.crop_h,
+        )
+        .join(ImageAsset, ImageAsset.id == Face.image_id)
+        .filter(Face.image_id.in_(ids))
+        .all()
+    )
+    # Frames cut from one sheet share its file but not their crop box
+    by_source: Dict[Tuple[str, Optional[Box]], List] = {}
+    for row in rows:
+        if not os.path.exists(crop_path(row)):
+            by_source.setdefault((row.path, image_box(row)), []).append(row)
+    return sum(write_crops(path, faces, box) for (path, box), faces in by_source.items())
+
+
+def after_index(db: Session, image_ids: Iterable[int]) -> None:
+    """Pre-generate crops for freshly indexed images; failures only cost a lazy crop later."""
+    if not FACE_CROPS_ON_INDEX:
+        return
+    try:
+        generate_crops(db, image_ids)
+    except Exception:
+        logger.exception("face crop generation failed")
@@ -0,0 +1,212 @@
+"""Shared scan decoding and header probing.
+
+Pillow handles 8-bit formats, with JPEG draft decoding when the caller only
+needs a reduced size. 16-bit and unusual TIFFs fall back to OpenCV, the
+same split as the preview endpoint. ``probe`` reads only file headers, for
+the intrinsic metadata stored at ingest.
+"""
+import os
+from math import ceil
+from typing import Dict, Optional, Tuple
+
+from PIL import Image as PILImage
+from PIL import ImageFile as PILImageFile
+
+from .storage import local_path
+
+# Modes Pillow converts to RGB faithfully; 16/32-bit integer modes do not
+_PIL_MODES = {"RGB", "RGBA", "L", "LA", "P", "CMYK", "YCbCr", "1"}
+
+# Bits per sample and channels by Pillow mode, when the header says no more
+_MODE_LAYOUT = {
+    "1": (1, 1), "L": (8, 1), "P": (8, 1), "LA": (8, 2), "RGB": (8, 3), "RGBA": (8, 4),
+    "CMYK": (8, 4), "YCbCr": (8, 3), "I;16": (16, 1), "I;16B": (16, 1), "I;16L": (16, 1),
+    "I": (32, 1), "F": (32, 1),
+}
+# PNG IHDR colour type -> channels
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# TIFF / EXIF tags
+_TAG_BITS, _TAG_SAMPLES, _TAG_MAKE, _TAG_MODEL, _TAG_SOFTWARE = 258, 277, 271, 272, 305
+_TAG_XRES, _TAG_RES_UNIT, _TAG_ICC = 282, 296, 34675
+
+# (x, y, w, h) in original-image pixels
+Box = Tuple[int, int, int, int]
+
+
+def abs_path(path: str) -> str:
+    """Local file to decode for an ImageAsset.path (S3 originals are fetched on first use)."""
+    return local_path(path)
+
+
+def image_box(image) -> Optional[Box]:
+    """Crop box of a frame cut from a sheet (any row with crop_* attributes), else None."""
+    if image.crop_w is None:
+        return None
+    return (image.crop_x, image.crop_y, image.crop_w, image.crop_h)
+
+
+def scaled_box(box: Box, scale: float) -> Tuple[int, int, int, int]:
+    """PIL crop rectangle (left, top, right, bottom) of box in an image decoded at scale."""
+    x, y, w, h = box
+    return (int(x * scale), int(y * scale), ceil((x + w) * scale), ceil((y + h) * scale))
+
+
+def probe(path: str) -> Dict[str, object]:
+    """Intrinsic metadata from the file's headers; pixels are not decoded.
+
+    Returns ImageAsset column values (width, height, bit_depth, channels,
+    format, byte_size, dpi, scanner, has_icc). Files Pillow can't identify
+    fall back to an OpenCV decode; raises if that fails too.
+    """
+    path = abs_path(path)
+    byte_size = os.path.getsize(path)
+    try:
+        img = PILImage.open(path)
+    except Exception:
+        return _probe_cv(path, byte_size)
+    with img:
+        bits, channels = _MODE_LAYOUT.get(img.mode, (None, len(img.getbands())))
+        tags = getattr(img, "tag_v2", None)
+        if tags is not None:
+            # Pillow maps 16-bit RGB TIFFs to 8-bit RGB; the header has the real depth
+            if _TAG_BITS in tags:
+                bits = max(tags[_TAG_BITS]) if isinstance(tags[_TAG_BITS], tuple) else tags[_TAG_BITS]
+            channels = tags.get(_TAG_SAMPLES, channels)
+        elif img.format == "PNG":
+            with open(path, "rb") as fh:
+                ihdr = fh.read(26)
+            bits, channels = ihdr[24], _PNG_CHANNELS.get(ihdr[25], channels)
+        exif = tags if tags is not None else img.getexif()
+        maker = " ".join(str(exif[t]).strip("\x00 ") for t in (_TAG_MAKE, _TAG_MODEL) if exif.get(t))
+        scanner = maker or (str(exif[_TAG_SOFTWARE]).strip("\x00 ") if exif.get(_TAG_SOFTWARE) else None)
+        dpi = img.info.get("dpi")
+        if tags is not None:
+            # Pillow reports a placeholder when the TIFF has no (or a unitless) resolution
+            unit = tags.get(_TAG_RES_UNIT, 2)
+            xres = float(tags[_TAG_XRES]) if _TAG_XRES in tags else None
+            dpi = (xres * (2.54 if unit == 3 else 1),) if xres and unit in (2, 3) else None
+        return {
+            "width": img.width,
+            "height": img.height,
+            "bit_depth": int(bits) if bits else None,
+            "channels": int(channels) if channels else None,
+            "format": img.format,
+            "byte_size": byte_size,
+            "dpi": int(round(float(dpi[0]))) if dpi and float(dpi[0]) > 0 else None,
+            "scanner": scanner[:200] if scanner else None,
+            "has_icc": bool(img.info.get("icc_profile") or (tags is not None and _TAG_ICC in tags)),
+        }
+
+
+def _probe_cv(path: str, byte_size: int) -> Dict[str, object]:
+    import cv2
+
+    arr = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if arr is None:
+        raise ValueError(f"unreadable image {path}")
+    return {
+        "width": arr.shape[1],
+        "height": arr.shape[0],
+        "bit_depth": arr.dtype.itemsize * 8,
+        "channels": 1 if arr.ndim == 2 else arr.shape[2],
+        "format": os.path.splitext(path)[1].lstrip(".").upper() or None,
+        "byte_size": byte_size,
+        "dpi": None,
+        "scanner": None,
+        "has_icc": None,
+    }
+
+
+def load_rgb(
+    path: str, reduce: float = 1.0, min_side: Optional[int] = None, box: Optional[Box] = None
+) -> Optional[Tuple[PILImage.Image, float]]:
+    """Decode a scan as 8-bit RGB.
+
+    JPEGs may be decoded scaled down (DCT scaling, at most 8x) by up to
+    ``reduce``, or until the shorter side would drop below ``min_side``.
+    ``box`` (x, y, w, h in original pixels) crops to one frame of a sheet;
+    ``min_side`` then applies to the box. Returns (image, decoded width /
+    original width), or None if neither Pillow nor OpenCV can read the file.
+    """
+    PILImageFile.LOAD_TRUNCATED_IMAGES = True
+    path = abs_path(path)
+    try:
+        img = PILImage.open(path)
+        orig_w = img.width
+        if min_side:
+            reduce = min(box[2:] if box else img.size) / min_side
+        if reduce > 1 and img.format == "JPEG":
+            img.draft("RGB", (ceil(img.width / reduce), ceil(img.height / reduce)))
+        if img.mode in _PIL_MODES:
+            scale = img.width / orig_w
+            if box:
+                img = img.crop(scaled_box(box, scale))
+            return img.convert("RGB"), scale
+    except Exception:
+        pass
+    try:
+        import cv2
+        import numpy as np
+        arr = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if arr is None:
+            return None
+        if box:
+            x, y, w, h = box
+            arr = arr[y:y + h, x:x + w]
+        if arr.dtype == np.uint16:
+            arr = cv2.convertScaleAbs(arr, alpha=(255.0 / 65535.0))
+        elif arr.dtype != np.uint8:
+            lo, hi = float(arr.min()), float(arr.max())
+            arr = ((arr - lo) * (255.0 / (hi - lo))).astype(np.uint8) if hi > lo else arr.astype(np.uint8)
+        if arr.ndim == 2:
+            arr = cv2.cvtColor(arr, cv2.COLOR_GRAY2RGB)
+        elif arr.shape[2] == 4:
+            arr = cv2.cvtColor(arr, cv2.COLOR_BGRA2RGB)
+        else:
+            arr = cv2.cvtColor(arr[:, :, :3], cv2.COLOR_BGR2RGB)
+        return PILImage.fromarray(arr), 1.0
+    except Exception:
+        return None
+
+
+def load_native(path: str, width: Optional[int] = None, box: Optional[Box] = None):
+    """Decode at the file's own depth (uint8 or uint16 array), RGB or single channel.
+
+    Downsized to at most ``width`` pixels wide (INTER_AREA, depth kept);
+    JPEGs decode reduced via Pillow's draft mode. None if unreadable.
+    """
+    import cv2
+    import numpy as np
+
+    path = abs_path(path)
+    try:
+        with PILImage.open(path) as img:
+            src_w = box[2] if box else img.width
+            is_jpeg = img.format == "JPEG"
+    except Exception:
+        is_jpeg = False
+    if is_jpeg:
+        # 8-bit anyway; let the DCT scaling do most of the downsizing
+        opened = load_rgb(path, reduce=src_w / width if width else 1.0, box=box)
+        if opened is None:
+            return None
+        arr = np.asarray(opened[0])
+    else:
+        arr = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if arr is None:
+            return None
+        if box:
+            x, y, w, h = box
+            arr = arr[y:y + h, x:x + w]
+        if arr.dtype not in (np.uint8, np.uint16):
+            lo, hi = float(arr.min()), float(arr.max())
+            arr = ((arr - lo) * (65535.0 / (hi - lo))).astype(np.uint16) if hi > lo else arr.astype(np.uint16)
+        if arr.ndim == 3:
+            arr = arr[:, :, :3] if arr.shape[2] >= 3 else arr[:, :, 0]
+    if width and arr.shape[1] > width:
+        height = max(1, round(arr.shape[0] * width / arr.shape[1]))
+        arr = cv2.resize(arr, (width, height), interpolation=cv2.INTER_AREA)
+    if not is_jpeg and arr.ndim == 3:
+        # Channel swap after the resize, on the small array
+        arr = arr[:, :, ::-1]
+    return np.ascontiguousarray(arr)
@@ -0,0 +1,65 @@
+"""Per-image analysis run once at ingest (and by ``python -m app.ingest_backfill``).
+
+Header metadata (size, bit depth, format, scanner, ...) and the perceptual
+hash are stored on ImageAsset so later requests don't have to open the file.
+"""
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import or_
+
+from ..models import ImageAsset
+from . import phash
+from .imaging import Box, image_box, load_rgb, probe, scaled_box
+
+logger = logging.getLogger("negarchive.ingest")
+
+
+def _metadata(path: str, box: Optional[Box] = None) -> Dict[str, object]:
+    """Header metadata; frames cut from a sheet share it but have their own size and no file."""
+    try:
+        values = probe(path)
+    except Exception:
+        logger.warning("unreadable image header: %s", path)
+        return {}
+    if box:
+        values.update(width=box[2], height=box[3], byte_size=None)
+    return values
+
+
+def derive(path: str, box: Optional[Box] = None) -> Dict[str, object]:
+    """Derived ImageAsset column values for the file at path, or one frame of it (thread-safe, no session)."""
+    values = _metadata(path, box)
+    try:
+        values.update(phash.hash_columns(phash.hash_file(path, box)))
+    except Exception:
+        logger.exception("analysis failed for %s", path)
+    return values
+
+
+def derive_frames(path: str, boxes: List[Box]) -> List[Dict[str, object]]:
+    """derive() for every frame of one sheet, decoding the file once."""
+    if not boxes:
+        return []
+    values = [_metadata(path, b) for b in boxes]
+    try:
+        # Reduce as far as the smallest frame still leaves enough pixels for the hash
+        opened = load_rgb(path, reduce=min(min(b[2], b[3]) for b in boxes) / phash.DECODE_SIDE)
+        if opened is not None:
+            img, scale = opened
+            for v, b in zip(values, boxes):
+                v.update(phash.hash_columns(phash.compute(img.crop(scaled_box(b, scale)))))
+    except Exception:
+        logger.exception("analysis failed for frames of %s", path)
+    return values
+
+
+def analyze(image: ImageAsset) -> None:
+    """Fill derived columns from the file on disk; never blocks ingest on failure."""
+    for key, value in derive(image.path, image_box(image)).items():
+        setattr(image, key, value)
+
+
+def pending_filter():
+    """Images whose derived columns were never filled."""
+    return or_(ImageAsset.phash.is_(None), ImageAsset.width.is_(None))
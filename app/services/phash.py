@@ -0,0 +1,185 @@
+"""Perceptual hashes and near-duplicate search.
+
+The hash is a 64-bit pHash: a 32x32 grayscale thumbnail, its 2-D DCT, and
+the 8x8 lowest frequencies thresholded at their median. Re-scans of the
+same negative at another resolution, exposure or slightly different crop
+land within a few bits of each other.
+
+Lookups use multi-index hashing. The hash is split into four 16-bit bands,
+each stored in its own indexed column. Two hashes within Hamming distance r
+differ in at most r // 4 bits on at least one band (pigeonhole), so
+candidates come from a few index probes per band. Only the candidates are
+compared bit by bit.
+"""
+from functools import lru_cache
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image as PILImage
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from ..instrumentation import span
+from ..models import ImageAsset
+from .imaging import Box, load_rgb
+
+BANDS = 4
+BAND_BITS = 16
+BAND_MASK = (1 << BAND_BITS) - 1
+MAX_DISTANCE = 10
+DEFAULT_SIMILAR_DISTANCE = 10
+DEFAULT_DUPLICATE_DISTANCE = 6
+
+_N = 32
+# Decoded size the hash needs (shorter side); JPEGs decode at up to 1/8 scale
+DECODE_SIDE = 4 * _N
+# Orthonormal DCT-II basis; hash = top-left 8x8 of D @ X @ D.T
+_K, _X = np.meshgrid(np.arange(_N), np.arange(_N), indexing="ij")
+_DCT = np.sqrt(2.0 / _N) * np.cos(np.pi * (2 * _X + 1) * _K / (2 * _N))
+_DCT[0] /= np.sqrt(2.0)
+
+
+def compute(img: PILImage.Image) -> int:
+    """64-bit pHash of an image, as an unsigned int."""
+    small = np.asarray(img.convert("L").resize((_N, _N), PILImage.LANCZOS), dtype=np.float64)
+    low = (_DCT @ small @ _DCT.T)[:8, :8].ravel()
+    # DC term dominates and carries only overall brightness; leave it out of the median
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hash_file(path: str, box: Optional[Box] = None) -> Optional[int]:
+    with span("phash"):
+        opened = load_rgb(path, min_side=DECODE_SIDE, box=box)
+        return compute(opened[0]) if opened else None
+
+
+def to_signed(h: int) -> int:
+    """Store as a signed BIGINT (Postgres has no unsigned 64-bit type)."""
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def to_unsigned(h: int) -> int:
+    return h + (1 << 64) if h < 0 else h
+
+
+def bands(h: int) -> List[int]:
+    return [(h >> (BAND_BITS * k)) & BAND_MASK for k in range(BANDS)]
+
+
+def hash_columns(h: Optional[int]) -> Dict[str, Optional[int]]:
+    """Column values for ImageAsset (phash plus the band columns)."""
+    values = {"phash": to_signed(h) if h is not None else None}
+    for k in range(BANDS):
+        values[f"phash_band{k}"] = bands(h)[k] if h is not None else None
+    return values
+
+
+@lru_cache(maxsize=None)
+def flip_masks(radius: int) -> Tuple[int, ...]:
+    """All 16-bit masks with at most ``radius`` bits set (0 first)."""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(BAND_BITS), r):
+            masks.append(sum(1 << b for b in bits))
+    return tuple(masks)
+
+
+def similar(db: Session, image: ImageAsset, max_distance: int = DEFAULT_SIMILAR_DISTANCE, limit: int = 20) -> List[Tuple[ImageAsset, int]]:
+    """Images within max_distance of image's hash, nearest first."""
+    if image.phash is None:
+        return []
+    max_distance = max(0, min(max_distance, MAX_DISTANCE))
+    h = to_unsigned(image.phash)
+    masks = flip_masks(max_distance // BANDS)
+    probes = [
+        getattr(ImageAsset, f"phash_band{k}").in_([b ^ m for m in masks])
+        for k, b in enumerate(bands(h))
+    ]
+    candidates = db.query(ImageAsset).filter(or_(*probes), ImageAsset.id != image.id).all()
+    scored = [(c, (to_unsigned(c.phash) ^ h).bit_count()) for c in candidates]
+    scored = [(c, d) for c, d in scored if d <= max_distance]
+    scored.sort(key=lambda cd: (cd[1], cd[0].id))
+    return scored[:limit]
+
+
+def _near_pairs(hashes: np.ndarray, max_distance: int) -> List[Tuple[int, int, int]]:
+    """(i, j, distance) for i < j over distinct hashes, vectorized per band and flip mask."""
+    n = len(hashes)
+    idx = np.arange(n, dtype=np.int32)
+    found: Dict[Tuple[int, int], int] = {}
+    for k in range(BANDS):
+        v = ((hashes >> np.uint64(BAND_BITS * k)) & np.uint64(BAND_MASK)).astype(np.int32)
+        order = np.argsort(v, kind="stable").astype(np.int32)
+        # Bucket b of the band occupies order[start[b]:start[b + 1]]
+        start = np.searchsorted(v[order], np.arange(BAND_MASK + 2)).astype(np.int32)
+        for mask in flip_masks(max_distance // BANDS):
+            if mask:
+                # (i, j) and (j, i) meet through the same mask; expand from the lower bucket only
+                src = idx[(v & (1 << (mask.bit_length() - 1))) == 0]
+            else:
+                src = idx
+            keys = v[src] ^ mask
+            lo = start[keys]
+            cnt = start[keys + 1] - lo
+            total = int(cnt.sum())
+            if not total:
+                continue
+            # Expand every (i, bucket of keys[i]) into explicit index pairs
+            i = np.repeat(src, cnt)
+            j = order[np.repeat(lo - np.cumsum(cnt) + cnt, cnt) + np.arange(total, dtype=np.int64)]
+            if not mask:
+                keep = i < j
+                i, j = i[keep], j[keep]
+            d = np.bitwise_count(hashes[i] ^ hashes[j])
+            keep = d <= max_distance
+            for a, b, dist in zip(i[keep].tolist(), j[keep].tolist(), d[keep].tolist()):
+                found[(min(a, b), max(a, b))] = dist
+    return [(a, b, d) for (a, b), d in found.items()]
+
+
+def duplicate_groups(db: Session, max_distance: int = DEFAULT_DUPLICATE_DISTANCE) -> List[Dict[str, object]]:
+    """Archive-wide clusters of images linked by hash pairs within max_distance.
+
+    Each group reports the largest distance among its linking pairs.
+    Identical hashes (including blank frames) are collapsed before the pair
+    search so large exact-duplicate buckets don't blow up quadratically.
+    """
+    max_distance = max(0, min(max_distance, MAX_DISTANCE))
+    rows = db.query(ImageAsset.id, ImageAsset.phash).filter(ImageAsset.phash.isnot(None)).all()
+    if not rows:
+        return []
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    signed = np.array([r[1] for r in rows], dtype=np.int64)
+    distinct, inverse = np.unique(signed.view(np.uint64), return_inverse=True)
+    with span("phash_pairs"):
+        pairs = _near_pairs(distinct, max_distance) if max_distance else []
+
+    # Union-find over distinct hashes
+    parent = list(range(len(distinct)))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    spread: Dict[int, int] = {}
+    for a, b, d in pairs:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[rb] = ra
+            spread[ra] = max(spread.get(ra, 0), spread.pop(rb, 0), d)
+        else:
+            spread[ra] = max(spread.get(ra, 0), d)
+    members: Dict[int, List[int]] = {}
+    for image_id, slot in zip(ids.tolist(), inverse.tolist()):
+        members.setdefault(find(slot), []).append(image_id)
+    groups = [
+        {"image_ids": sorted(group), "max_distance": spread.get(root, 0)}
+        for root, group in members.items()
+        if len(group) > 1
+    ]
+    groups.sort(key=lambda g: (-len(g["image_ids"]), g["image_ids"][0]))
+    return groups
@@ -0,0 +1,337 @@
+"""Frame segmentation for contact sheets and strip scans.
+
+Strips and the gaps between frames are flat bands of film base or paper,
+while any line through a frame varies. The sheet is decoded at reduced
+size in grayscale; rows that are flat across the sheet separate the
+strips, and inside each strip, columns that are flat and sit at the film
+base (or sheet margin) level separate the frames. Frame widths are then
+evened out against the sheet's median, and each frame's rebate is trimmed.
+Both orientations are tried, so vertically laid-out strips work too.
+Frames come back in reading order with boxes in original-image pixels.
+
+Frames become child scan rows (``parent_id`` plus ``crop_*``) that share
+the parent's file; previews, thumbnails, downloads and analysis crop on
+the fly.
+"""
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .. import events
+from ..instrumentation import span
+from ..models import ImageAsset, ImageType
+from .face import label_faces
+from .imaging import abs_path
+from .ingest import derive_frames
+
+# Queue segmentation for every uploaded contact sheet
+SEGMENT_ON_UPLOAD = os.getenv("SEGMENT_ON_UPLOAD", "false").lower() == "true"
+# Long side of the working copy; frame borders survive this easily
+WORK_SIZE = 1200
+# Fraction of non-flat lines in a run for it to count as strip (frame)
+STRIP_FILL = 0.5
+FRAME_FILL = 0.5
+# Ignore strips / frames smaller than this fraction of the sheet / strip
+MIN_STRIP = 0.04
+MIN_FRAME_ASPECT = 0.4
+# Widest frame kept, long side over short side (6x17 panoramas are about 2.8:1)
+MAX_FRAME_ASPECT = 3.0
+# Std (8-bit levels, after a light blur) below which a line is always flat
+FLAT_STD = 3.0
+# Max distance (8-bit levels) of a separator column from the film base level
+LEVEL_TOLERANCE = 12
+
+Box = Tuple[int, int, int, int]
+
+logger = logging.getLogger("negarchive.segmentation")
+
+
+def _load_gray(path: str) -> Optional[Tuple[np.ndarray, float]]:
+    """Reduced 8-bit grayscale and its scale relative to the original."""
+    import cv2
+    from PIL import Image as PILImage
+
+    path = abs_path(path)
+    try:
+        with PILImage.open(path) as probe:
+            full_w, full_h = probe.size
+    except Exception:
+        full_w = full_h = None
+    flag = cv2.IMREAD_GRAYSCALE
+    if full_w:
+        # JPEG decodes at 1/2, 1/4 or 1/8 directly; other formats are decimated after decode
+        factor = max(full_w, full_h) / WORK_SIZE
+        for reduced, f in ((cv2.IMREAD_REDUCED_GRAYSCALE_8, 8), (cv2.IMREAD_REDUCED_GRAYSCALE_4, 4), (cv2.IMREAD_REDUCED_GRAYSCALE_2, 2)):
+            if factor >= f:
+                flag = reduced
+                break
+    gray = cv2.imread(path, flag)
+    if gray is None:
+        return None
+    if full_w is None:
+        full_w = gray.shape[1]
+    if max(gray.shape) > WORK_SIZE * 1.5:
+        s = WORK_SIZE / max(gray.shape)
+        gray = cv2.resize(gray, (int(gray.shape[1] * s), int(gray.shape[0] * s)), interpolation=cv2.INTER_AREA)
+    return gray, gray.shape[1] / full_w
+
+
+def _busy(std: np.ndarray, mean: Optional[np.ndarray] = None, levels: Sequence[float] = ()) -> np.ndarray:
+    """1.0 where a row/column shows image content, 0.0 on uniform separators.
+
+    A line is a separator when it is flat (std near the grain floor) and,
+    if ``levels`` are given, sits at one of the separator levels; flat lines
+    at another level are featureless frame content such as sky.
+    """
+    flat = std <= max(FLAT_STD, 0.25 * float(np.percentile(std, 90)))
+    if levels:
+        flat &= np.min(np.abs(mean[:, None] - np.asarray(levels)[None, :]), axis=1) <= LEVEL_TOLERANCE
+    return (~flat).astype(np.float32)
+
+
+def _runs(profile: np.ndarray, fill: float, min_len: int, max_gap: int) -> List[Tuple[int, int]]:
+    """[start, end) runs where profile >= fill, bridging gaps up to max_gap."""
+    on = profile >= fill
+    runs: List[Tuple[int, int]] = []
+    i, n = 0, len(on)
+    while i < n:
+        if not on[i]:
+            i += 1
+            continue
+        j = i
+        while j < n and on[j]:
+            j += 1
+        if runs and i - runs[-1][1] <= max_gap:
+            runs[-1] = (runs[-1][0], j)
+        else:
+            runs.append((i, j))
+        i = j
+    return [(a, b) for a, b in runs if b - a >= min_len]
+
+
+def _regularize(runs: List[Tuple[int, int]], expected: float) -> List[Tuple[int, int]]:
+    """Even out frame runs against the sheet's typical frame width.
+
+    Neighbouring pieces that together still fit one frame were split by
+    flat dark content at the film base level and are merged again; runs
+    spanning several frames, whose separating gap was too faint, are
+    divided evenly.
+    """
+    merged: List[Tuple[int, int]] = []
+    # Slivers are the blurred edges of the film base, not frame content
+    for a, b in (r for r in runs if r[1] - r[0] >= expected * 0.1):
+        if merged and b - merged[-1][0] <= expected * 1.15:
+            merged[-1] = (merged[-1][0], b)
+        else:
+            merged.append((a, b))
+    out: List[Tuple[int, int]] = []
+    for a, b in merged:
+        parts = max(1, int(round((b - a) / expected)))
+        step = (b - a) / parts
+        out += [(int(a + k * step), int(a + (k + 1) * step)) for k in range(parts)]
+    return out
+
+
+def _rebate_level(gray: np.ndarray, top: int, bottom: int) -> Optional[float]:
+    """Film base level of the rebate the strip gray[top:bottom] starts with, if any.
+
+    The rebate's rows are flat and steady once past the edge with the paper,
+    which blur and JPEG ringing spread over several rows of changing level.
+    """
+    w = gray.shape[1]
+    strip = gray[top:bottom, w // 4:3 * w // 4]
+    std = strip.std(axis=1)
+    mean = strip.mean(axis=1)
+    # Same adaptive floor as _busy, taken over the whole strip
+    flat = std <= max(FLAT_STD, 0.25 * float(np.percentile(std, 90)))
+    steady = np.append(np.abs(np.diff(mean)) <= 2.0, False)
+    rows = _runs((flat & steady).astype(np.float32), 1.0, 3, 0)
+    # Only a run near the top is the rebate; flat rows further in are frame content
+    if rows and rows[0][0] <= (bottom - top) // 4:
+        a, b = rows[0]
+        return float(np.median(mean[a:b]))
+    return None
+
+
+def _separator_levels(gray: np.ndarray, top: int, bottom: int, background: float) -> List[float]:
+    """Film base / paper levels around the frames of the strip gray[top:bottom]."""
+    levels = [background]
+    # Strips found with their rebate start with flat rows of film base; otherwise
+    # the frames start right away and the base (or paper) is just outside the strip
+    rebate = _rebate_level(gray, top, bottom)
+    if rebate is not None:
+        levels.append(rebate)
+    else:
+        outside = np.concatenate([gray[max(0, top - 3):top], gray[bottom:bottom + 3]])
+        if outside.size:
+            levels.append(float(np.median(outside)))
+    return levels
+
+
+def _segment_rows(gray: np.ndarray) -> List[Box]:
+    h, w = gray.shape
+    strips = _runs(_busy(gray.std(axis=1)), STRIP_FILL, max(2, int(h * MIN_STRIP)), max(1, h // 200))
+    # Sheet margin: paper, scanner lid or backlight, also flat between frames
+    background = float(np.median(np.concatenate([gray[:2].ravel(), gray[-2:].ravel(), gray[:, :2].ravel(), gray[:, -2:].ravel()])))
+    per_strip = []
+    for top, bottom in strips:
+        strip_h = bottom - top
+        levels = _separator_levels(gray, top, bottom, background)
+        # Central rows only: sprocket holes along the strip edges are not uniform
+        core = gray[top + strip_h // 5:bottom - strip_h // 5]
+        busy = _busy(core.std(axis=0), core.mean(axis=0), levels)
+        per_strip.append((top, strip_h, levels, _runs(busy, FRAME_FILL, 2, max(1, w // 400))))
+    # Frames on one sheet share a size; the median ignores the odd fragment
+    widths = sorted(b - a for _, strip_h, _, cols in per_strip for a, b in cols if b - a >= strip_h * MIN_FRAME_ASPECT)
+    if not widths:
+        return []
+    expected = widths[len(widths) // 2]
+    frames: List[Box] = []
+    for top, strip_h, levels, cols in per_strip:
+        spans = []
+        for a, b in _regularize(cols, expected):
+            if b - a < strip_h * MIN_FRAME_ASPECT:
+                continue
+            # Trim the rebate: keep the rows of this frame that aren't film base
+            block = gray[top:top + strip_h, a:b]
+            rows = _runs(_busy(block.std(axis=1), block.mean(axis=1), levels), 0.5, 1, max(1, strip_h // 50))
+            y0, y1 = max(rows, key=lambda r: r[1] - r[0]) if rows else (0, strip_h)
+            spans.append((a, b, y0, y1))
+        if not spans:
+            continue
+        # Dark content at a frame edge can eat into the trim; fall back to the strip's typical rows
+        my0 = int(np.median([s[2] for s in spans]))
+        my1 = int(np.median([s[3] for s in spans]))
+        for a, b, y0, y1 in spans:
+            if y1 - y0 < 0.9 * (my1 - my0):
+                y0, y1 = my0, my1
+            frames.append((a, top + int(y0), b - a, int(y1 - y0)))
+    return frames
+
+
+def detect_frames(gray: np.ndarray) -> List[Box]:
+    """Frame boxes (x, y, w, h) in working-copy pixels, in reading order."""
+    import cv2
+
+    # Light blur so grain doesn't read as content
+    g = cv2.GaussianBlur(gray, (5, 5), 0).astype(np.float32)
+    horizontal = _segment_rows(g)
+    vertical = [(y, x, h, w) for x, y, w, h in _segment_rows(g.T)]
+    if len(horizontal) != len(vertical):
+        return horizontal if len(horizontal) > len(vertical) else _reading_order(vertical)
+    # A regular grid segments either way; frames sit closer together along their strip
+    if _frame_gap(vertical, True) < _frame_gap(horizontal, False):
+        return _reading_order(vertical)
+    return horizontal
+
+
+def _reading_order(vertical: List[Box]) -> List[Box]:
+    """Vertical strips read left to right, top to bottom within a strip."""
+    return sorted(vertical, key=lambda b: (b[0], b[1]))
+
+
+def _frame_gap(boxes: List[Box], vertical: bool) -> float:
+    """Median gap between consecutive frames of the same strip (boxes in strip order)."""
+    a, b = (1, 0) if vertical else (0, 1)
+    gaps = [
+        q[a] - (p[a] + p[a + 2])
+        for p, q in zip(boxes, boxes[1:])
+        if abs(q[b] - p[b]) < p[b + 2] / 2
+    ]
+    return float(np.median(gaps)) if gaps else float("inf")
+
+
+def _uniform(boxes: List[Box]) -> bool:
+    """Whether most boxes share one frame size, as frames on a sheet do."""
+    w = np.median([b[2] for b in boxes])
+    h = np.median([b[3] for b in boxes])
+    alike = sum(abs(b[2] - w) <= 0.15 * w and abs(b[3] - h) <= 0.15 * h for b in boxes)
+    return alike >= 0.75 * len(boxes)
+
+
+def segment_file(path: str) -> List[Box]:
+    """Frame boxes in original-image pixels; empty if unreadable or no frames found."""
+    with span("segment_decode"):
+        loaded = _load_gray(path)
+    if loaded is None:
+        return []
+    gray, scale = loaded
+    with span("segment_detect"):
+        boxes = detect_frames(gray)
+    # A box much longer than any film frame is a whole strip whose gaps went unseen
+    boxes = [b for b in boxes if max(b[2], b[3]) <= MAX_FRAME_ASPECT * max(1, min(b[2], b[3]))]
+    if len(boxes) < 2 or not _uniform(boxes):
+        # A single "frame" is the whole sheet, and a photo split at flat areas gives
+        # pieces of all sizes: nothing to split either way
+        return []
+    return [
+        (int(x / scale), int(y / scale), int(w / scale), int(h / scale))
+        for x, y, w, h in boxes
+    ]
+
+
+def segment_image(db: Session, parent: ImageAsset, replace: bool = False) -> List[ImageAsset]:
+    """Create child frame rows for a sheet or strip scan. Commits."""
+    existing = db.query(ImageAsset).filter(ImageAsset.parent_id == parent.id).all()
+    if existing and not replace:
+        return existing
+    boxes = segment_file(parent.path)
+    # Take the old frames' labelled faces out of their persons' prototypes first
+    labelled = [f.id for child in existing for f in child.faces if f.person_id is not None]
+    if labelled:
+        label_faces(db, labelled, None)
+    for child in existing:
+        db.delete(child)
+    now = datetime.utcnow()
+    children = [
+        ImageAsset(
+            film_roll_id=parent.film_roll_id,
+            type=ImageType.scan,
+            path=parent.path,
+            storage_key=parent.storage_key,
+            frame_number=n,
+            capture_date=parent.capture_date,
+            parent_id=parent.id,
+            crop_x=x,
+            crop_y=y,
+            crop_w=w,
+            crop_h=h,
+            created_at=now,
+        )
+        for n, (x, y, w, h) in enumerate(boxes, start=1)
+    ]
+    with span("segment_derive"):
+        for child, values in zip(children, derive_frames(parent.path, boxes)):
+            for key, value in values.items():
+                setattr(child, key, value)
+    db.add_all(children)
+    parent.segmented_at = now
+    db.commit()
+    return children
+
+
+def run_job(image_id: int, replace: bool = False, job_id: Optional[str] = None) -> None:
+    """Background task entry point: own session, errors logged and published as a "segment" job."""
+    from ..db import SessionLocal
+
+    db = SessionLocal()
+    with events.Job("segment", total=1, job_id=job_id, image_id=image_id) as job:
+        try:
+            parent = db.get(ImageAsset, image_id)
+            if parent is None:
+                job.fail("not_found")
+            else:
+                children = segment_image(db, parent, replace)
+                logger.info("segmented image %s into %d frames", image_id, len(children))
+                job.advance()
+                job.result["frames"] = len(children)
+        except Exception as exc:
+            db.rollback()
+            logger.exception("segmentation failed for image %s", image_id)
+            job.fail(str(exc) or type(exc).__name__)
+        finally:
+            db.close()
@@ -0,0 +1,240 @@
+"""Where uploaded files live.
+
+Every file is addressed by a storage key, ``uploads/<kind>/ab/cd/<name>``:
+a two-level hashed fan-out so no directory (or listing prefix) grows past
+a few thousand entries. Files from the earlier flat layout
+(``uploads/<kind>/<name>``) are moved by ``python -m app.storage_migrate``.
+
+STORAGE_BACKEND picks where new originals go. ``local`` writes under the
+static root, and ImageAsset.path is the relative file path as before.
+``s3`` writes to an S3-compatible bucket, and path is ``s3://bucket/key``.
+Rows keep working whichever backend wrote them. Derivatives (previews,
+face crops) always stay on local disk.
+
+Decoders need a file on disk: ``local_path`` downloads an S3 object once
+into STORAGE_CACHE_DIR and reads it from there afterwards. Browsers fetch
+S3 originals straight from the bucket through presigned URLs.
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+from functools import lru_cache
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from uuid import uuid4
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+# MinIO, moto or another S3-compatible server; unset for AWS
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_REGION = os.getenv("S3_REGION") or None
+S3_PRESIGN_SECONDS = int(os.getenv("S3_PRESIGN_SECONDS", "3600"))
+# Objects above this are uploaded and downloaded in parts of this size
+S3_MULTIPART_MB = int(os.getenv("S3_MULTIPART_MB", "64"))
+# Local copies of S3 originals for decoding; disposable
+STORAGE_CACHE_DIR = os.getenv("STORAGE_CACHE_DIR", os.path.join("cache", "originals"))
+
+STATIC_ROOT = "static"
+UPLOAD_PREFIX = "uploads"
+# Kind directories by ImageType value
+KIND_DIRS = {"scan": "scans", "contact_sheet": "contact_sheets"}
+S3_SCHEME = "s3://"
+COPY_BUFFER = 1 << 20
+
+_HEX = re.compile(r"[0-9a-f]{4,}")
+_SHARDED = re.compile(r"uploads/[^/]+/[0-9a-f]{2}/[0-9a-f]{2}/[^/]+")
+
+logger = logging.getLogger("negarchive.storage")
+
+Source = Union[str, BinaryIO]
+
+
+def sharded_key(kind: str, filename: str, salt: str = "") -> str:
+    """Key for filename under the fan-out; uuid-hex names shard on themselves, others on a digest."""
+    stem = os.path.splitext(filename)[0].lower()
+    digest = stem if _HEX.fullmatch(stem) else hashlib.sha1(f"{salt}{filename}".encode()).hexdigest()
+    return f"{UPLOAD_PREFIX}/{KIND_DIRS.get(kind, kind)}/{digest[:2]}/{digest[2:4]}/{filename}"
+
+
+def is_sharded(key: Optional[str]) -> bool:
+    return bool(key and _SHARDED.fullmatch(key))
+
+
+def is_remote(path: str) -> bool:
+    return path.startswith(S3_SCHEME)
+
+
+def key_path(key: str) -> str:
+    """Local path (relative to the working directory, like ImageAsset.path) of a key."""
+    return os.path.join(STATIC_ROOT, *key.split("/"))
+
+
+def key_for_path(path: str) -> Optional[str]:
+    """Storage key of a local file path, or None if it lies outside the static root (or isn't local)."""
+    if is_remote(path):
+        return None
+    rel = os.path.relpath(local_path(path), local_path(STATIC_ROOT))
+    if rel.startswith(os.pardir) or os.path.isabs(rel):
+        return None
+    return rel.replace(os.sep, "/")
+
+
+def public_url(key: str) -> str:
+    return f"/static/{key}"
+
+
+def _split(path: str) -> Tuple[str, str]:
+    bucket, _, key = path[len(S3_SCHEME):].partition("/")
+    return bucket, key
+
+
+@lru_cache(maxsize=1)
+def _s3():
+    # Optional dependency: only needed once something lives in S3
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        "s3",
+        endpoint_url=S3_ENDPOINT_URL,
+        region_name=S3_REGION,
+        config=Config(signature_version="s3v4", max_pool_connections=16),
+    )
+
+
+def _transfer():
+    from boto3.s3.transfer import TransferConfig
+
+    part = S3_MULTIPART_MB << 20
+    return TransferConfig(multipart_threshold=part, multipart_chunksize=part)
+
+
+def _cache_path(path: str) -> str:
+    bucket, key = _split(path)
+    return os.path.join(STORAGE_CACHE_DIR, bucket, *key.split("/"))
+
+
+def _write(src: Source, target: str) -> None:
+    """Stream src (file object or local path) to target via a temp file, so readers never see a partial file."""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        if isinstance(src, str):
+            shutil.copyfile(src, tmp)
+        else:
+            with open(tmp, "wb") as out:
+                shutil.copyfileobj(src, out, COPY_BUFFER)
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def local_path(path: str) -> str:
+    """Absolute local file holding path's bytes.
+
+    S3 objects are downloaded (in parallel parts when large) on first use.
+    A missing or unreachable object yields a path that doesn't exist,
+    the same as a missing local file.
+    """
+    if not is_remote(path):
+        return path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+    target = os.path.abspath(_cache_path(path))
+    if os.path.exists(target):
+        return target
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        bucket, key = _split(path)
+        _s3().download_file(bucket, key, tmp, Config=_transfer())
+        os.replace(tmp, target)
+    except Exception:
+        logger.warning("could not fetch %s", path, exc_info=True)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return target
+
+
+def save(kind: str, ext: str, src: Source) -> Tuple[str, str]:
+    """Store a new original of the given ImageType value with STORAGE_BACKEND; returns (key, path)."""
+    key = sharded_key(kind, f"{uuid4().hex}{ext}")
+    if STORAGE_BACKEND != "s3":
+        path = key_path(key)
+        _write(src, local_path(path))
+        return key, path
+    path = f"{S3_SCHEME}{S3_BUCKET}/{S3_PREFIX}{key}"
+    # Stage in the cache first: ingest analysis decodes the file right away
+    staged = _cache_path(path)
+    _write(src, staged)
+    try:
+        _s3().upload_file(staged, S3_BUCKET, f"{S3_PREFIX}{key}", Config=_transfer())
+    except Exception:
+        os.remove(staged)
+        raise
+    return key, path
+
+
+def delete(path: str) -> bool:
+    """Remove a stored original (and its cached copy); False if it wasn't there."""
+    if not is_remote(path):
+        target = local_path(path)
+        if not os.path.exists(target):
+            return False
+        os.remove(target)
+        return True
+    bucket, key = _split(path)
+    cached = _cache_path(path)
+    if os.path.exists(cached):
+        os.remove(cached)
+    _s3().delete_object(Bucket=bucket, Key=key)
+    return True
+
+
+def download_url(path: str, filename: str, inline: bool = False) -> Optional[str]:
+    """Presigned GET URL for an S3 original, so the bytes never pass through the API; None for local files."""
+    if not is_remote(path):
+        return None
+    bucket, key = _split(path)
+    disposition = "inline" if inline else f'attachment; filename="{filename}"'
+    return _s3().generate_presigned_url(
+        "get_object",
+        Params={"Bucket": bucket, "Key": key, "ResponseContentDisposition": disposition},
+        ExpiresIn=S3_PRESIGN_SECONDS,
+    )
+
+
+def list_remote(prefix: str) -> Iterator[Tuple[str, int, float]]:
+    """(path, size, mtime) of every object under S3_PREFIX + prefix in S3_BUCKET."""
+    paginator = _s3().get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=f"{S3_PREFIX}{prefix}"):
+        for obj in page.get("Contents", []):
+            yield f"{S3_SCHEME}{S3_BUCKET}/{obj['Key']}", obj["Size"], obj["LastModified"].timestamp()
+
+
+def delete_remote(paths: Iterable[str]) -> Tuple[List[str], Dict[str, str]]:
+    """Delete S3 objects in batches of 1000 (one request each).
+
+    Returns the paths deleted and, per path that wasn't, the error.
+    """
+    by_bucket: Dict[str, List[str]] = {}
+    for path in paths:
+        bucket, key = _split(path)
+        by_bucket.setdefault(bucket, []).append(key)
+    deleted: List[str] = []
+    failed: Dict[str, str] = {}
+    for bucket, keys in by_bucket.items():
+        for start in range(0, len(keys), 1000):
+            batch = keys[start:start + 1000]
+            result = _s3().delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True})
+            # Quiet mode lists only the failures
+            errors = {e["Key"]: f"{e.get('Code', '')} {e.get('Message', '')}".strip() for e in result.get("Errors", [])}
+            for key in batch:
+                path = f"{S3_SCHEME}{bucket}/{key}"
+                if key in errors:
+                    failed[path] = errors[key]
+                else:
+                    deleted.append(path)
+    return deleted, failed
@@ -0,0 +1,117 @@
+"""Move uploads from the flat layout into the hashed fan-out.
+
+Walks image_assets in id order over rows whose storage key is missing or
+not yet sharded, renames each file to its key under ``uploads/<kind>/ab/cd/``
+and rewrites ``path`` and ``storage_key`` of every row sharing the file
+(frames cut from a sheet share its path). Each batch is committed with the
+job checkpoint:
+
+    python -m app.storage_migrate --batch-size 500
+    python -m app.storage_migrate --dry-run
+
+Target names are derived from the old ones, so a run interrupted between a
+rename and its commit finds the file already in place and just updates the
+rows. Files outside the static root are left where they are. Requests for
+a file can miss while its batch is in flight; run it in a quiet period.
+"""
+import argparse
+import os
+import shutil
+import sys
+from typing import List, Optional
+
+from sqlalchemy import or_, update
+
+from .db import SessionLocal
+from .jobs import Progress, get_checkpoint, reset_checkpoint, save_checkpoint
+from .models import ImageAsset
+from .services import storage
+
+JOB_NAME = "storage_migrate"
+
+
+def pending_filter():
+    key = ImageAsset.storage_key
+    # LIKE's "_" matches any one character: uploads/<kind>/xx/yy/<name>
+    return or_(key.is_(None), ~key.like("uploads/%/__/__/%"))
+
+
+def move(path: str, kind: str, dry_run: bool = False) -> Optional[str]:
+    """Sharded key for the file at path, moving it there; None if outside the static root or missing."""
+    key = storage.key_for_path(path)
+    if key is None:
+        return None
+    if storage.is_sharded(key):
+        return key
+    target = storage.sharded_key(kind, key.rsplit("/", 1)[-1], salt=key)
+    src, dst = storage.local_path(path), storage.local_path(storage.key_path(target))
+    if os.path.exists(src):
+        if not dry_run:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            # A rename on one filesystem; copies across mounts
+            shutil.move(src, dst)
+    elif not os.path.exists(dst):
+        return None
+    return target
+
+
+def run(batch_size: int = 500, restart: bool = False, dry_run: bool = False, limit: Optional[int] = None) -> int:
+    db = SessionLocal()
+    try:
+        if restart:
+            reset_checkpoint(db, JOB_NAME)
+        after = get_checkpoint(db, JOB_NAME)
+        # Frames follow their sheet's file
+        pending = db.query(ImageAsset.id, ImageAsset.path, ImageAsset.type).filter(
+            pending_filter(), ImageAsset.parent_id.is_(None)
+        )
+        total = pending.filter(ImageAsset.id > after).count()
+        if limit is not None:
+            total = min(total, limit)
+        print(f"{total} images to move after id {after}{' (dry run)' if dry_run else ''}")
+        progress = Progress(total)
+        skipped = 0
+        while progress.done < total:
+            n = min(batch_size, total - progress.done)
+            rows = pending.filter(ImageAsset.id > after).order_by(ImageAsset.id).limit(n).all()
+            if not rows:
+                break
+            for row in rows:
+                key = move(row.path, row.type.value, dry_run)
+                if key is None:
+                    skipped += 1
+                    continue
+                if not dry_run:
+                    db.execute(
+                        update(ImageAsset)
+                        .where(ImageAsset.path == row.path)
+                        .values(path=storage.key_path(key), storage_key=key)
+                    )
+            after = rows[-1][0]
+            if not dry_run:
+                save_checkpoint(db, JOB_NAME, after)
+                db.commit()
+            progress.advance(len(rows))
+            print(f"{progress.line()}  skipped {skipped}  checkpoint {after}")
+        print(f"done: {progress.done} images, {skipped} missing or outside {storage.STATIC_ROOT}/")
+        return 0
+    finally:
+        db.close()
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.storage_migrate")
+    parser.add_argument("--batch-size", type=int, default=500, help="images per commit")
+    parser.add_argument("--restart", action="store_true", help="ignore the saved checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="report without moving files")
+    parser.add_argument("--limit", type=int, help="stop after this many images")
+    args = parser.parse_args(argv)
+    try:
+        return run(args.batch_size, args.restart, args.dry_run, args.limit)
+    except KeyboardInterrupt:
+        print("interrupted; rerun to resume from the last checkpoint", file=sys.stderr)
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,231 @@
+"""Find stored files no row references, and rows whose file is gone.
+
+Lists the upload trees (and the S3 bucket when S3_BUCKET is set) in
+parallel, streams every ``ImageAsset.path`` and catalog ``image_path``
+from the database in one pass, and diffs the two sets:
+
+    python -m app.storage_scan                      # report only
+    python -m app.storage_scan --report scan.json   # full lists as JSON
+    python -m app.storage_scan --delete             # reclaim orphans
+
+Files newer than ``--min-age`` minutes are never counted as orphans: an
+upload's file is written before its row is committed.
+
+Some trees are deliberately left out of the orphan listing:
+
+- ``static/catalog``: it ships bundled images no row has to reference,
+  and uploaded catalog images keep their original names, so the two
+  can't be told apart. Referenced catalog paths are still checked for
+  missing files.
+- ``uploads/faces`` and ``uploads/derived``: face crops and rendered
+  positives are caches, rebuilt on demand and keyed by their source
+  rather than referenced by a path column. So is STORAGE_CACHE_DIR,
+  which sits outside the static root anyway.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+from .models import Camera, FilmStock, ImageAsset, Lens
+from .services import storage
+
+# Trees holding originals, relative to the static root; see the module docstring for what's skipped
+ROOTS = [f"{storage.UPLOAD_PREFIX}/{d}" for d in storage.KIND_DIRS.values()]
+YIELD_ROWS = 20000
+# Paths per stat / unlink task
+CHUNK = 2000
+# (size, mtime) per listed file
+Listing = Dict[str, Tuple[int, float]]
+
+
+def identity(path: str) -> str:
+    """One spelling per stored file: s3:// paths as is, local paths absolute and normalized."""
+    if storage.is_remote(path):
+        return path
+    if path.startswith(f"/{storage.STATIC_ROOT}/") and not os.path.exists(path):
+        # Catalog paths are sometimes stored as their URL
+        path = path[1:]
+    path = storage.local_path(path)
+    # Stored paths are almost always clean; normalizing every one would dominate the scan
+    return os.path.normpath(path) if "/." in path or "//" in path else path
+
+
+def _walk(top: str) -> List[str]:
+    found: List[str] = []
+    stack = [top]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    found.append(entry.path)
+    return found
+
+
+def list_local(pool: ThreadPoolExecutor) -> Set[str]:
+    """Every file under ROOTS; each shard directory is walked as its own task."""
+    files: Set[str] = set()
+    tops: List[str] = []
+    for root in ROOTS:
+        base = identity(storage.key_path(root))
+        try:
+            entries = list(os.scandir(base))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                tops.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                files.add(entry.path)
+    for found in pool.map(_walk, tops):
+        files.update(found)
+    return files
+
+
+def list_bucket(pool: ThreadPoolExecutor) -> Listing:
+    """Every object under the bucket's upload prefixes, listed 16 key ranges per kind at a time."""
+    prefixes = [f"{storage.UPLOAD_PREFIX}/{d}/{h}" for d in storage.KIND_DIRS.values() for h in "0123456789abcdef"]
+    objects: Listing = {}
+    for listed in pool.map(lambda p: list(storage.list_remote(p)), prefixes):
+        objects.update((path, (size, mtime)) for path, size, mtime in listed)
+    return objects
+
+
+def referenced(db: Session) -> Set[str]:
+    """Identities of every file a row points at, streamed in one pass per table."""
+    refs: Set[str] = set()
+    for (path,) in db.execute(select(ImageAsset.path).execution_options(yield_per=YIELD_ROWS)):
+        refs.add(identity(path))
+    for model in (Camera, Lens, FilmStock):
+        for (path,) in db.execute(select(model.image_path).where(model.image_path.isnot(None))):
+            refs.add(identity(path))
+    return refs
+
+
+def rows_for(db: Session, missing: Set[str]) -> Dict[str, List[int]]:
+    """ImageAsset ids per missing file, from a second streaming pass."""
+    found: Dict[str, List[int]] = {}
+    stmt = select(ImageAsset.id, ImageAsset.path).execution_options(yield_per=YIELD_ROWS)
+    for image_id, path in db.execute(stmt):
+        key = identity(path)
+        if key in missing:
+            found.setdefault(key, []).append(image_id)
+    return found
+
+
+def _stat(path: str) -> Optional[Tuple[int, float]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _each(pool: ThreadPoolExecutor, fn, items: List[str]) -> list:
+    """[fn(x) for x in items], run in CHUNK-sized tasks on pool."""
+    chunks = [items[i:i + CHUNK] for i in range(0, len(items), CHUNK)]
+    return [r for done in pool.map(lambda chunk: [fn(x) for x in chunk], chunks) for r in done]
+
+
+def _gb(n: int) -> str:
+    return f"{n / 1e9:.2f} GB"
+
+
+def scan(workers: int = 8, min_age: float = 60.0, delete: bool = False, report: Optional[str] = None) -> int:
+    started = time.monotonic()
+    status = 0
+    cutoff = time.time() - min_age * 60
+    db = SessionLocal()
+    try:
+        # The listers fan out onto pool; the database pass runs meanwhile
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool, ThreadPoolExecutor(max_workers=2) as listers:
+            listing = listers.submit(list_local, pool)
+            bucket = listers.submit(list_bucket, pool) if storage.S3_BUCKET else None
+            refs = referenced(db)
+            files = listing.result()
+            objects = bucket.result() if bucket else {}
+            print(f"listed {len(files)} files, {len(objects)} objects; {len(refs)} referenced paths")
+
+            # Orphans: listed, unreferenced and old enough
+            unreferenced = list(files - refs)
+            orphans: Listing = {p: s for p, s in zip(unreferenced, _each(pool, _stat, unreferenced)) if s is not None}
+            orphans.update((p, objects[p]) for p in objects.keys() - refs)
+            recent = {p for p, (_, mtime) in orphans.items() if mtime > cutoff}
+            for p in recent:
+                del orphans[p]
+
+            # Missing: referenced under a scanned tree (or bucket) but not listed
+            local_roots = tuple(identity(storage.key_path(r)) + os.sep for r in ROOTS)
+            bucket_root = f"{storage.S3_SCHEME}{storage.S3_BUCKET}/{storage.S3_PREFIX}{storage.UPLOAD_PREFIX}/"
+            missing = {p for p in refs if p.startswith(local_roots) and p not in files}
+            if storage.S3_BUCKET:
+                missing.update(p for p in refs if p.startswith(bucket_root) and p not in objects)
+            # Rows pointing elsewhere on disk: checked one by one, there are few
+            outside = [p for p in refs if not storage.is_remote(p) and not p.startswith(local_roots)]
+            missing.update(p for p, ok in zip(outside, _each(pool, os.path.exists, outside)) if not ok)
+            missing_rows = rows_for(db, missing) if missing else {}
+
+            orphan_bytes = sum(size for size, _ in orphans.values())
+            print(f"orphans: {len(orphans)} ({_gb(orphan_bytes)}); {len(recent)} newer than {min_age:g} min skipped")
+            print(f"missing: {len(missing)} files, {sum(len(ids) for ids in missing_rows.values())} image rows")
+
+            if report:
+                with open(report, "w") as fh:
+                    json.dump({
+                        "orphans": [{"path": p, "size": s, "mtime": m} for p, (s, m) in sorted(orphans.items())],
+                        "missing": [{"path": p, "image_ids": missing_rows.get(p, [])} for p in sorted(missing)],
+                    }, fh, indent=1)
+                print(f"report written to {report}")
+
+            if delete and orphans:
+                local = [p for p in orphans if not storage.is_remote(p)]
+                gone = [p for p, ok in zip(local, _each(pool, _remove, local)) if ok]
+                remote = [p for p in orphans if storage.is_remote(p)]
+                removed, failed = storage.delete_remote(remote) if remote else ([], {})
+                gone += removed
+                freed = sum(orphans[p][0] for p in gone)
+                print(f"deleted {len(gone)} orphans, {_gb(freed)} reclaimed")
+                if failed:
+                    status = 1
+                    print(f"{len(failed)} objects could not be deleted:", file=sys.stderr)
+                    for p, error in sorted(failed.items()):
+                        print(f"  {p}: {error}", file=sys.stderr)
+        print(f"done in {time.monotonic() - started:.1f}s")
+        return status
+    finally:
+        db.close()
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.storage_scan")
+    parser.add_argument("--workers", type=int, default=8, help="parallel directory walks / listings")
+    parser.add_argument("--min-age", type=float, default=60.0, help="minutes before an unreferenced file counts as orphaned")
+    parser.add_argument("--delete", action="store_true", help="remove orphaned files")
+    parser.add_argument("--report", help="write the full orphan and missing lists to this JSON file")
+    args = parser.parse_args(argv)
+    return scan(args.workers, args.min_age, args.delete, args.report)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,237 @@
+"""Benchmark runner for the JSON API and image pipeline.
+
+Seeds a synthetic archive into a scratch working directory, drives the app
+in-process through FastAPI's TestClient (requires httpx) and writes
+p50/p99 latency and throughput per case as JSON:
+
+    python -m bench.run --films 50 --scans 36 --width 3000 --height 2000 --bit-depth 16 --out base.json
+    python -m bench.run --compare base.json new.json
+
+DATABASE_URL (or --database-url) selects SQLite or Postgres; by default a
+fresh SQLite file in the working directory is used. Point Postgres runs at
+a scratch database: the seed only appends rows.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import zipfile
+from datetime import datetime
+from statistics import mean
+from time import perf_counter
+from typing import Callable, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def measure(fn: Callable[[], None], iterations: int, warmup: int) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    started = perf_counter()
+    for _ in range(iterations):
+        t0 = perf_counter()
+        fn()
+        samples.append(perf_counter() - t0)
+    total = perf_counter() - started
+    return {
+        "iterations": iterations,
+        "mean_ms": mean(samples) * 1000.0,
+        "p50_ms": percentile(samples, 50) * 1000.0,
+        "p99_ms": percentile(samples, 99) * 1000.0,
+        "min_ms": min(samples) * 1000.0,
+        "max_ms": max(samples) * 1000.0,
+        "throughput_rps": iterations / total if total > 0 else 0.0,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def build_cases(client, db, seeded: Dict[str, object], args) -> Dict[str, Callable[[], None]]:
+    from app.models import Face
+    from app.services.face import assign_person
+
+    film_id = seeded["film_ids"][0]
+    image_id = seeded["image_ids"][0]
+
+    def get(url: str) -> Callable[[], None]:
+        def call():
+            r = client.get(url)
+            assert r.status_code == 200, (url, r.status_code)
+        return call
+
+    def post(url: str, **kwargs) -> Callable[[], None]:
+        def call():
+            r = client.post(url, **kwargs)
+            assert r.status_code == 200 and "error" not in r.json(), (url, r.text[:200])
+        return call
+
+    upload_files = []
+    for rel_path in seeded["files"][: args.bulk_files]:
+        with open(rel_path, "rb") as fh:
+            upload_files.append((os.path.basename(rel_path), fh.read()))
+    zip_buf = io.BytesIO()
+    with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_STORED) as zf:
+        for name, data in upload_files:
+            zf.writestr(name, data)
+    zip_bytes = zip_buf.getvalue()
+
+    unlabeled = db.query(Face).filter(Face.person_id.is_(None), Face.embedding.isnot(None)).first()
+
+    def assign():
+        assign_person(db, unlabeled)
+        db.rollback()
+
+    cases: Dict[str, Callable[[], None]] = {
+        "list_films": get("/api/films"),
+        "list_images": get("/api/images"),
+        "list_images_by_film": get(f"/api/images?film_id={film_id}&type=scan"),
+        "get_film": get(f"/api/films/{film_id}"),
+        "get_image_preview": get(f"/api/images/{image_id}/preview?width={args.preview_width}"),
+        "create_contact_sheet": post(f"/api/films/{film_id}/contact_sheet"),
+        "bulk_upload_images": post(
+            f"/api/films/{film_id}/images/bulk",
+            files=[("files", (name, data)) for name, data in upload_files],
+        ),
+        "bulk_upload_zip": post(
+            f"/api/films/{film_id}/images/bulk_zip",
+            files={"file": ("roll.zip", zip_bytes, "application/zip")},
+        ),
+    }
+    if unlabeled is not None:
+        cases["assign_person"] = assign
+    return cases
+
+
+def run(args) -> Dict[str, object]:
+    workdir = args.workdir or tempfile.mkdtemp(prefix="negarchive-bench-")
+    os.makedirs(os.path.join(workdir, "static"), exist_ok=True)
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ.setdefault("DEEPFACE_ENABLED", "false")
+    # The app resolves static/ and upload paths against the working directory
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+
+    from fastapi.testclient import TestClient
+    from app import migrations
+    from app.db import SessionLocal, engine
+    from app.main import app
+    from bench.seed import seed_archive
+
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        t0 = perf_counter()
+        seeded = seed_archive(
+            db,
+            workdir,
+            films=args.films,
+            scans_per_film=args.scans,
+            width=args.width,
+            height=args.height,
+            bit_depth=args.bit_depth,
+            faces=args.faces,
+            persons=args.persons,
+            unique_files=args.unique_files,
+            seed=args.seed,
+        )
+        seed_s = perf_counter() - t0
+        results: Dict[str, Dict[str, float]] = {}
+        with TestClient(app) as client:
+            cases = build_cases(client, db, seeded, args)
+            selected = args.only or list(cases)
+            for name in selected:
+                heavy = name in {"create_contact_sheet", "bulk_upload_images", "bulk_upload_zip"}
+                iterations = args.heavy_iterations if heavy else args.iterations
+                results[name] = measure(cases[name], iterations, args.warmup)
+                r = results[name]
+                print(f"{name:24s} p50 {r['p50_ms']:9.2f} ms  p99 {r['p99_ms']:9.2f} ms  {r['throughput_rps']:8.1f} req/s")
+    finally:
+        db.close()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "database": engine.dialect.name,
+            "seed_seconds": seed_s,
+            "params": {k: v for k, v in vars(args).items() if k not in {"out", "compare", "database_url"}},
+        },
+        "results": results,
+    }
+
+
+def compare(base_path: str, new_path: str) -> int:
+    with open(base_path) as fh:
+        base = json.load(fh)
+    with open(new_path) as fh:
+        new = json.load(fh)
+    print(f"base {base['meta'].get('commit')}  new {new['meta'].get('commit')}")
+    for name, b in base["results"].items():
+        n = new["results"].get(name)
+        if not n:
+            continue
+        ratio = n["p50_ms"] / b["p50_ms"] if b["p50_ms"] else float("inf")
+        print(
+            f"{name:24s} p50 {b['p50_ms']:9.2f} -> {n['p50_ms']:9.2f} ms ({ratio:5.2f}x)  "
+            f"p99 {b['p99_ms']:9.2f} -> {n['p99_ms']:9.2f} ms"
+        )
+    return 0
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.run")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files")
+    parser.add_argument("--database-url")
+    parser.add_argument("--workdir", help="scratch directory for the database and scan files")
+    parser.add_argument("--films", type=int, default=50)
+    parser.add_argument("--scans", type=int, default=36, help="scans per film")
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2000)
+    parser.add_argument("--bit-depth", type=int, choices=(8, 16), default=8)
+    parser.add_argument("--faces", type=int, default=2000)
+    parser.add_argument("--persons", type=int, default=50)
+    parser.add_argument("--unique-files", type=int, default=8, help="distinct scan files on disk")
+    parser.add_argument("--bulk-files", type=int, default=4, help="files per bulk upload request")
+    parser.add_argument("--preview-width", type=int, default=1200)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--heavy-iterations", type=int, default=5, help="for contact sheets and uploads")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="*", help="run only these cases")
+    parser.add_argument("--out", default="bench_results.json")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+    out_path = os.path.abspath(args.out)
+    report = run(args)
+    with open(out_path, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"wrote {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,96 @@
+"""Synthetic archive generator for benchmarks.
+
+Writes a small pool of scan files (reused round-robin across rows so the
+disk footprint stays bounded) and bulk-inserts films, scans, persons and
+faces with random unit-length embeddings.
+"""
+import os
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image as PILImage
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.models import Face, FilmRoll, ImageAsset, ImageType, Person
+from app.services.face import rebuild_prototypes
+
+EMBEDDING_DIM = 512
+
+
+def make_scan(path: str, width: int, height: int, bit_depth: int, rng: np.random.Generator) -> None:
+    """Write a noisy gradient RGB scan; 16-bit goes through OpenCV as TIFF."""
+    ramp = np.linspace(0.0, 1.0, width, dtype=np.float32)[None, :, None]
+    noise = rng.random((height, width, 3), dtype=np.float32) * 0.2
+    img = np.clip(ramp * 0.8 + noise, 0.0, 1.0)
+    if bit_depth == 16:
+        import cv2
+        cv2.imwrite(path, (img * 65535.0).astype(np.uint16))
+    else:
+        PILImage.fromarray((img * 255.0).astype(np.uint8), "RGB").save(path)
+
+
+def seed_archive(
+    db: Session,
+    root: str,
+    films: int = 50,
+    scans_per_film: int = 36,
+    width: int = 3000,
+    height: int = 2000,
+    bit_depth: int = 8,
+    faces: int = 2000,
+    persons: int = 50,
+    unique_files: int = 8,
+    seed: int = 0,
+) -> Dict[str, object]:
+    """Seed the database behind ``db``; scan files go under ``root``/static/uploads/scans."""
+    rng = np.random.default_rng(seed)
+    scan_dir = os.path.join("static", "uploads", "scans")
+    os.makedirs(os.path.join(root, scan_dir), exist_ok=True)
+    ext = ".tif" if bit_depth == 16 else ".jpg"
+    files: List[str] = []
+    for n in range(unique_files):
+        rel_path = os.path.join(scan_dir, f"bench-{width}x{height}-{bit_depth}-{n}{ext}")
+        make_scan(os.path.join(root, rel_path), width, height, bit_depth, rng)
+        files.append(rel_path)
+
+    now = datetime.utcnow()
+    conn = db.connection()
+    conn.execute(insert(FilmRoll.__table__), [{"title": f"Bench roll {n}", "created_at": now} for n in range(films)])
+    film_ids = conn.execute(select(FilmRoll.id).order_by(FilmRoll.id.desc()).limit(films)).scalars().all()
+    rows = []
+    for film_id in reversed(film_ids):
+        for frame in range(1, scans_per_film + 1):
+            rows.append({
+                "film_roll_id": film_id,
+                "type": ImageType.scan,
+                "path": files[len(rows) % len(files)],
+                "frame_number": frame,
+                "created_at": now,
+            })
+    if rows:
+        conn.execute(insert(ImageAsset.__table__), rows)
+    image_ids = conn.execute(select(ImageAsset.id).where(ImageAsset.film_roll_id.in_(film_ids))).scalars().all()
+
+    conn.execute(insert(Person.__table__), [
+        {"name": f"bench-person-{seed}-{n}", "created_at": now} for n in range(persons)
+    ])
+    person_ids = conn.execute(select(Person.id).order_by(Person.id.desc()).limit(persons)).scalars().all()
+    face_rows = []
+    for n in range(faces if image_ids else 0):
+        v = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+        v /= np.linalg.norm(v)
+        face_rows.append({
+            "image_id": int(image_ids[n % len(image_ids)]),
+            "bbox_x": 10, "bbox_y": 10, "bbox_w": 120, "bbox_h": 120,
+            "embedding": {"model": "arcface", "v": v.round(5).tolist()},
+            # Label roughly half the faces so prototypes exist
+            "person_id": int(person_ids[n % len(person_ids)]) if person_ids and n % 2 == 0 else None,
+            "created_at": now,
+        })
+    if face_rows:
+        conn.execute(insert(Face.__table__), face_rows)
+    rebuild_prototypes(db, person_ids)
+    db.commit()
+    return {"film_ids": list(film_ids), "image_ids": list(image_ids), "files": files}
@@ -0,0 +1,155 @@
+"""Old vs new serialization of large list responses.
+
+Seeds films and image rows (no files) into a scratch SQLite database and
+times each listing both ways on the same rows, without HTTP around it:
+
+- ``orm``: whole ORM objects, dict builders calling isoformat(), then
+  ``jsonable_encoder`` and Starlette's JSONResponse, as the list
+  endpoints did before the column selects;
+- ``columns``: the endpoints' column selects, the current dict builders
+  and ``ORJSONResponse``.
+
+    python -m bench.serialization --images 50000 --films 1500
+
+Both paths must produce the same JSON document; the run fails otherwise.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+from bench.run import REPO_ROOT, measure
+
+
+def legacy_film_to_dict(f) -> dict:
+    return {
+        "id": f.id,
+        "title": f.title,
+        "camera": f.camera,
+        "lens": f.lens,
+        "film_type": f.film_type,
+        "notes": f.notes,
+        "building": f.building,
+        "folder": f.folder,
+        "archive_serial": f.archive_serial,
+        "start_date": f.start_date.isoformat() if f.start_date else None,
+        "end_date": f.end_date.isoformat() if f.end_date else None,
+        "created_at": f.created_at.isoformat(),
+        "scan_count": f.scan_count,
+        "contact_sheet_count": f.contact_sheet_count,
+        "cover_image_id": f.cover_image_id,
+        "face_count": f.face_count,
+        "last_modified": f.last_modified.isoformat() if f.last_modified else None,
+        "cover_url": f"/api/images/{f.cover_image_id}/preview?width=400" if f.cover_image_id else None,
+    }
+
+
+def legacy_image_to_dict(i) -> dict:
+    from app.routers.api import image_to_dict
+
+    d = image_to_dict(i)
+    d["capture_date"] = i.capture_date.isoformat() if i.capture_date else None
+    d["created_at"] = i.created_at.isoformat()
+    return d
+
+
+def seed(engine, films: int, images: int) -> None:
+    from sqlalchemy import insert, select
+
+    from app.models import FilmRoll, ImageAsset, ImageType
+
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(FilmRoll.__table__), [{
+            "title": f"Roll {n}",
+            "camera": "Nikon F3",
+            "lens": "50mm f/1.4",
+            "film_type": "Portra 400",
+            "notes": "Überbelichtet, +1 push" if n % 3 == 0 else None,
+            "start_date": date(2020, 1, 1) + timedelta(days=n % 900),
+            "created_at": now - timedelta(seconds=n),
+        } for n in range(films)])
+        film_ids = conn.execute(select(FilmRoll.id)).scalars().all()
+        conn.execute(insert(ImageAsset.__table__), [{
+            "film_roll_id": film_ids[n % len(film_ids)],
+            "type": ImageType.contact_sheet if n % 37 == 0 else ImageType.scan,
+            "path": f"static/uploads/scans/{n:02x}/{n:032x}.tif",
+            "storage_key": f"uploads/scans/{n:02x}/{n:032x}.tif",
+            "frame_number": n % 36 + 1,
+            "capture_date": date(2021, 6, 1) if n % 2 else None,
+            "width": 6000, "height": 4000, "bit_depth": 16, "channels": 3, "format": "TIFF",
+            "byte_size": 144_000_000, "dpi": 4000, "scanner": "Nikon SUPER COOLSCAN 5000 ED", "has_icc": False,
+            "created_at": now,
+        } for n in range(images)])
+
+
+def run(args) -> Dict[str, Dict[str, float]]:
+    workdir = args.workdir or tempfile.mkdtemp(prefix="negarchive-serial-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'serial.db')}"
+    os.environ.setdefault("DEEPFACE_ENABLED", "false")
+    sys.path.insert(0, REPO_ROOT)
+
+    from fastapi.encoders import jsonable_encoder
+    from sqlalchemy import select
+    from sqlalchemy.orm import Session
+    from starlette.responses import JSONResponse
+
+    from app import migrations
+    from app.db import engine
+    from app.models import FilmRoll, ImageAsset
+    from app.routers.api import FILM_COLUMNS, IMAGE_COLUMNS, film_row_to_dict, image_row_to_dict
+    from app.serialization import ORJSONResponse, orjson
+
+    migrations.upgrade(engine)
+    seed(engine, args.films, args.images)
+    print(f"{args.films} films, {args.images} images; encoder {'orjson' if orjson else 'json (orjson missing)'}")
+
+    listings = {
+        "films": (FilmRoll, FILM_COLUMNS, legacy_film_to_dict, film_row_to_dict, FilmRoll.created_at.desc()),
+        "images": (ImageAsset, IMAGE_COLUMNS, legacy_image_to_dict, image_row_to_dict, ImageAsset.id.asc()),
+    }
+    results: Dict[str, Dict[str, float]] = {}
+    for name, (model, columns, old_dict, new_dict, order) in listings.items():
+        # A new session per call so no identity map carries over between iterations
+        def orm() -> bytes:
+            with Session(engine) as db:
+                rows = db.scalars(select(model).order_by(order))
+                return JSONResponse(jsonable_encoder([old_dict(r) for r in rows])).body
+
+        def cols() -> bytes:
+            with Session(engine) as db:
+                rows = db.connection().execute(select(*columns).order_by(order))
+                return ORJSONResponse([new_dict(r) for r in rows]).body
+
+        old_body, new_body = orm(), cols()
+        if json.loads(old_body) != json.loads(new_body):
+            raise SystemExit(f"{name}: the two paths produced different documents")
+        for path, fn in (("orm", orm), ("columns", cols)):
+            r = results[f"{name}_{path}"] = measure(fn, args.iterations, args.warmup)
+            print(f"{name:7s} {path:8s} p50 {r['p50_ms']:9.2f} ms  p99 {r['p99_ms']:9.2f} ms  {len(old_body) / 1e6:.1f} MB")
+        old, new = results[f"{name}_orm"]["p50_ms"], results[f"{name}_columns"]["p50_ms"]
+        print(f"{name:7s} speedup {old / new:.2f}x")
+    return results
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.serialization")
+    parser.add_argument("--workdir", help="scratch directory for the database")
+    parser.add_argument("--films", type=int, default=1500)
+    parser.add_argument("--images", type=int, default=50000)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args(argv)
+    results = run(args)
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(results, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -7,9 +7,17 @@ import { Card, CardContent } from "@/components/ui/card"
 import { Label } from "@/components/ui/label"
 import { Input } from "@/components/ui/input"
 import { useToast } from "@/hooks/use-toast"
-import { bulkUploadImages, bulkUploadZip, createContactSheet, uploadImage } from "@/lib/api"
+import { bulkUploadImages, bulkUploadZip, createContactSheet, newJobId, uploadImage, watchJob } from "@/lib/api"
+import type { JobEvent } from "@/lib/api"
 import { Loader2, Upload, FileArchive, Images } from "lucide-react"
 
+function describeProgress(e: JobEvent): string {
+  if (e.state === "started" || !e.total) return "Starting…"
+  const eta = e.eta !== null && e.state === "progress" ? ` · ${Math.ceil(e.eta)}s left` : ""
+  const failed = e.failed ? ` · ${e.failed} failed` : ""
+  return `${e.done}/${e.total} ${e.unit} · ${e.rate.toFixed(1)}/s${eta}${failed}`
+}
+
 interface FilmDumpActionsProps {
   filmId: number
 }
@@ -21,11 +29,18 @@ export function FilmDumpActions({ filmId }: FilmDumpActionsProps) {
   const [loadingContactUpload, setLoadingContactUpload] = useState(false)
   const [loadingBulk, setLoadingBulk] = useState(false)
   const [loadingZip, setLoadingZip] = useState(false)
+  const [progress, setProgress] = useState<string | null>(null)
+
+  // Live progress from the server while a long request runs under jobId
+  const track = (jobId: string) => watchJob(jobId, (e) => setProgress(describeProgress(e)))
 
   const handleCreateContactSheet = async () => {
+    let stop = () => {}
     try {
       setLoadingContact(true)
-      const res = await createContactSheet(filmId, { columns: 6, thumb_size: 300 })
+      const jobId = newJobId()
+      stop = track(jobId)
+      const res = await createContactSheet(filmId, { columns: 6, thumb_size: 300, jobId })
       if ((res as any).error) {
         toast({ title: "Contact sheet failed", description: (res as any).error, variant: "destructive" })
         return
@@ -37,6 +52,8 @@ export function FilmDumpActions({ filmId }: FilmDumpActionsProps) {
     } catch (e) {
       toast({ title: "Contact sheet failed", description: String(e), variant: "destructive" })
     } finally {
+      stop()
+      setProgress(null)
       setLoadingContact(false)
     }
   }
@@ -44,9 +61,12 @@ export function FilmDumpActions({ filmId }: FilmDumpActionsProps) {
   const handleBulkFilesChange = async (e: React.ChangeEvent<HTMLInputElement>) => {
     const files = e.target.files ? Array.from(e.target.files) : []
     if (files.length === 0) return
+    let stop = () => {}
     try {
       setLoadingBulk(true)
-      const res = await bulkUploadImages(filmId, files)
+      const jobId = newJobId()
+      stop = track(jobId)
+      const res = await bulkUploadImages(filmId, files, jobId)
       if ("error" in res) {
         toast({ title: "Bulk upload failed", description: res.error, variant: "destructive" })
         return
@@ -57,6 +77,8 @@ export function FilmDumpActions({ filmId }: FilmDumpActionsProps) {
     } catch (e) {
       toast({ title: "Bulk upload failed", description: String(e), variant: "destructive" })
     } finally {
+      stop()
+      setProgress(null)
       setLoadingBulk(false)
       e.target.value = ""
     }
@@ -65,9 +87,12 @@ export function FilmDumpActions({ filmId }: FilmDumpActionsProps) {
   const handleZipChange = async (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0]
     if (!file) return
+    let stop = () => {}
     try {
       setLoadingZip(true)
-      const res = await bulkUploadZip(filmId, file)
+      const jobId = newJobId()
+      stop = track(jobId)
+      const res = await bulkUploadZip(filmId, file, jobId)
       if ("error" in res) {
         toast({ title: "ZIP upload failed", description: res.error, variant: "destructive" })
         return
@@ -78,6 +103,8 @@ export function FilmDumpActions({ filmId }: FilmDumpActionsProps) {
     } catch (e) {
       toast({ title: "ZIP upload failed", description: String(e), variant: "destructive" })
     } finally {
+      stop()
+      setProgress(null)
       setLoadingZip(false)
       e.target.value = ""
     }
@@ -115,6 +142,7 @@ export function FilmDumpActions({ filmId }: FilmDumpActionsProps) {
             {loadingContact ? <Loader2 className="mr-2 h-4 w-4 animate-spin" /> : <Images className="mr-2 h-4 w-4" />}
             Generate Contact Sheet
           </Button>
+          {progress && <span className="text-sm text-muted-foreground tabular-nums">{progress}</span>}
         </div>
 
         <div className="grid gap-4 md:grid-cols-2">
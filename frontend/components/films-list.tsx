@@ -4,6 +4,7 @@ import type { Film } from "@/lib/api"
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "@/components/ui/table"
 import { Button } from "@/components/ui/button"
 import Link from "next/link"
+import Image from "next/image"
 import { Eye, Pencil, Trash2 } from "lucide-react"
 import { useState } from "react"
 import { DeleteConfirmationDialog } from "@/components/delete-confirmation-dialog"
@@ -11,6 +12,8 @@ import { deleteFilm } from "@/lib/api"
 import { useRouter } from "next/navigation"
 import { useToast } from "@/hooks/use-toast"
 
+const API_BASE = process.env.NEXT_PUBLIC_API_BASE || "http://localhost:8010"
+
 interface FilmsListProps {
   films: Film[]
 }
@@ -67,22 +70,40 @@ export function FilmsList({ films }: FilmsListProps) {
         <Table>
           <TableHeader>
             <TableRow>
+              <TableHead className="w-16" />
               <TableHead>Title</TableHead>
               <TableHead>Camera</TableHead>
               <TableHead>Lens</TableHead>
               <TableHead>Film Type</TableHead>
               <TableHead>Date Range</TableHead>
+              <TableHead className="text-right">Scans</TableHead>
+              <TableHead className="text-right">Sheets</TableHead>
+              <TableHead className="text-right">Faces</TableHead>
+              <TableHead>Last Modified</TableHead>
               <TableHead className="text-right">Actions</TableHead>
             </TableRow>
           </TableHeader>
           <TableBody>
             {films.map((film) => (
               <TableRow key={film.id}>
+                <TableCell>
+                  {film.cover_url ? (
+                    <div className="relative h-10 w-14 overflow-hidden rounded bg-muted">
+                      <Image src={`${API_BASE}${film.cover_url}`} alt={film.title} fill className="object-cover" sizes="56px" />
+                    </div>
+                  ) : (
+                    <div className="h-10 w-14 rounded bg-muted" />
+                  )}
+                </TableCell>
                 <TableCell className="font-medium">{film.title}</TableCell>
                 <TableCell>{film.camera || "—"}</TableCell>
                 <TableCell>{film.lens || "—"}</TableCell>
                 <TableCell>{film.film_type || "—"}</TableCell>
                 <TableCell>{formatDateRange(film)}</TableCell>
+                <TableCell className="text-right tabular-nums">{film.scan_count}</TableCell>
+                <TableCell className="text-right tabular-nums">{film.contact_sheet_count}</TableCell>
+                <TableCell className="text-right tabular-nums">{film.face_count}</TableCell>
+                <TableCell>{film.last_modified ? new Date(film.last_modified).toLocaleDateString() : "—"}</TableCell>
                 <TableCell className="text-right">
                   <div className="flex justify-end gap-2">
                     <Button variant="ghost" size="sm" asChild>
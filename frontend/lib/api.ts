@@ -29,6 +29,12 @@ export interface Film {
   start_date: string | null
   end_date: string | null
   created_at: string
+  scan_count: number
+  contact_sheet_count: number
+  cover_image_id: number | null
+  cover_url: string | null
+  face_count: number
+  last_modified: string | null
 }
 
 export interface Image {
@@ -72,17 +78,37 @@ export interface Filmstock {
   url?: string | null
 }
 
+// Last body and ETag per collection URL (on the server, shared across renders).
+// Collections are revalidated with If-None-Match: an unchanged list comes back
+// as an empty 304 and the cached body is reused.
+const etagCache = new Map<string, { etag: string; body: unknown }>()
+const ETAG_CACHE_MAX = 100
+
+async function getCollection<T>(url: string, error: string): Promise<T> {
+  const cached = etagCache.get(url)
+  const res = await fetch(url, {
+    cache: "no-store",
+    headers: cached ? { "If-None-Match": cached.etag } : undefined,
+  })
+  if (res.status === 304 && cached) return cached.body as T
+  if (!res.ok) throw new Error(error)
+  const body = await res.json()
+  const etag = res.headers.get("ETag")
+  etagCache.delete(url)
+  if (etag) {
+    if (etagCache.size >= ETAG_CACHE_MAX) etagCache.delete(etagCache.keys().next().value as string)
+    etagCache.set(url, { etag, body })
+  }
+  return body as T
+}
+
 // Films API
 export async function getFilms(): Promise<Film[]> {
-  const res = await fetch(`${INTERNAL_API_BASE}/api/films`, { cache: "no-store" })
-  if (!res.ok) throw new Error("Failed to fetch films")
-  return res.json()
+  return getCollection<Film[]>(`${INTERNAL_API_BASE}/api/films`, "Failed to fetch films")
 }
 
 export async function getFilm(id: number): Promise<{ film: Film; images: Image[]; contact_sheets?: Image[] }> {
-  const res = await fetch(`${INTERNAL_API_BASE}/api/films/${id}`, { cache: "no-store" })
-  if (!res.ok) throw new Error("Failed to fetch film")
-  return res.json()
+  return getCollection(`${INTERNAL_API_BASE}/api/films/${id}`, "Failed to fetch film")
 }
 
 export async function createFilm(data: Partial<Film>): Promise<Film> {
@@ -120,9 +146,7 @@ export async function getImages(filmId?: number): Promise<Image[]> {
   const url = filmId
     ? `${INTERNAL_API_BASE}/api/images?film_id=${filmId}&type=scan`
     : `${INTERNAL_API_BASE}/api/images?type=scan`
-  const res = await fetch(url, { cache: "no-store" })
-  if (!res.ok) throw new Error("Failed to fetch images")
-  return res.json()
+  return getCollection<Image[]>(url, "Failed to fetch images")
 }
 
 export async function getImage(id: number): Promise<Image> {
@@ -141,14 +165,48 @@ export async function uploadImage(formData: FormData): Promise<Image> {
   return res.json()
 }
 
+// Progress of imports, contact sheets, segmentation and face indexing (GET /api/events)
+export interface JobEvent {
+  id: number
+  job: string
+  kind: "ingest" | "contact_sheet" | "segment" | "faces"
+  state: "started" | "progress" | "done" | "failed"
+  done: number
+  total: number
+  failed: number
+  unit: string
+  rate: number
+  eta: number | null
+  error?: string
+  dropped?: number
+  [field: string]: unknown
+}
+
+export function newJobId(): string {
+  return crypto.randomUUID().replace(/-/g, "")
+}
+
+// Follow one job until it ends; subscribe before starting the work under the same id.
+// Returns a function that stops listening.
+export function watchJob(jobId: string, onEvent: (e: JobEvent) => void): () => void {
+  const source = new EventSource(`${API_BASE_FOR_CLIENT}/api/events?job=${encodeURIComponent(jobId)}`)
+  source.onmessage = (m) => {
+    const e: JobEvent = JSON.parse(m.data)
+    onEvent(e)
+    if (e.state === "done" || e.state === "failed") source.close()
+  }
+  return () => source.close()
+}
+
 // Bulk operations for film roll images
 export async function createContactSheet(
   filmId: number,
-  options?: { columns?: number; thumb_size?: number }
+  options?: { columns?: number; thumb_size?: number; jobId?: string }
 ): Promise<{ ok: boolean; image: Image } | { error: string }> {
   const params = new URLSearchParams()
   if (options?.columns) params.set("columns", String(options.columns))
   if (options?.thumb_size) params.set("thumb_size", String(options.thumb_size))
+  if (options?.jobId) params.set("job_id", options.jobId)
   const res = await fetch(`${INTERNAL_API_BASE}/api/films/${filmId}/contact_sheet?${params.toString()}`, {
     // Use same-origin in browser so rewrite proxies to backend
     // Server-side calls will use INTERNAL base directly
@@ -169,14 +227,16 @@ export async function createContactSheet(
 
 export async function bulkUploadImages(
   filmId: number,
-  files: File[]
+  files: File[],
+  jobId?: string
 ): Promise<{ ok: boolean; images: Image[] } | { error: string }> {
   const formData = new FormData()
   for (const f of files) {
     formData.append("files", f)
   }
   const base = typeof window === "undefined" ? API_BASE_FOR_SERVER : API_BASE_FOR_CLIENT
-  const res = await fetch(`${base}/api/films/${filmId}/images/bulk`, {
+  const query = jobId ? `?job_id=${encodeURIComponent(jobId)}` : ""
+  const res = await fetch(`${base}/api/films/${filmId}/images/bulk${query}`, {
     method: "POST",
     body: formData,
   })
@@ -185,12 +245,14 @@ export async function bulkUploadImages(
 
 export async function bulkUploadZip(
   filmId: number,
-  zipFile: File
+  zipFile: File,
+  jobId?: string
 ): Promise<{ ok: boolean; images: Image[] } | { error: string }> {
   const formData = new FormData()
   formData.append("file", zipFile)
   const base = typeof window === "undefined" ? API_BASE_FOR_SERVER : API_BASE_FOR_CLIENT
-  const res = await fetch(`${base}/api/films/${filmId}/images/bulk_zip`, {
+  const query = jobId ? `?job_id=${encodeURIComponent(jobId)}` : ""
+  const res = await fetch(`${base}/api/films/${filmId}/images/bulk_zip${query}`, {
     method: "POST",
     body: formData,
   })
@@ -208,6 +270,26 @@ export async function updateImage(id: number, data: Partial<Image>): Promise<Ima
   return res.json()
 }
 
+export type ImageEdit = Partial<Pick<Image, "frame_number" | "notes" | "capture_date" | "film_roll_id" | "type">>
+
+// One transaction: explicit per-image edits, or a whole roll (optionally renumbered)
+export async function patchImages(
+  body:
+    | { updates: (ImageEdit & { id: number })[] }
+    | { film_id: number; rule?: "number_by_filename" | "number_by_upload"; start?: number; set?: ImageEdit },
+): Promise<Image[]> {
+  const base = typeof window === "undefined" ? API_BASE_FOR_SERVER : API_BASE_FOR_CLIENT
+  const res = await fetch(`${base}/api/images`, {
+    method: "PATCH",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  })
+  if (!res.ok) throw new Error("Failed to update images")
+  const data = await res.json()
+  if (data.error) throw new Error(`Failed to update images: ${data.error}`)
+  return data.images
+}
+
 export async function deleteImage(id: number, deleteFile = false): Promise<void> {
   const base = typeof window === "undefined" ? API_BASE_FOR_SERVER : API_BASE_FOR_CLIENT
   const res = await fetch(`${base}/api/images/${id}?delete_file=${deleteFile}`, {
@@ -218,9 +300,7 @@ export async function deleteImage(id: number, deleteFile = false): Promise<void>
 
 // Cameras API
 export async function getCameras(): Promise<Camera[]> {
-  const res = await fetch(`${INTERNAL_API_BASE}/api/cameras`, { cache: "no-store" })
-  if (!res.ok) throw new Error("Failed to fetch cameras")
-  return res.json()
+  return getCollection<Camera[]>(`${INTERNAL_API_BASE}/api/cameras`, "Failed to fetch cameras")
 }
 
 export async function getCamera(id: number): Promise<Camera> {
@@ -271,9 +351,7 @@ export async function uploadCameraImage(id: number, file: File): Promise<Camera>
 
 // Lenses API
 export async function getLenses(): Promise<Lens[]> {
-  const res = await fetch(`${INTERNAL_API_BASE}/api/lenses`, { cache: "no-store" })
-  if (!res.ok) throw new Error("Failed to fetch lenses")
-  return res.json()
+  return getCollection<Lens[]>(`${INTERNAL_API_BASE}/api/lenses`, "Failed to fetch lenses")
 }
 
 export async function getLens(id: number): Promise<Lens> {
@@ -324,9 +402,7 @@ export async function uploadLensImage(id: number, file: File): Promise<Lens> {
 
 // Filmstocks API
 export async function getFilmstocks(): Promise<Filmstock[]> {
-  const res = await fetch(`${INTERNAL_API_BASE}/api/filmstocks`, { cache: "no-store" })
-  if (!res.ok) throw new Error("Failed to fetch filmstocks")
-  return res.json()
+  return getCollection<Filmstock[]>(`${INTERNAL_API_BASE}/api/filmstocks`, "Failed to fetch filmstocks")
 }
 
 export async function getFilmstock(id: number): Promise<Filmstock> {
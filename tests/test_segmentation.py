@@ -0,0 +1,40 @@
+"""Frame segmentation on synthetic contact sheets (python -m pytest tests)."""
+import cv2
+import numpy as np
+import pytest
+
+from app.services.segmentation import segment_file
+
+STRIPS, FRAMES = 6, 6
+
+
+def contact_sheet(paper: int, frame_w: int = 240, frame_h: int = 160, gap: int = 14, rebate: int = 22) -> np.ndarray:
+    """Strips of dark film base on a uniform background, textured frames with base gaps between them."""
+    rng = np.random.default_rng(0)
+    margin, spacing = 60, 30
+    strip_w = FRAMES * frame_w + (FRAMES + 1) * gap
+    strip_h = frame_h + 2 * rebate
+    sheet = np.full((STRIPS * strip_h + (STRIPS - 1) * spacing + 2 * margin, strip_w + 2 * margin), paper, np.uint8)
+    yy, xx = np.mgrid[0:frame_h, 0:frame_w]
+    for s in range(STRIPS):
+        top = margin + s * (strip_h + spacing)
+        sheet[top:top + strip_h, margin:margin + strip_w] = 25
+        for f in range(FRAMES):
+            content = 90 + 60 * np.sin(xx / (7 + f)) * np.cos(yy / (9 + s)) + rng.normal(0, 15, xx.shape)
+            x = margin + gap + f * (frame_w + gap)
+            sheet[top + rebate:top + rebate + frame_h, x:x + frame_w] = np.clip(content, 0, 255)
+    return sheet
+
+
+@pytest.mark.parametrize("paper", [240, 10])
+@pytest.mark.parametrize("variant", ["png", "jpg", "blurred"])
+def test_frames_split_on_any_background(tmp_path, paper, variant):
+    sheet = contact_sheet(paper)
+    if variant == "blurred":
+        sheet = cv2.GaussianBlur(sheet, (9, 9), 0)
+    path = str(tmp_path / f"sheet.{'jpg' if variant == 'jpg' else 'png'}")
+    cv2.imwrite(path, sheet)
+    boxes = segment_file(path)
+    assert len(boxes) == STRIPS * FRAMES
+    for x, y, w, h in boxes:
+        assert 1.3 <= w / h <= 1.7